@@ -0,0 +1,333 @@
+"""
+Cost-based admission control for the analytics APIs. Each request's cost is
+estimated up front from its range, grouping and filter kinds against cached
+BlogView row statistics; cheap and expensive requests then get separate
+concurrency lanes, and every client a cost budget per minute. Rejections are
+immediate (429 for a client over quota, 503 for a full lane) with Retry-After.
+Limits are per process.
+"""
+import json
+import math
+import time
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import connection
+from django.db.models import Min, Max
+
+from .instrumentation import untracked
+from .monitoring.metrics import record_cache_lookup
+from .models import BlogView
+from .services import AnalyticsService
+from .exceptions import RateLimitedException, ServiceOverloadedException
+
+DEFAULT_ADMISSION_SETTINGS = {
+    'ENABLED': True,
+    'EXPENSIVE_COST': 500,            # requests costing more use the expensive lane
+    'LANES': {'cheap': 16, 'expensive': 2},   # concurrent requests per lane
+    'CLIENT_COST_PER_MINUTE': 5000,   # cost units a client may spend per minute (burst = one minute)
+    'CLIENT_MAX_EXPENSIVE': 1,        # expensive requests one client may run at once
+    'STATS_TTL': 300,                 # seconds between row statistics refreshes
+    'ENDPOINTS': ('blog-views-analytics', 'top-analytics', 'performance-analytics'),  # also their -async views
+}
+
+RANGE_DAYS = {'week': 7, 'month': 30, 'year': 365}
+
+# Relative work per matched row for each ORM lookup a filter operator runs
+# as (AnalyticsService._get_lookup): the case-insensitive LIKE lookups are
+# unindexable scans, equality narrows the scan
+FILTER_FACTORS = {
+    'exact': 0.5,
+    'in': 1.5,
+    'icontains': 4.0,
+    'istartswith': 4.0,
+    'iendswith': 4.0,
+}
+
+# Extra work of the grouping: per-user groups build a name per row
+GROUPING_FACTORS = {
+    'country': 1.0,
+    'user': 1.5,
+    'blog': 1.2,
+}
+
+# A single author's share of the views, for performance?user_id=
+USER_SELECTIVITY = 0.1
+
+
+def get_admission_settings():
+    return {**DEFAULT_ADMISSION_SETTINGS, **getattr(settings, 'ADMISSION_CONTROL', {})}
+
+
+class TableStats:
+    """
+    BlogView row count and viewed_at span, refreshed every STATS_TTL. The
+    row count comes from the planner statistics where the backend keeps them.
+    One request refreshes stale values while the others keep using them;
+    only the very first refresh is waited for.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._first_refresh = threading.Lock()
+        self._refreshed = None
+        self.rows = 0
+        self.first = None
+        self.last = None
+
+    def get(self, ttl):
+        with self._lock:
+            stale = self._refreshed is None or time.monotonic() - self._refreshed >= ttl
+            record_cache_lookup('table_stats', not stale)
+            if not stale:
+                return self
+            initial = self._refreshed is None
+            if not initial:
+                # Other threads keep the previous values while this one refreshes
+                self._refreshed = time.monotonic()
+        if initial:
+            with self._first_refresh:
+                if self._refreshed is None:
+                    self.refresh()
+        else:
+            self.refresh()
+        return self
+
+    def refresh(self):
+        with untracked():
+            rows = self.count_rows()
+            span = BlogView.objects.aggregate(first=Min('viewed_at'), last=Max('viewed_at'))
+        with self._lock:
+            self.rows, self.first, self.last = rows, span['first'], span['last']
+            self._refreshed = time.monotonic()
+
+    @staticmethod
+    def count_rows():
+        table = BlogView._meta.db_table
+        estimate = None
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+                row = cursor.fetchone()
+                estimate = row and row[0]
+            elif connection.vendor == 'mysql':
+                cursor.execute("SELECT table_rows FROM information_schema.tables "
+                               "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+                row = cursor.fetchone()
+                estimate = row and row[0]
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+                if cursor.fetchone():
+                    # after ANALYZE, the first number of a table's stat is its row count
+                    cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL", [table])
+                    row = cursor.fetchone()
+                    estimate = row and int(row[0].split()[0])
+        if estimate and estimate > 0:
+            return int(estimate)
+        return BlogView.objects.count()
+
+    @property
+    def span_days(self):
+        if self.first is None or self.last is None:
+            return 0.0
+        return max((self.last - self.first).total_seconds() / 86400, 1.0)
+
+    def reset(self):
+        with self._lock:
+            self._refreshed = None
+
+
+_stats = TableStats()
+
+
+def get_table_stats():
+    return _stats
+
+
+def estimate_rows(stats, date_range):
+    """
+    BlogView rows a request scans, assuming views are spread evenly in time
+    """
+    days = RANGE_DAYS.get(date_range)
+    if days is None or not stats.span_days:
+        return stats.rows
+    return stats.rows * min(days / stats.span_days, 1.0)
+
+
+def lookup_of(condition):
+    """
+    The lookup a filter condition is executed with, e.g. 'icontains'
+    """
+    return AnalyticsService._get_lookup(condition.get('field', ''), condition.get('operator')).rsplit('__', 1)[1]
+
+
+def filter_factor(filters):
+    """
+    Work multiplier of a ``filters`` JSON parameter: the product of the
+    lookups' factors for 'and', the largest one for 'or'/'not'
+    """
+    if not filters:
+        return 1.0
+    try:
+        data = json.loads(filters)
+        conditions = data.get('conditions', [])
+        factors = [FILTER_FACTORS.get(lookup_of(condition), 1.0) for condition in conditions]
+        operator = data.get('operator', 'and')
+    except (ValueError, AttributeError):
+        return 1.0  # rejected by the view
+    if not factors:
+        return 1.0
+    if operator == 'and':
+        return math.prod(factors)
+    return max(max(factors), 1.0)
+
+
+def estimate_cost(endpoint, params, stats):
+    """
+    Cost units (~thousands of row-equivalents) of an analytics request;
+    ``endpoint`` is the URL name without its -async suffix
+    """
+    if endpoint == 'performance-analytics':
+        # every period since the start, for one author or all of them
+        rows = stats.rows * (USER_SELECTIVITY if params.get('user_id') else 1.0)
+        grouping = 1.0
+    elif endpoint == 'top-analytics':
+        rows = estimate_rows(stats, params.get('range'))
+        grouping = GROUPING_FACTORS.get(params.get('top', 'user'), 1.0)
+    else:
+        rows = estimate_rows(stats, params.get('range', 'month'))
+        grouping = GROUPING_FACTORS.get(params.get('object_type', 'country'), 1.0)
+    return rows / 1000 * grouping * filter_factor(params.get('filters'))
+
+
+class Lane:
+    """
+    Non-blocking concurrency limit; tracks recent durations to suggest
+    a Retry-After
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.durations = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, duration):
+        with self._lock:
+            self.in_flight -= 1
+            self.durations.append(duration)
+
+    def retry_after(self):
+        with self._lock:
+            return sum(self.durations) / len(self.durations) if self.durations else 1.0
+
+
+class ClientQuota:
+    """
+    Cost-unit token bucket plus a count of running expensive requests
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+        self.expensive = 0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+
+class AdmissionController:
+    """
+    Admits a request into its lane and charges its cost to the client
+    """
+
+    IDLE_CLIENT_SECONDS = 600
+
+    def __init__(self, config=None):
+        self.config = config or get_admission_settings()
+        self.lanes = {name: Lane(name, limit) for name, limit in self.config['LANES'].items()}
+        self.clients = {}
+        self._lock = threading.Lock()
+        self._pruned = time.monotonic()
+
+    def lane_for(self, cost):
+        return 'expensive' if cost >= self.config['EXPENSIVE_COST'] else 'cheap'
+
+    def admit(self, client, cost):
+        """
+        Returns a Ticket; call its release() when the request is done.
+        Raises RateLimitedException / ServiceOverloadedException.
+        """
+        lane_name = self.lane_for(cost)
+        expensive = lane_name == 'expensive'
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            quota = self.clients.get(client)
+            if quota is None:
+                quota = self.clients[client] = ClientQuota(self.config['CLIENT_COST_PER_MINUTE'])
+            quota.refill(now)
+            # a request costing more than the whole budget is let through on a full bucket
+            charge = min(cost, quota.capacity)
+            if quota.tokens < charge:
+                raise RateLimitedException(
+                    "Query cost budget exhausted", retry_after=(charge - quota.tokens) * 60 / quota.capacity)
+            if expensive and quota.expensive >= self.config['CLIENT_MAX_EXPENSIVE']:
+                raise RateLimitedException(
+                    "Too many expensive queries running for this client",
+                    retry_after=self.lanes[lane_name].retry_after())
+
+            lane = self.lanes[lane_name]
+            if not lane.try_acquire():
+                raise ServiceOverloadedException(
+                    f"Too many {lane_name} analytics queries running", retry_after=lane.retry_after())
+            quota.tokens -= charge
+            if expensive:
+                quota.expensive += 1
+        return Ticket(self, lane, quota if expensive else None)
+
+    def _prune(self, now):
+        if now - self._pruned < self.IDLE_CLIENT_SECONDS:
+            return
+        self._pruned = now
+        for client, quota in list(self.clients.items()):
+            if not quota.expensive and now - quota.updated > self.IDLE_CLIENT_SECONDS:
+                del self.clients[client]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lanes': {name: {'in_flight': lane.in_flight, 'limit': lane.limit} for name, lane in self.lanes.items()},
+                'clients': len(self.clients),
+            }
+
+
+class Ticket:
+    def __init__(self, controller, lane, expensive_quota):
+        self.controller = controller
+        self.lane = lane
+        self.expensive_quota = expensive_quota
+        self.started = time.perf_counter()
+
+    def release(self):
+        self.lane.release(time.perf_counter() - self.started)
+        if self.expensive_quota is not None:
+            with self.controller._lock:
+                self.expensive_quota.expensive -= 1
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
@@ -1,5 +1,31 @@
+import atexit
+import logging
 from django.apps import AppConfig
 
 
+def start_queue_listeners():
+    """
+    dictConfig creates a QueueListener for each QueueHandler but does not start it
+    """
+    for name in logging.getHandlerNames():
+        listener = getattr(logging.getHandlerByName(name), 'listener', None)
+        if listener is not None and listener._thread is None:
+            listener.start()
+            atexit.register(listener.stop)
+
+
 class AnalyticsAppConfig(AppConfig):
     name = 'analytics_app'
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_query_dispatcher
+        from .sqlite_pragmas import configure_sqlite_connection
+
+        start_queue_listeners()
+        connection_created.connect(install_query_dispatcher, dispatch_uid='analytics_query_dispatcher')
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='analytics_sqlite_pragmas')
+        for connection in connections.all(initialized_only=True):
+            install_query_dispatcher(connection)
+            configure_sqlite_connection(connection=connection)
@@ -0,0 +1,189 @@
+"""
+Native async versions of the analytics APIs for ASGI deployments. Same
+parameters and payloads as the DRF views in views.py; queries go through the
+async ORM, and independent sub-queries run concurrently on the query pool
+(parallel.run_parallel_async).
+"""
+import logging
+from collections import OrderedDict
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.request import Request
+
+from .services import AnalyticsService
+from .pagination import AnalyticsPagination
+from .exceptions import (
+    AnalyticsAPIException, InvalidFilterException, TimeRangeException, DataNotFoundException, QueryTimeoutException,
+)
+from .tracing import traced
+from .routers import reads_from_replica, replica_failed
+from .deadlines import with_query_deadline, degraded_range
+from .renderers import COLUMNAR_FORMAT, to_columns, dicts_to_columns
+
+logger = logging.getLogger(__name__)
+
+
+def error_response(exc):
+    response = JsonResponse({'error': str(exc.detail), 'code': exc.default_code}, status=exc.status_code)
+    if getattr(exc, 'retry_after', None):
+        response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def wants_columns(request):
+    return request.GET.get('format') == COLUMNAR_FORMAT
+
+
+def data_response(payload, columnar):
+    """
+    JsonResponse, compact for the columnar format
+    """
+    if columnar:
+        return JsonResponse(payload, json_dumps_params={'separators': (',', ':'), 'check_circular': False})
+    return JsonResponse(payload)
+
+
+def internal_error_response(exc):
+    return JsonResponse({
+        'error': 'Internal server error',
+        'detail': str(exc) if settings.DEBUG else None,
+        'code': 'internal_error'
+    }, status=500)
+
+
+class BlogViewsAnalyticsAsyncView(View):
+    """Async API #1: Group blogs and views by selected object_type"""
+
+    @traced()
+    @reads_from_replica
+    @with_query_deadline('blog-views-analytics')
+    async def get(self, request):
+        object_type = request.GET.get('object_type', 'country')
+        date_range = request.GET.get('range', 'month')
+        filters = request.GET.get('filters')
+        columnar = wants_columns(request)
+        try:
+            if date_range and date_range not in ['month', 'week', 'year']:
+                raise TimeRangeException(
+                    f"Invalid range: {date_range}. Must be 'month', 'week', or 'year'"
+                )
+
+            # limit/offset parsing and links as in the DRF view
+            paginator = AnalyticsPagination()
+            paginator.request = Request(request)
+            paginator.limit = paginator.get_limit(paginator.request)
+            paginator.offset = paginator.get_offset(paginator.request)
+
+            paginator.count, page = await AnalyticsService.aget_blog_views_page(
+                object_type, date_range, filters, offset=paginator.offset, limit=paginator.limit, columnar=columnar,
+            )
+            paginator.page_length = len(page)
+            return data_response(OrderedDict([
+                ('count', paginator.count),
+                ('next', paginator.get_next_link()),
+                ('previous', paginator.get_previous_link()),
+                ('limit', paginator.limit),
+                ('offset', paginator.offset),
+                ('data', to_columns(page) if columnar else page),
+            ] + paginator.degraded_fields()), columnar)
+
+        except (InvalidFilterException, TimeRangeException, QueryTimeoutException) as e:
+            logger.warning("Request failed in BlogViewsAnalyticsAsyncView: %s", e)
+            return error_response(e)
+        except DataNotFoundException as e:
+            logger.info("No data found in BlogViewsAnalyticsAsyncView: %s", e)
+            return JsonResponse({
+                'object_type': object_type,
+                'range': date_range,
+                'data': [],
+                'message': str(e)
+            }, status=404)
+        except Exception as e:
+            if replica_failed(e):
+                raise  # @reads_from_replica repeats the request on the primary
+            logger.error("Unexpected error in BlogViewsAnalyticsAsyncView: %s", e, exc_info=True)
+            return internal_error_response(e)
+
+
+class TopAnalyticsAsyncView(View):
+    """Async API #2: Returns Top 10 based on total views"""
+
+    @traced()
+    @reads_from_replica
+    @with_query_deadline('top-analytics')
+    async def get(self, request):
+        top_type = request.GET.get('top', 'user')
+        columnar = wants_columns(request)
+        try:
+            data = await AnalyticsService.aget_top_analytics(
+                top_type=top_type,
+                date_range=request.GET.get('range'),
+                filters=request.GET.get('filters'),
+                columnar=columnar,
+            )
+            return data_response({'top_type': top_type, 'data': to_columns(data) if columnar else data}, columnar)
+
+        except QueryTimeoutException as e:
+            # Degraded mode: the top 10 of a narrower, recent range
+            fallback = degraded_range(request.GET.get('range'))
+            logger.warning("Query timed out in TopAnalyticsAsyncView (fallback range: %s): %s", fallback, e)
+            if fallback is None:
+                return error_response(e)
+            try:
+                data = await AnalyticsService.aget_top_analytics(
+                    top_type=top_type, date_range=fallback, filters=request.GET.get('filters'), columnar=columnar,
+                )
+            except QueryTimeoutException:
+                return error_response(e)
+            return data_response({
+                'top_type': top_type,
+                'data': to_columns(data) if columnar else data,
+                'degraded': {'reason': 'query_timeout', 'range': fallback},
+            }, columnar)
+        except AnalyticsAPIException as e:
+            logger.warning("Invalid request in TopAnalyticsAsyncView: %s", e)
+            return error_response(e)
+        except Exception as e:
+            if replica_failed(e):
+                raise  # @reads_from_replica repeats the request on the primary
+            logger.error("Unexpected error in TopAnalyticsAsyncView: %s", e, exc_info=True)
+            return internal_error_response(e)
+
+
+class PerformanceAnalyticsAsyncView(View):
+    """Async API #3: Time-series performance for a user or all users"""
+
+    @traced()
+    @reads_from_replica
+    @with_query_deadline('performance-analytics')
+    async def get(self, request):
+        compare_type = request.GET.get('compare', 'month')
+        user_id = request.GET.get('user_id')
+        try:
+            if user_id:
+                try:
+                    user_id = int(user_id)
+                except ValueError:
+                    raise InvalidFilterException("user_id must be an integer")
+
+            data = await AnalyticsService.aget_performance_analytics(
+                compare_type=compare_type,
+                user_id=user_id,
+                filters=request.GET.get('filters'),
+            )
+            columnar = wants_columns(request)
+            return data_response({
+                'compare': compare_type,
+                'user_id': user_id,
+                'data': dicts_to_columns(data) if columnar else data,
+            }, columnar)
+
+        except AnalyticsAPIException as e:
+            logger.warning("Request failed in PerformanceAnalyticsAsyncView: %s", e)
+            return error_response(e)
+        except Exception as e:
+            if replica_failed(e):
+                raise  # @reads_from_replica repeats the request on the primary
+            logger.error("Unexpected error in PerformanceAnalyticsAsyncView: %s", e, exc_info=True)
+            return internal_error_response(e)
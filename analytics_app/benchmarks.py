@@ -0,0 +1,698 @@
+"""
+Benchmark harness shared by the performance management commands.
+"""
+import json
+import time
+import random
+import statistics
+import threading
+import http.client
+from collections import defaultdict
+from urllib.parse import urlsplit, urlencode
+import numpy as np
+
+from .datasets import COUNTRIES, BLOG_TOPICS
+from .instrumentation import QueryRecorder
+
+
+BENCHMARK_CASES = [
+    {
+        'name': 'API #1 - Blog Views by Country',
+        'url': '/analytics/blog-views/',
+        'params': {'object_type': 'country', 'range': 'month'}
+    },
+    {
+        'name': 'API #1 - Blog Views by User',
+        'url': '/analytics/blog-views/',
+        'params': {'object_type': 'user', 'range': 'month'}
+    },
+    {
+        'name': 'API #2 - Top Users',
+        'url': '/analytics/top/',
+        'params': {'top': 'user'}
+    },
+    {
+        'name': 'API #2 - Top Countries',
+        'url': '/analytics/top/',
+        'params': {'top': 'country'}
+    },
+    {
+        'name': 'API #2 - Top Blogs',
+        'url': '/analytics/top/',
+        'params': {'top': 'blog'}
+    },
+    {
+        'name': 'API #3 - Monthly Performance',
+        'url': '/analytics/performance/',
+        'params': {'compare': 'month'}
+    },
+    {
+        'name': 'API #3 - Weekly Performance',
+        'url': '/analytics/performance/',
+        'params': {'compare': 'week'}
+    },
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize_latencies(samples_ms):
+    """
+    Percentiles and moments of a list of latencies in milliseconds
+    """
+    values = np.asarray(samples_ms, dtype=np.float64)
+    summary = {
+        f"p{pct}_ms": round(float(np.percentile(values, pct)), 3)
+        for pct in PERCENTILES
+    }
+    summary.update({
+        'mean_ms': round(float(values.mean()), 3),
+        'min_ms': round(float(values.min()), 3),
+        'max_ms': round(float(values.max()), 3),
+        'stdev_ms': round(statistics.stdev(samples_ms), 3) if len(samples_ms) > 1 else 0.0,
+    })
+    return summary
+
+
+def run_case(client, case, iterations, warmup):
+    """
+    Time one case through the Django test client.
+    Warm-up calls are executed but not recorded.
+    """
+    for _ in range(warmup):
+        client.get(case['url'], case['params'])
+
+    latencies = []
+    query_counts = []
+    db_times = []
+    status_codes = set()
+    for _ in range(iterations):
+        recorder = QueryRecorder()
+        with recorder.record():
+            start = time.perf_counter()
+            response = client.get(case['url'], case['params'])
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_counts.append(recorder.count)
+        db_times.append(recorder.total_ms)
+        status_codes.add(response.status_code)
+
+    result = summarize_latencies(latencies)
+    result.update({
+        'iterations': iterations,
+        'warmup': warmup,
+        'status_codes': sorted(status_codes),
+        'queries': max(query_counts),
+        'db_mean_ms': round(statistics.mean(db_times), 3),
+        'db_share': round(sum(db_times) / sum(latencies), 3) if sum(latencies) else 0.0,
+    })
+    return result
+
+
+def compare_to_baseline(results, baseline, threshold, metric='p95_ms'):
+    """
+    Compare results against a baseline of the same shape
+    ({dataset_key: {case_name: stats}}).
+
+    A case regresses when ``metric`` grows by more than ``threshold`` (a
+    fraction, e.g. 0.2 for +20%) or when it issues more queries than before.
+    Returns a list of regression dicts.
+    """
+    regressions = []
+    for dataset_key, cases in results.items():
+        baseline_cases = baseline.get(dataset_key, {})
+        for name, current in cases.items():
+            previous = baseline_cases.get(name)
+            if not previous:
+                continue
+
+            before, after = previous.get(metric), current.get(metric)
+            if before and after is not None:
+                change = (after - before) / before
+                if change > threshold:
+                    regressions.append({
+                        'dataset': dataset_key,
+                        'case': name,
+                        'metric': metric,
+                        'baseline': before,
+                        'current': after,
+                        'change': round(change, 3),
+                    })
+
+            if current.get('queries', 0) > previous.get('queries', current.get('queries', 0)):
+                regressions.append({
+                    'dataset': dataset_key,
+                    'case': name,
+                    'metric': 'queries',
+                    'baseline': previous['queries'],
+                    'current': current['queries'],
+                    'change': current['queries'] - previous['queries'],
+                })
+    return regressions
+
+
+SCALING_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+SCALING_RANGES = ('week', 'month', 'year')
+SCALING_DRIVERS = ('total_views', 'range_views', 'groups')
+
+
+def scaling_cases():
+    """
+    Benchmark cases for the scaling mode. Each endpoint family is run with
+    several ranges / periods so that, at a fixed dataset size, the rows in
+    range and the group count vary independently of the total view count.
+    """
+    families = [
+        ('API #1 - by country', '/analytics/blog-views/', {'object_type': 'country'}, 'country__name'),
+        ('API #1 - by user', '/analytics/blog-views/', {'object_type': 'user'}, 'user'),
+        ('API #2 - top users', '/analytics/top/', {'top': 'user'}, 'blog__author'),
+        ('API #2 - top countries', '/analytics/top/', {'top': 'country'}, 'country'),
+        ('API #2 - top blogs', '/analytics/top/', {'top': 'blog'}, 'blog'),
+    ]
+    cases = []
+    for family, url, params, group_by in families:
+        for date_range in SCALING_RANGES:
+            cases.append({
+                'name': f"{family} ({date_range})",
+                'family': family,
+                'url': url,
+                'params': {**params, 'range': date_range},
+                'range': date_range,
+                'group_by': group_by,
+            })
+    for compare in ('week', 'month', 'year'):
+        cases.append({
+            'name': f"API #3 - performance ({compare})",
+            'family': 'API #3 - performance',
+            'url': '/analytics/performance/',
+            'params': {'compare': compare},
+            'range': None,
+            'group_by': 'viewed_at',
+            'trunc': compare,
+        })
+    return cases
+
+
+def fit_power_law(xs, ys):
+    """
+    Least-squares fit of y = a * x^b in log-log space. Returns (b, r2).
+    """
+    x = np.log(np.asarray(xs, dtype=np.float64))
+    y = np.log(np.asarray(ys, dtype=np.float64))
+    slope, intercept = np.polyfit(x, y, 1)
+    ss_res = float(((y - (slope * x + intercept)) ** 2).sum())
+    ss_tot = float(((y - y.mean()) ** 2).sum())
+    r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 1.0
+    return float(slope), r2
+
+
+def classify_exponent(exponent):
+    if exponent < 0.2:
+        return 'O(1)'
+    if exponent < 0.8:
+        return 'sublinear'
+    if exponent < 1.2:
+        return 'O(n)'
+    return 'superlinear'
+
+
+def fit_scaling(points, metric='p50_ms', min_spread=2.0):
+    """
+    Fit ``metric`` against each of SCALING_DRIVERS over ``points`` (dicts of
+    driver values and metrics, one per dataset size and case variant).
+
+    A driver needs at least three points spanning a ``min_spread`` ratio to be
+    fitted. The driver with the best R² is reported as what the endpoint scales
+    with; ties go to the earlier driver. Fixed per-request overhead flattens the
+    curve at small sizes, so exponents are lower bounds.
+    """
+    fits = {}
+    for driver in SCALING_DRIVERS:
+        pairs = [(p[driver], p[metric]) for p in points if p.get(driver, 0) > 0 and p.get(metric, 0) > 0]
+        xs = [x for x, _ in pairs]
+        if len(pairs) < 3 or max(xs) / min(xs) < min_spread:
+            fits[driver] = None
+            continue
+        exponent, r2 = fit_power_law(xs, [y for _, y in pairs])
+        fits[driver] = {'exponent': round(exponent, 3), 'r2': round(r2, 3), 'points': len(pairs)}
+
+    fitted = [driver for driver in SCALING_DRIVERS if fits[driver]]
+    if not fitted:
+        return {'driver': None, 'exponent': None, 'r2': None, 'complexity': 'unknown', 'fits': fits}
+    best = max(fitted, key=lambda driver: fits[driver]['r2'])
+    return {
+        'driver': best,
+        'exponent': fits[best]['exponent'],
+        'r2': fits[best]['r2'],
+        'complexity': classify_exponent(fits[best]['exponent']),
+        'fits': fits,
+    }
+
+
+# Weighted request mix used by load generation: (endpoint key, path, weight)
+LOAD_MIX = [
+    ('blog-views', '/analytics/blog-views/', 5),
+    ('top', '/analytics/top/', 3),
+    ('performance', '/analytics/performance/', 2),
+]
+
+FILTER_TEMPLATES = [
+    {'field': 'country__name', 'operator': 'eq'},
+    {'field': 'blog__title', 'operator': 'contains'},
+]
+
+
+def parse_mix(spec):
+    """
+    Parse 'blog-views=5,top=3,performance=2' into LOAD_MIX-shaped tuples
+    """
+    paths = {key: path for key, path, _ in LOAD_MIX}
+    mix = []
+    for part in spec.split(','):
+        key, _, weight = part.partition('=')
+        key = key.strip()
+        if key not in paths:
+            raise ValueError(f"Unknown endpoint '{key}'. Choose from: {', '.join(paths)}")
+        mix.append((key, paths[key], float(weight or 1)))
+    return mix
+
+
+def random_request(rng, mix, countries, topics, filter_probability=0.2):
+    """
+    Pick an endpoint by weight and build random, valid query parameters.
+    Returns (endpoint key, path, params).
+    """
+    key, path, _ = rng.choices(mix, weights=[weight for _, _, weight in mix])[0]
+
+    if key == 'blog-views':
+        params = {
+            'object_type': rng.choice(['country', 'user']),
+            'range': rng.choice(['week', 'month', 'year']),
+            'limit': rng.choice([10, 100]),
+        }
+    elif key == 'top':
+        params = {'top': rng.choice(['user', 'country', 'blog'])}
+        if rng.random() < 0.7:
+            params['range'] = rng.choice(['week', 'month', 'year'])
+    else:
+        params = {'compare': rng.choice(['day', 'week', 'month', 'year'])}
+
+    if rng.random() < filter_probability:
+        template = rng.choice(FILTER_TEMPLATES)
+        value = rng.choice(countries) if template['field'] == 'country__name' else rng.choice(topics)
+        params['filters'] = json.dumps({
+            'operator': 'and',
+            'conditions': [dict(template, value=value)],
+        })
+    return key, path, params
+
+
+class LoadGenerator:
+    """
+    Drives a live server from a pool of threads, one keep-alive connection each.
+
+    Subclasses implement ``next_request(index, rng)`` returning
+    ``(due_offset, label, url)`` or None when done. A due_offset of None means
+    "send now" (closed loop); otherwise latency is measured from the due time,
+    so a saturated server shows up as growing latency instead of silently
+    lowering the offered load.
+    """
+
+    def __init__(self, base_url, concurrency, timeout=10.0, seed=None):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Invalid URL: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.seed = seed
+        self.elapsed = 0.0
+
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self.samples = []  # (offset_s, label, latency_ms, status or None, error)
+
+    def next_request(self, index, rng):
+        raise NotImplementedError
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _claim_index(self):
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        return index
+
+    def _worker(self, worker_id, started):
+        rng = random.Random(None if self.seed is None else self.seed * 1000 + worker_id)
+        conn = self._connect()
+        samples = []
+        try:
+            while True:
+                planned = self.next_request(self._claim_index(), rng)
+                if planned is None:
+                    break
+                due_offset, label, url = planned
+                if due_offset is None:
+                    due = time.perf_counter()
+                else:
+                    due = started + due_offset
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                status, error = None, None
+                try:
+                    conn.request('GET', f"{self.prefix}{url}", headers={'Connection': 'keep-alive'})
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException) as e:
+                    error = type(e).__name__
+                    conn.close()
+                    conn = self._connect()
+                finished = time.perf_counter()
+                samples.append((due - started, label, (finished - due) * 1000, status, error))
+        finally:
+            conn.close()
+            with self._lock:
+                self.samples.extend(samples)
+
+    def run(self):
+        self.started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._worker, args=(i, self.started), daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.samples
+
+
+class MixLoadGenerator(LoadGenerator):
+    """
+    Random weighted endpoint mix for a fixed duration.
+    Closed loop when ``rate`` is None, otherwise request i is due at i/rate.
+    """
+
+    def __init__(self, base_url, mix, concurrency, duration, rate=None, timeout=10.0, seed=None):
+        super().__init__(base_url, concurrency, timeout, seed)
+        self.mix = mix
+        self.duration = duration
+        self.rate = rate
+        self.countries = [name for name, _ in COUNTRIES]
+
+    def next_request(self, index, rng):
+        if self.rate is None:
+            due_offset = None
+            if time.perf_counter() - self.started >= self.duration:
+                return None
+        else:
+            due_offset = index / self.rate
+            if due_offset >= self.duration:
+                return None
+        label, path, params = random_request(rng, self.mix, self.countries, BLOG_TOPICS)
+        return due_offset, label, f"{path}?{urlencode(params)}"
+
+
+class ReplayLoadGenerator(LoadGenerator):
+    """
+    Replays captured requests (dicts with 't', 'path', 'query_params', 'shape').
+    ``speed`` None replays as fast as possible; otherwise the original
+    inter-arrival times are kept, divided by speed.
+    """
+
+    def __init__(self, base_url, entries, concurrency, speed=None, timeout=10.0):
+        super().__init__(base_url, concurrency, timeout)
+        self.entries = entries
+        self.speed = speed
+
+    def next_request(self, index, rng):
+        if index >= len(self.entries):
+            return None
+        entry = self.entries[index]
+        due_offset = None if self.speed is None else entry['t'] / self.speed
+        query = urlencode(entry['query_params'], doseq=True)
+        return due_offset, entry['shape'], f"{entry['path']}?{query}" if query else entry['path']
+
+
+# Parameters whose value changes the query plan; others only count by presence
+SHAPE_VALUE_PARAMS = ('object_type', 'range', 'top', 'compare')
+
+
+def query_shape(path, query_params):
+    """
+    Normalize a request into its query shape, e.g.
+    '/analytics/top/?filters=[blog__title:contains]&range=month&top=user'.
+    Filter values and ids are dropped; filter fields/operators are kept.
+    """
+    parts = []
+    for key in sorted(query_params):
+        value = query_params[key]
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else ''
+        if key in SHAPE_VALUE_PARAMS:
+            parts.append(f"{key}={value}")
+        elif key == 'filters':
+            try:
+                data = json.loads(value)
+                conditions = sorted(
+                    f"{c.get('field')}:{c.get('operator')}" for c in data.get('conditions', [])
+                )
+                parts.append(f"filters={data.get('operator', 'and')}[{','.join(conditions)}]")
+            except (ValueError, AttributeError, TypeError):
+                parts.append("filters=invalid")
+        else:
+            parts.append(f"{key}=*")
+    return f"{path}?{'&'.join(parts)}" if parts else path
+
+
+def compare_shapes(before, after, metric='p50_ms'):
+    """
+    Per-shape latency change between two replay reports.
+    Returns rows sorted by relative change, worst first.
+    """
+    rows = []
+    for shape in sorted(set(before) | set(after)):
+        old, new = before.get(shape), after.get(shape)
+        row = {
+            'shape': shape,
+            'requests_before': old['requests'] if old else 0,
+            'requests_after': new['requests'] if new else 0,
+            'before_ms': old[metric] if old else None,
+            'after_ms': new[metric] if new else None,
+            'change': None,
+        }
+        if old and new and old[metric]:
+            row['change'] = round((new[metric] - old[metric]) / old[metric], 4)
+        rows.append(row)
+    return sorted(rows, key=lambda r: (r['change'] is None, -(r['change'] or 0)))
+
+
+def is_error(status, error):
+    return error is not None or status >= 500
+
+
+def build_report(samples, elapsed, interval):
+    latencies = [latency for _, _, latency, _, _ in samples]
+    errors = sum(1 for _, _, _, status, error in samples if is_error(status, error))
+    status_counts = defaultdict(int)
+    for _, _, _, status, error in samples:
+        status_counts[str(status) if error is None else error] += 1
+
+    by_endpoint = defaultdict(list)
+    for _, endpoint, latency, _, _ in samples:
+        by_endpoint[endpoint].append(latency)
+
+    buckets = defaultdict(list)
+    for offset, _, latency, status, error in samples:
+        buckets[int(offset // interval)].append((latency, is_error(status, error)))
+    timeline = []
+    for bucket in sorted(buckets):
+        values = [latency for latency, _ in buckets[bucket]]
+        summary = summarize_latencies(values)
+        timeline.append({
+            't_s': round(bucket * interval, 3),
+            'requests': len(values),
+            'rps': round(len(values) / interval, 1),
+            'p50_ms': summary['p50_ms'],
+            'p95_ms': summary['p95_ms'],
+            'max_ms': summary['max_ms'],
+            'errors': sum(1 for _, failed in buckets[bucket] if failed),
+        })
+
+    return {
+        'requests': len(samples),
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'status_codes': dict(status_counts),
+        'latency': summarize_latencies(latencies) if latencies else {},
+        'endpoints': {
+            endpoint: dict(summarize_latencies(values), requests=len(values))
+            for endpoint, values in by_endpoint.items()
+        },
+        'timeline': timeline,
+    }
+
+
+def sqlite_statement(queryset):
+    """
+    (sql, params) of a queryset in the sqlite3 module's qmark style
+    """
+    sql, params = queryset.query.sql_with_params()
+    return sql % (('?',) * len(params)), params
+
+
+def analytics_read_statements():
+    """
+    The queries behind the three analytics APIs, as (label, sql, params)
+    """
+    from .services import AnalyticsService
+    blogs, views = AnalyticsService._performance_querysets('month')
+    statements = [
+        ('blog-views', AnalyticsService._blog_views_queryset('country', 'month')[:100]),
+        ('top', AnalyticsService._top_queryset('user', 'month')),
+        ('performance-blogs', blogs),
+        ('performance-views', views),
+    ]
+    return [(label, *sqlite_statement(queryset)) for label, queryset in statements]
+
+
+class SQLiteContentionBenchmark:
+    """
+    Reader threads run the analytics queries while writer threads insert
+    BlogView batches, all against one SQLite file, for a fixed duration.
+
+    ``pragmas`` is applied to every connection. With ``persistent`` each
+    thread keeps one connection (CONN_MAX_AGE > 0); otherwise it opens a new
+    one per operation, as Django does with CONN_MAX_AGE = 0. Connections come
+    from Django's sqlite backend so its SQL functions (date truncation etc.)
+    are registered, but connection_created is not sent.
+    """
+
+    def __init__(self, path, pragmas, readers=4, writers=1, duration=10.0,
+                 batch_size=20, persistent=True, seed=None):
+        from django.db import connections
+        from django.db.utils import load_backend
+
+        settings_dict = {**connections['default'].settings_dict, 'NAME': str(path)}
+        self.wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'sqlite-benchmark')
+        self.pragmas = pragmas
+        self.readers = readers
+        self.writers = writers
+        self.duration = duration
+        self.batch_size = batch_size
+        self.persistent = persistent
+        self.seed = seed
+        self.statements = analytics_read_statements()
+
+        self._lock = threading.Lock()
+        self.samples = []  # (kind, label, latency_ms, rows, error)
+
+    def connect(self):
+        from .sqlite_pragmas import apply_pragmas
+        conn = self.wrapper.get_new_connection(self.wrapper.get_connection_params())
+        apply_pragmas(conn.cursor(), self.pragmas)
+        return conn
+
+    def _ids(self, conn):
+        blog_ids = [row[0] for row in conn.execute("SELECT id FROM analytics_app_blog")]
+        country_ids = [row[0] for row in conn.execute("SELECT id FROM analytics_app_country")]
+        if not blog_ids:
+            raise ValueError("The database has no blogs to record views for")
+        return blog_ids, country_ids or [None]
+
+    def read(self, conn, rng):
+        label, sql, params = rng.choice(self.statements)
+        conn.execute(sql, params).fetchall()
+        return label, 0
+
+    def write(self, conn, rng):
+        now = time.time()
+        rows = [
+            (rng.choice(self.blog_ids), rng.choice(self.country_ids),
+             time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - rng.random() * 86400)),
+             rng.randint(1, 300))
+            for _ in range(self.batch_size)
+        ]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO analytics_app_blogview (blog_id, user_id, country_id, viewed_at, duration) "
+                "VALUES (?, NULL, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return 'insert', len(rows)
+
+    def _worker(self, kind, worker_id, deadline):
+        import sqlite3
+        rng = random.Random(None if self.seed is None else self.seed * 1000 + worker_id)
+        operation = self.read if kind == 'read' else self.write
+        conn = self.connect() if self.persistent else None
+        samples = []
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                label, rows, error = kind, 0, None
+                try:
+                    if not self.persistent:
+                        conn = self.connect()
+                    label, rows = operation(conn, rng)
+                except sqlite3.OperationalError as e:
+                    error = str(e)
+                finally:
+                    if not self.persistent and conn is not None:
+                        conn.close()
+                        conn = None
+                samples.append((kind, label, (time.perf_counter() - started) * 1000, rows, error))
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self.samples.extend(samples)
+
+    def run(self):
+        conn = self.connect()
+        try:
+            self.blog_ids, self.country_ids = self._ids(conn)
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+
+        started = time.perf_counter()
+        deadline = started + self.duration
+        threads = [
+            threading.Thread(target=self._worker, args=(kind, i, deadline), daemon=True)
+            for i, kind in enumerate(['read'] * self.readers + ['write'] * self.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed, journal_mode)
+
+    def report(self, elapsed, journal_mode):
+        report = {'journal_mode': journal_mode, 'duration_s': round(elapsed, 3), 'persistent': self.persistent}
+        for kind in ('read', 'write'):
+            ok = [s for s in self.samples if s[0] == kind and s[4] is None]
+            errors = [s for s in self.samples if s[0] == kind and s[4] is not None]
+            report[kind] = {
+                'operations': len(ok),
+                'ops_per_s': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+                'rows_per_s': round(sum(s[3] for s in ok) / elapsed, 2) if elapsed else 0.0,
+                'errors': len(errors),
+                'latency': summarize_latencies([s[2] for s in ok]) if ok else {},
+            }
+        return report
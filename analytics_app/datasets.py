@@ -0,0 +1,181 @@
+"""
+Synthetic dataset generation for load testing and benchmarks.
+
+Only NumPy is used here (no Django imports), so chunk generation can run in
+worker processes independently of the database connection.
+"""
+import numpy as np
+
+
+# Username prefix of generated users, which --clear and snapshot restores replace
+BENCH_USER_PREFIX = 'bench_user_'
+
+# Relative traffic by weekday (Monday=0 .. Sunday=6)
+WEEKLY_PROFILE = np.array([1.00, 1.06, 1.08, 1.04, 0.95, 0.72, 0.66])
+
+# Relative traffic by hour of day (UTC), peaking in the late morning/evening
+DIURNAL_PROFILE = np.array([
+    0.30, 0.22, 0.18, 0.16, 0.17, 0.22, 0.35, 0.55,
+    0.78, 0.92, 1.00, 1.00, 0.97, 0.95, 0.93, 0.92,
+    0.93, 0.96, 1.00, 0.98, 0.90, 0.75, 0.58, 0.42,
+])
+
+COUNTRIES = [
+    ('United States', 'US'), ('India', 'IN'), ('United Kingdom', 'GB'),
+    ('Germany', 'DE'), ('Brazil', 'BR'), ('Canada', 'CA'), ('France', 'FR'),
+    ('Japan', 'JP'), ('Australia', 'AU'), ('Spain', 'ES'), ('Italy', 'IT'),
+    ('Netherlands', 'NL'), ('Mexico', 'MX'), ('Indonesia', 'ID'),
+    ('Poland', 'PL'), ('Turkey', 'TR'), ('Sweden', 'SE'), ('Nigeria', 'NG'),
+    ('South Korea', 'KR'), ('Philippines', 'PH'), ('Argentina', 'AR'),
+    ('South Africa', 'ZA'), ('Egypt', 'EG'), ('Vietnam', 'VN'),
+    ('Ukraine', 'UA'), ('Pakistan', 'PK'), ('Kenya', 'KE'), ('Ethiopia', 'ET'),
+    ('Singapore', 'SG'), ('Switzerland', 'CH'), ('Norway', 'NO'),
+    ('Denmark', 'DK'), ('Finland', 'FI'), ('Ireland', 'IE'), ('Portugal', 'PT'),
+    ('Belgium', 'BE'), ('Austria', 'AT'), ('New Zealand', 'NZ'),
+    ('Chile', 'CL'), ('Colombia', 'CO'),
+]
+
+# Countries beyond the built-in list get codes 'X00'..'XZZ' (Country.code
+# holds 3 characters)
+CODE_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+MAX_COUNTRIES = len(CODE_DIGITS) ** 2
+
+
+def synthetic_country_code(index):
+    return 'X' + CODE_DIGITS[index // len(CODE_DIGITS)] + CODE_DIGITS[index % len(CODE_DIGITS)]
+
+
+BLOG_TOPICS = [
+    'Django', 'Python', 'PostgreSQL', 'APIs', 'Caching', 'Kubernetes',
+    'Testing', 'Security', 'Data Engineering', 'Machine Learning',
+    'Frontend', 'DevOps', 'Observability', 'Performance', 'Databases',
+]
+
+
+def zipf_weights(n, s):
+    """
+    Normalized Zipf probabilities for ranks 1..n with exponent s
+    """
+    weights = 1.0 / np.power(np.arange(1, n + 1, dtype=np.float64), s)
+    return weights / weights.sum()
+
+
+def sample_from_cdf(rng, cdf, size):
+    """
+    Inverse-CDF sampling; much cheaper than rng.choice(p=...) on repeated calls
+    """
+    return np.searchsorted(cdf, rng.random(size) * cdf[-1], side='right')
+
+
+class ViewDistribution:
+    """
+    Precomputed sampling tables shared by every chunk of a dataset.
+
+    ``blog_ids``, ``user_ids`` and ``country_ids`` are the database ids the
+    sampled indexes map to. Blog and user ranks are shuffled with the seed so
+    popularity is not correlated with insertion order; countries keep the
+    given order, most popular first.
+    """
+
+    def __init__(self, blog_ids, user_ids, country_ids, end_ts, days,
+                 anonymous_fraction=0.2, blog_zipf=1.1, user_zipf=0.9,
+                 country_zipf=1.0, seed=42):
+        rng = np.random.default_rng(seed)
+        self.blog_ids = rng.permutation(np.asarray(blog_ids, dtype=np.int64))
+        self.user_ids = rng.permutation(np.asarray(user_ids, dtype=np.int64))
+        self.country_ids = np.asarray(country_ids, dtype=np.int64)
+
+        self.blog_cdf = np.cumsum(zipf_weights(len(self.blog_ids), blog_zipf))
+        self.user_cdf = np.cumsum(zipf_weights(len(self.user_ids), user_zipf))
+        self.country_cdf = np.cumsum(zipf_weights(len(self.country_ids), country_zipf))
+        self.hour_cdf = np.cumsum(DIURNAL_PROFILE)
+
+        # Day 0 is the day containing end_ts; weight each day back by its weekday
+        self.end_day = int(end_ts // 86400)
+        self.days = days
+        day_numbers = self.end_day - np.arange(days)
+        weekdays = (day_numbers + 3) % 7  # 1970-01-01 was a Thursday
+        day_weights = WEEKLY_PROFILE[weekdays]
+
+        # Day 0 only has the hours up to end_ts, and only their share of the traffic
+        elapsed = end_ts - self.end_day * 86400
+        self.current_hour = int(elapsed // 3600)
+        self.current_hour_fraction = elapsed % 3600 / 3600
+        today = DIURNAL_PROFILE.copy()
+        today[self.current_hour] *= self.current_hour_fraction
+        today[self.current_hour + 1:] = 0
+        self.today_hour_cdf = np.cumsum(today)
+        day_weights[0] *= today.sum() / DIURNAL_PROFILE.sum()
+
+        self.day_cdf = np.cumsum(day_weights)
+        self.end_ts = end_ts
+
+        self.anonymous_fraction = anonymous_fraction
+        self.seed = seed
+
+    def generate_chunk(self, chunk_index, size):
+        """
+        Generate ``size`` views as parallel arrays. Deterministic for a given
+        (seed, chunk_index), independent of how chunks are spread over workers.
+        """
+        rng = np.random.default_rng([self.seed, chunk_index])
+
+        blog = self.blog_ids[sample_from_cdf(rng, self.blog_cdf, size)]
+        country = self.country_ids[sample_from_cdf(rng, self.country_cdf, size)]
+
+        user = self.user_ids[sample_from_cdf(rng, self.user_cdf, size)]
+        anonymous = rng.random(size) < self.anonymous_fraction
+
+        day_back = sample_from_cdf(rng, self.day_cdf, size)
+        hour = sample_from_cdf(rng, self.hour_cdf, size)
+        # Today's views come from the hours before end_ts
+        today = day_back == 0
+        hour[today] = sample_from_cdf(rng, self.today_hour_cdf, int(today.sum()))
+        offset = rng.random(size) * 3600
+        offset[today & (hour == self.current_hour)] *= self.current_hour_fraction
+        viewed_at = (self.end_day - day_back) * 86400 + hour * 3600 + offset
+
+        # Log-normal reading time, median ~90s
+        duration = np.clip(rng.lognormal(mean=4.5, sigma=0.9, size=size), 1, 3600).astype(np.int64)
+
+        return {
+            'blog_id': blog,
+            'user_id': user,
+            'anonymous': anonymous,
+            'country_id': country,
+            'viewed_at': viewed_at,
+            'duration': duration,
+        }
+
+
+# Worker-process state, installed once per process by init_worker
+_worker_distribution = None
+
+
+def init_worker(distribution):
+    global _worker_distribution
+    _worker_distribution = distribution
+
+
+def generate_chunk_in_worker(task):
+    chunk_index, size = task
+    return chunk_index, _worker_distribution.generate_chunk(chunk_index, size)
+
+
+def epoch_to_db_strings(epoch_seconds, vendor):
+    """
+    Vectorized conversion of UTC epoch seconds to datetime literals
+    """
+    return micros_to_db_strings((np.asarray(epoch_seconds) * 1e6).astype(np.int64), vendor)
+
+
+def micros_to_db_strings(epoch_micros, vendor):
+    """
+    Vectorized conversion of UTC epoch microseconds to datetime literals.
+    SQLite stores datetimes as 'YYYY-MM-DD HH:MM:SS.ffffff' text, so the
+    separator matters for range comparisons; other backends take ISO-8601 UTC.
+    """
+    stamps = np.asarray(epoch_micros, dtype=np.int64).astype('datetime64[us]')
+    if vendor == 'sqlite':
+        return np.char.replace(np.datetime_as_string(stamps, unit='us'), 'T', ' ')
+    return np.datetime_as_string(stamps, unit='us', timezone='UTC')
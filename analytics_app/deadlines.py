@@ -0,0 +1,192 @@
+"""
+Per-statement time limits for the analytics endpoints. Inside a
+``query_time_limit`` block every statement (in any thread the context is
+copied to) is cancelled once it runs longer than the limit: with
+statement_timeout on PostgreSQL and a progress handler on SQLite. A
+cancelled statement raises QueryTimeoutException (504 with Retry-After).
+"""
+import time
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+from django.db.utils import OperationalError, DatabaseError
+
+from .instrumentation import query_wrapper
+from .exceptions import QueryTimeoutException
+
+DEFAULT_QUERY_DEADLINE_SETTINGS = {
+    'ENABLED': True,
+    'DEFAULT_MS': 10000,              # per statement, for endpoints not in ENDPOINTS_MS
+    'ENDPOINTS_MS': {},               # URL name (without -async) -> ms per statement
+    'SQLITE_PROGRESS_STEPS': 10000,   # SQLite VM instructions between deadline checks
+    'DEGRADED': True,                 # serve a partial / narrower result instead of a 504 where possible
+    'DEGRADED_RANGE': 'month',        # range the top-10 falls back to after a timeout
+}
+
+# PostgreSQL query_canceled
+PG_QUERY_CANCELED = '57014'
+
+_limit = contextvars.ContextVar('analytics_query_time_limit', default=None)
+
+
+def get_query_deadline_settings():
+    return {**DEFAULT_QUERY_DEADLINE_SETTINGS, **getattr(settings, 'QUERY_DEADLINES', {})}
+
+
+def endpoint_time_limit(endpoint):
+    """
+    Per-statement limit in ms for a URL name, or None when disabled
+    """
+    config = get_query_deadline_settings()
+    if not config['ENABLED']:
+        return None
+    return config['ENDPOINTS_MS'].get(endpoint, config['DEFAULT_MS'])
+
+
+def degraded_mode():
+    return get_query_deadline_settings()['DEGRADED']
+
+
+# Narrowest first; anything else is all-time
+RANGE_ORDER = ('week', 'month', 'year')
+
+
+def degraded_range(date_range):
+    """
+    The narrower DEGRADED_RANGE to retry a timed-out query with, or None
+    """
+    config = get_query_deadline_settings()
+    fallback = config['DEGRADED_RANGE']
+    if not config['DEGRADED'] or fallback not in RANGE_ORDER:
+        return None
+    width = RANGE_ORDER.index(date_range) if date_range in RANGE_ORDER else len(RANGE_ORDER)
+    return fallback if RANGE_ORDER.index(fallback) < width else None
+
+
+def is_statement_cancel(exc):
+    """
+    Whether a database error is a statement cancelled by a time limit
+    (before it is turned into QueryTimeoutException)
+    """
+    cause = exc.__cause__
+    if PG_QUERY_CANCELED in (getattr(cause, 'sqlstate', None), getattr(cause, 'pgcode', None)):
+        return True
+    return _limit.get() is not None and str(exc) == 'interrupted'
+
+
+def _pg_execute(execute, sql, params, many, context, limit_ms):
+    connection = context['connection']
+    raw = connection.connection.cursor()
+    try:
+        raw.execute(f"SET statement_timeout = {int(limit_ms)}")
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if is_statement_cancel(e):
+                raise QueryTimeoutException(
+                    f"Query exceeded its {limit_ms} ms limit", retry_after=limit_ms / 1000) from e
+            raise
+        finally:
+            try:
+                raw.execute("RESET statement_timeout")
+            except DatabaseError:
+                # aborted transaction: its rollback reverts the SET as well
+                if not connection.in_atomic_block:
+                    raise
+    finally:
+        raw.close()
+
+
+def _sqlite_execute(execute, sql, params, many, context, limit_ms):
+    raw = context['connection'].connection
+    steps = get_query_deadline_settings()['SQLITE_PROGRESS_STEPS']
+    deadline = time.monotonic() + limit_ms / 1000
+    # a non-zero return aborts the statement with "interrupted"
+    raw.set_progress_handler(lambda: time.monotonic() > deadline, steps)
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as e:
+        if time.monotonic() > deadline and is_statement_cancel(e):
+            raise QueryTimeoutException(
+                f"Query exceeded its {limit_ms} ms limit", retry_after=limit_ms / 1000) from e
+        raise
+    finally:
+        raw.set_progress_handler(None, steps)
+
+
+def _enforce_time_limit(execute, sql, params, many, context):
+    limit_ms = _limit.get()
+    vendor = context['connection'].vendor
+    if limit_ms is None:
+        return execute(sql, params, many, context)
+    if vendor == 'postgresql':
+        return _pg_execute(execute, sql, params, many, context, limit_ms)
+    if vendor == 'sqlite':
+        return _sqlite_execute(execute, sql, params, many, context, limit_ms)
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def query_time_limit(limit_ms):
+    """
+    Cancel statements in this block that run longer than ``limit_ms``
+    (None = no limit)
+    """
+    if limit_ms is None:
+        yield
+        return
+    token = _limit.set(limit_ms)
+    try:
+        with query_wrapper(_enforce_time_limit):
+            yield
+    finally:
+        _limit.reset(token)
+
+
+def time_limit_exceeded(exc):
+    """
+    Whether ``exc`` is, or was caused by, a statement cancelled here
+    """
+    while exc is not None:
+        if isinstance(exc, QueryTimeoutException):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def unless_timed_out(func, default=None):
+    """
+    ``func`` returning ``default`` instead of raising QueryTimeoutException
+    in degraded mode, for optional parts of a response
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except QueryTimeoutException:
+            if not degraded_mode():
+                raise
+            return default
+    return wrapper
+
+
+def with_query_deadline(endpoint):
+    """
+    Decorator applying the endpoint's QUERY_DEADLINES limit to a view method
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with query_time_limit(endpoint_time_limit(endpoint)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with query_time_limit(endpoint_time_limit(endpoint)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
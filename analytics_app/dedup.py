@@ -0,0 +1,330 @@
+import atexit
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from .monitoring.metrics import record_view_dedup
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_DEDUP_SETTINGS = {
+    'ENABLED': False,
+    'WINDOW_SECONDS': 30 * 60,
+    'BUCKETS': 6,
+    'CAPACITY_PER_BUCKET': 100000,
+    'ERROR_RATE': 0.001,
+    'STATE_FILE': None,
+}
+
+STATE_MAGIC = b'BLMF'
+STATE_VERSION = 1
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter backed by a bytearray
+    """
+
+    def __init__(self, capacity, error_rate, num_bits=None, num_hashes=None, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        if num_bits is None:
+            num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        if num_hashes is None:
+            num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key):
+        # Double hashing: k positions derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        h2 |= 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        """
+        Add key to the filter. Returns True if it was (probably) already present.
+        """
+        bits = self.bits
+        present = True
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def false_positive_rate(self):
+        """
+        Estimated false-positive probability at the current fill level
+        """
+        if not self.count:
+            return 0.0
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+def write_state(path, data):
+    """
+    Atomically replace ``path`` with ``data`` (write to temp file, then rename)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # a private temp file: every worker process may save the same STATE_FILE
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class RollingBloomFilter:
+    """
+    Sliding-window membership built from time-bucketed Bloom filters.
+
+    Each bucket covers ``window_seconds / num_buckets`` seconds. A key counts as
+    seen if any bucket still inside the window contains it; expired buckets are
+    dropped as time moves on, so memory stays bounded.
+    """
+
+    def __init__(self, window_seconds, num_buckets, capacity_per_bucket, error_rate):
+        self.window_seconds = window_seconds
+        self.num_buckets = num_buckets
+        self.bucket_seconds = window_seconds / num_buckets
+        self.capacity_per_bucket = capacity_per_bucket
+        self.error_rate = error_rate
+        self.buckets = {}  # bucket epoch -> BloomFilter
+
+    def _epoch(self, now):
+        return int(now // self.bucket_seconds)
+
+    def _expire(self, current_epoch):
+        oldest = current_epoch - self.num_buckets
+        for epoch in [e for e in self.buckets if e < oldest]:
+            del self.buckets[epoch]
+
+    def check_and_add(self, key, now=None):
+        """
+        Record key at time ``now``. Returns (duplicate, rotated): duplicate is
+        True if the key was seen within the window, rotated if a new bucket opened.
+        """
+        now = time.time() if now is None else now
+        epoch = self._epoch(now)
+        self._expire(epoch)
+
+        duplicate = any(key in bloom for e, bloom in self.buckets.items() if e != epoch)
+
+        rotated = epoch not in self.buckets
+        if rotated:
+            self.buckets[epoch] = BloomFilter(self.capacity_per_bucket, self.error_rate)
+        if self.buckets[epoch].add(key):
+            duplicate = True
+        return duplicate, rotated
+
+    def false_positive_rate(self):
+        """
+        Probability that an unseen key collides with any live bucket
+        """
+        miss = 1.0
+        for bloom in self.buckets.values():
+            miss *= 1 - bloom.false_positive_rate()
+        return 1 - miss
+
+    def dump(self):
+        """
+        Serialized copy of the live buckets, for ``write_state``
+        """
+        meta = {
+            'window_seconds': self.window_seconds,
+            'num_buckets': self.num_buckets,
+            'capacity_per_bucket': self.capacity_per_bucket,
+            'error_rate': self.error_rate,
+            'buckets': [
+                {
+                    'epoch': epoch,
+                    'num_bits': bloom.num_bits,
+                    'num_hashes': bloom.num_hashes,
+                    'count': bloom.count,
+                }
+                for epoch, bloom in sorted(self.buckets.items())
+            ],
+        }
+        header = json.dumps(meta).encode('utf-8')
+        parts = [STATE_MAGIC, struct.pack('<BI', STATE_VERSION, len(header)), header]
+        parts.extend(bytes(bloom.bits) for _, bloom in sorted(self.buckets.items()))
+        return b''.join(parts)
+
+    def save(self, path):
+        """
+        Persist live buckets atomically (write to temp file, then rename)
+        """
+        write_state(path, self.dump())
+
+    @classmethod
+    def load(cls, path, window_seconds, num_buckets, capacity_per_bucket, error_rate):
+        """
+        Restore buckets saved by ``save``. State written with a different
+        window/bucket layout is discarded rather than misinterpreted.
+        """
+        rolling = cls(window_seconds, num_buckets, capacity_per_bucket, error_rate)
+        if not path or not os.path.exists(path):
+            return rolling
+
+        try:
+            with open(path, 'rb') as fh:
+                if fh.read(4) != STATE_MAGIC:
+                    raise ValueError("bad magic")
+                version, header_len = struct.unpack('<BI', fh.read(5))
+                if version != STATE_VERSION:
+                    raise ValueError(f"unsupported version {version}")
+                meta = json.loads(fh.read(header_len).decode('utf-8'))
+                if (meta['window_seconds'], meta['num_buckets']) != (window_seconds, num_buckets):
+                    logger.info("Dedup window changed, discarding persisted state")
+                    return rolling
+                for info in meta['buckets']:
+                    bits = bytearray(fh.read((info['num_bits'] + 7) // 8))
+                    rolling.buckets[info['epoch']] = BloomFilter(
+                        meta['capacity_per_bucket'],
+                        meta['error_rate'],
+                        num_bits=info['num_bits'],
+                        num_hashes=info['num_hashes'],
+                        bits=bits,
+                        count=info['count'],
+                    )
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning("Could not load dedup state from %s: %s", path, e)
+            return cls(window_seconds, num_buckets, capacity_per_bucket, error_rate)
+
+        rolling._expire(rolling._epoch(time.time()))
+        return rolling
+
+
+class ViewDeduplicator:
+    """
+    Drops repeated (viewer, blog) pairs seen within the configured window.
+
+    Membership lives in memory; state is written to ``STATE_FILE`` whenever a
+    bucket rotates (on a background thread) and at interpreter exit, so
+    restarts keep the window.
+    """
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_DEDUP_SETTINGS, **(config or {})}
+        self.enabled = bool(self.config['ENABLED'])
+        self.state_file = self.config['STATE_FILE']
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self.checked = 0
+        self.dropped = 0
+        self.filter = RollingBloomFilter.load(
+            str(self.state_file) if self.state_file else None,
+            self.config['WINDOW_SECONDS'],
+            self.config['BUCKETS'],
+            self.config['CAPACITY_PER_BUCKET'],
+            self.config['ERROR_RATE'],
+        )
+
+    @staticmethod
+    def make_key(blog_id, user_id=None, client_id=None):
+        if user_id is not None:
+            viewer = f"u:{user_id}"
+        else:
+            viewer = f"c:{client_id or ''}"
+        return f"{viewer}|b:{blog_id}".encode('utf-8')
+
+    def is_duplicate(self, blog_id, user_id=None, client_id=None, now=None):
+        """
+        Returns True if this view should be dropped
+        """
+        if not self.enabled:
+            return False
+        if user_id is None and not client_id:
+            return False  # no viewer identity: distinct visitors would share one key
+
+        key = self.make_key(blog_id, user_id, client_id)
+        with self._lock:
+            duplicate, rotated = self.filter.check_and_add(key, now)
+            self.checked += 1
+            if duplicate:
+                self.dropped += 1
+            false_positive_rate = self.filter.false_positive_rate()
+        record_view_dedup(duplicate, false_positive_rate)
+        if rotated:
+            self.save_in_background()
+        return duplicate
+
+    def save(self):
+        """
+        Copy the state under the lock, write it outside so checks never wait on disk
+        """
+        if not self.state_file:
+            return
+        with self._lock:
+            data = self.filter.dump()
+        try:
+            with self._write_lock:
+                write_state(str(self.state_file), data)
+        except OSError as e:
+            logger.warning("Could not persist dedup state to %s: %s", self.state_file, e)
+
+    def save_in_background(self):
+        """
+        save() on a daemon thread; skipped if a previous write is still running
+        """
+        if not self.state_file:
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self.save, name='view-dedup-save', daemon=True)
+            self._writer.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'window_seconds': self.config['WINDOW_SECONDS'],
+                'checked': self.checked,
+                'dropped': self.dropped,
+                'drop_rate': round(self.dropped / self.checked, 4) if self.checked else 0.0,
+                'active_buckets': len(self.filter.buckets),
+                'estimated_false_positive_rate': round(self.filter.false_positive_rate(), 6),
+            }
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_deduplicator():
+    """
+    Process-wide deduplicator configured from ``settings.VIEW_DEDUP``
+    """
+    global _deduplicator
+    if _deduplicator is None:
+        with _deduplicator_lock:
+            if _deduplicator is None:
+                _deduplicator = ViewDeduplicator(getattr(settings, 'VIEW_DEDUP', None))
+                atexit.register(_deduplicator.save)
+    return _deduplicator
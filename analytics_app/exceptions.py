@@ -1,6 +1,7 @@
 
 from rest_framework.exceptions import APIException
 from rest_framework import status
+import math
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,4 +50,32 @@ class DatabaseQueryException(AnalyticsAPIException):
     """Database query error"""
     status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
     default_detail = 'Database query error.'
-    default_code = 'database_error'
\ No newline at end of file
+    default_code = 'database_error'
+
+class RetryLaterException(AnalyticsAPIException):
+    """Request refused for now; ``retry_after`` is sent as the Retry-After header"""
+
+    def __init__(self, detail=None, retry_after=1, code=None, log_level='info'):
+        super().__init__(detail, code, log_level)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RateLimitedException(RetryLaterException):
+    """Client exceeded its query quota"""
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'Query quota exceeded.'
+    default_code = 'rate_limited'
+
+
+class ServiceOverloadedException(RetryLaterException):
+    """No capacity for the request"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The analytics service is overloaded.'
+    default_code = 'overloaded'
+
+
+class QueryTimeoutException(RetryLaterException):
+    """A query ran past its time limit and was cancelled"""
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = 'The query took too long and was cancelled.'
+    default_code = 'query_timeout'
@@ -6,9 +6,14 @@ import json
 from datetime import datetime, timedelta
 from django.utils import timezone
 from .models import BlogView
+from .tracing import span
 
 
 class DynamicFilterBackend(filters.DjangoFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        with span('filters.filter_queryset', backend=type(self).__name__):
+            return super().filter_queryset(request, queryset, view)
+
     def get_filterset_class(self, view, queryset=None):
         class DynamicFilterSet(filters.FilterSet):
             date_from = filters.DateFilter(field_name='viewed_at', lookup_expr='gte')
@@ -0,0 +1,136 @@
+import re
+import time
+import logging
+import threading
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+_state = threading.local()
+
+# Execute wrappers active in the current context. Context variables follow
+# the request into sync_to_async worker threads, where the async ORM runs its
+# queries on a different connection object than the one the request started on.
+_context_wrappers = contextvars.ContextVar('analytics_query_wrappers', default=())
+
+
+def _dispatch_query(execute, sql, params, many, context):
+    wrappers = _context_wrappers.get()
+    for wrapper in reversed(wrappers):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_dispatcher(connection, **kwargs):
+    """
+    Add the context dispatcher as the outermost execute wrapper of a
+    connection (connection_created receiver)
+    """
+    if _dispatch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch_query)
+
+
+@contextmanager
+def query_wrapper(wrapper):
+    """
+    Apply an execute wrapper to every query made in the current context, on
+    any database and in any thread the context is copied to
+    """
+    token = _context_wrappers.set(_context_wrappers.get() + (wrapper,))
+    try:
+        yield wrapper
+    finally:
+        _context_wrappers.reset(token)
+
+
+@contextmanager
+def untracked():
+    """
+    Hide queries run inside this block from recorders, e.g. telemetry writes
+    that should not count against the request being measured.
+    """
+    previous = getattr(_state, 'untracked', False)
+    _state.untracked = True
+    try:
+        yield
+    finally:
+        _state.untracked = previous
+
+
+def is_untracked():
+    return getattr(_state, 'untracked', False)
+
+
+def fingerprint_sql(sql):
+    """
+    Normalize a statement to its shape: literals and placeholders become '?',
+    IN-lists collapse to '(...)', whitespace is squeezed.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    Execute wrapper that records query count, DB time and the slowest statement.
+
+    Install with ``recorder.record()`` (all databases, follows async and
+    thread-pool queries) or ``connection.execute_wrapper(recorder)``.
+    Pass ``fingerprint=False`` to skip statement fingerprinting on hot paths.
+    """
+
+    def __init__(self, fingerprint=True):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'untracked', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.total_ms += duration_ms
+            if duration_ms > self.slowest_ms:
+                self.slowest_ms = duration_ms
+                self.slowest_sql = sql
+            if self.fingerprint:
+                self.fingerprints[fingerprint_sql(sql)] += 1
+
+    @contextmanager
+    def record(self):
+        with query_wrapper(self):
+            yield self
+
+    def repeated(self, threshold):
+        """
+        Statement shapes executed at least ``threshold`` times (likely N+1)
+        """
+        return {fp: n for fp, n in self.fingerprints.items() if n >= threshold}
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total_ms, 3),
+            'slowest_ms': round(self.slowest_ms, 3),
+            'slowest_sql': self.slowest_sql,
+        }
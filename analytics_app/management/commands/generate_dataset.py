@@ -0,0 +1,192 @@
+
+import multiprocessing
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from analytics_app.models import Country, Blog, BlogView
+from analytics_app.datasets import (
+    BENCH_USER_PREFIX,
+    COUNTRIES,
+    MAX_COUNTRIES,
+    BLOG_TOPICS,
+    ViewDistribution,
+    synthetic_country_code,
+    init_worker,
+    generate_chunk_in_worker,
+    epoch_to_db_strings,
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate a large seeded synthetic dataset (1M-100M views) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', type=int, default=1_000_000, help='Number of blog views to generate')
+        parser.add_argument('--users', type=int, default=20_000, help='Number of users')
+        parser.add_argument('--blogs', type=int, default=50_000, help='Number of blogs')
+        parser.add_argument('--countries', type=int, default=len(COUNTRIES), help='Number of countries')
+        parser.add_argument('--days', type=int, default=365, help='Spread views over this many days up to now')
+        parser.add_argument('--anonymous-fraction', type=float, default=0.2, help='Share of views without a user')
+        parser.add_argument('--blog-zipf', type=float, default=1.1, help='Zipf exponent of blog popularity')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=50_000, help='Rows per bulk insert')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used to generate view batches')
+        parser.add_argument('--clear', action='store_true', help='Delete existing views, blogs, countries and bench users first')
+
+    def handle(self, *args, **options):
+        if options['views'] < 0 or options['batch_size'] <= 0:
+            raise CommandError("--views must be >= 0 and --batch-size > 0")
+        if not 1 <= options['countries'] <= MAX_COUNTRIES:
+            raise CommandError(f"--countries must be between 1 and {MAX_COUNTRIES}")
+
+        started = time.perf_counter()
+        rng = np.random.default_rng(options['seed'])
+        # bulk_create sizes batches from backend limits, which needs a live connection
+        connection.ensure_connection()
+
+        if options['clear']:
+            self.clear()
+
+        country_ids = self.create_countries(options['countries'])
+        user_ids = self.create_users(options['users'])
+        blog_ids = self.create_blogs(options['blogs'], user_ids, country_ids, options['days'], rng)
+
+        distribution = ViewDistribution(
+            blog_ids=blog_ids,
+            user_ids=user_ids,
+            country_ids=country_ids,
+            end_ts=timezone.now().timestamp(),
+            days=options['days'],
+            anonymous_fraction=options['anonymous_fraction'],
+            blog_zipf=options['blog_zipf'],
+            seed=options['seed'],
+        )
+        total = self.create_views(distribution, options['views'], options['batch_size'], options['workers'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(country_ids)} countries, {len(user_ids):,} users, "
+            f"{len(blog_ids):,} blogs and {total:,} views in {elapsed:.1f}s"
+        ))
+
+    def clear(self):
+        self.stdout.write("Clearing existing data...")
+        # Raw delete: the ORM would load every view to run cascades/signals
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(BlogView._meta.db_table)}")
+        Blog.objects.all().delete()
+        Country.objects.all().delete()
+        User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+
+    def create_countries(self, count):
+        rows = list(COUNTRIES[:count])
+        # Synthesize extra countries beyond the built-in list
+        rows += [(f"Country {i}", synthetic_country_code(i)) for i in range(len(rows), count)]
+        Country.objects.bulk_create(
+            [Country(name=name, code=code) for name, code in rows],
+            ignore_conflicts=True
+        )
+        # Keep list order: it is the popularity order used for country skew
+        ids_by_code = dict(Country.objects.filter(code__in=[code for _, code in rows]).values_list('code', 'id'))
+        return [ids_by_code[code] for _, code in rows]
+
+    def create_users(self, count):
+        self.stdout.write(f"Creating {count:,} users...")
+        existing = User.objects.filter(username__startswith=BENCH_USER_PREFIX).count()
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"{BENCH_USER_PREFIX}{i}",
+                    first_name=f"Bench{i}",
+                    last_name='User',
+                    password='!',  # unusable password, no hashing cost
+                )
+                for i in range(existing, count)
+            ],
+            batch_size=5000
+        )
+        return list(
+            User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+            .order_by('id').values_list('id', flat=True)[:count]
+        )
+
+    def create_blogs(self, count, user_ids, country_ids, days, rng):
+        self.stdout.write(f"Creating {count:,} blogs...")
+        now_ts = timezone.now().timestamp()
+        # Prolific authors: author choice follows the same skew as viewers
+        author_weights = 1.0 / np.arange(1, len(user_ids) + 1) ** 0.9
+        authors = rng.choice(np.asarray(user_ids), size=count, p=author_weights / author_weights.sum())
+        countries = rng.choice(np.asarray(country_ids), size=count)
+        topics = rng.integers(0, len(BLOG_TOPICS), size=count)
+        created = now_ts - rng.random(count) * (days + 30) * 86400
+
+        blog_ids = []
+        for start in range(0, count, 5000):
+            stop = min(start + 5000, count)
+            batch = [
+                Blog(
+                    title=f"{BLOG_TOPICS[topics[i]]} in practice #{i}",
+                    content=f"Synthetic article {i} about {BLOG_TOPICS[topics[i]]}.",
+                    author_id=int(authors[i]),
+                    country_id=int(countries[i]),
+                    created_at=datetime.fromtimestamp(created[i], tz=dt_timezone.utc),
+                )
+                for i in range(start, stop)
+            ]
+            blog_ids.extend(blog.pk for blog in Blog.objects.bulk_create(batch))
+        return blog_ids
+
+    def create_views(self, distribution, total, batch_size, workers):
+        table = connection.ops.quote_name(BlogView._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(c) for c in
+                            ('blog_id', 'user_id', 'country_id', 'viewed_at', 'duration'))
+        sql = f"INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s)"
+
+        tasks = [(i, min(batch_size, total - start)) for i, start in enumerate(range(0, total, batch_size))]
+        self.stdout.write(f"Creating {total:,} views in {len(tasks)} batches using {workers} worker(s)...")
+
+        # Workers only generate NumPy arrays; writes stay on this process's
+        # connection, which also keeps SQLite to a single writer.
+        if workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(distribution,))
+            chunks = pool.imap_unordered(generate_chunk_in_worker, tasks)
+        else:
+            pool = None
+            init_worker(distribution)
+            chunks = map(generate_chunk_in_worker, tasks)
+
+        written = 0
+        started = time.perf_counter()
+        try:
+            for _, chunk in chunks:
+                user_ids = chunk['user_id'].astype(object)
+                user_ids[chunk['anonymous']] = None
+                rows = list(zip(
+                    chunk['blog_id'].tolist(),
+                    user_ids.tolist(),
+                    chunk['country_id'].tolist(),
+                    epoch_to_db_strings(chunk['viewed_at'], connection.vendor).tolist(),
+                    chunk['duration'].tolist(),
+                ))
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(sql, rows)
+
+                written += len(rows)
+                elapsed = time.perf_counter() - started
+                rate = written / elapsed if elapsed else 0
+                eta = (total - written) / rate if rate else 0
+                self.stdout.write(
+                    f"  {written:,}/{total:,} views ({written / total:.0%}) "
+                    f"- {rate:,.0f} rows/s, ETA {eta:.0f}s"
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return written
@@ -0,0 +1,83 @@
+
+import json
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.benchmarks import MixLoadGenerator, parse_mix, build_report
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with a weighted mix of analytics requests and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the server under test')
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker threads (open connections)')
+        parser.add_argument('--rate', type=float, help='Target requests/second (open loop). Default: closed loop')
+        parser.add_argument('--duration', type=float, default=30.0, help='Test duration in seconds')
+        parser.add_argument('--mix', default='blog-views=5,top=3,performance=2',
+                            help='Weighted endpoint mix, e.g. blog-views=5,top=3,performance=2')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds')
+        parser.add_argument('--interval', type=float, default=1.0, help='Bucket width of the latency timeline')
+        parser.add_argument('--seed', type=int, help='Seed for the request mix')
+        parser.add_argument('--output', help='Write the full JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['duration'] <= 0 or options['interval'] <= 0:
+            raise CommandError("--concurrency, --duration and --interval must be positive")
+        try:
+            mix = parse_mix(options['mix'])
+            generator = MixLoadGenerator(
+                options['url'], mix,
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                rate=options['rate'],
+                timeout=options['timeout'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        mode = f"{options['rate']:g} req/s target" if options['rate'] else "closed loop"
+        self.stdout.write(
+            f"Load testing {options['url']} for {options['duration']:g}s "
+            f"with {options['concurrency']} workers ({mode})..."
+        )
+        samples = generator.run()
+        if not samples:
+            raise CommandError("No requests were sent")
+
+        report = build_report(samples, generator.elapsed, options['interval'])
+        report['config'] = {key: options[key] for key in
+                            ('url', 'concurrency', 'rate', 'duration', 'mix', 'seed')}
+        self.print_report(report)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"\nReport written to {options['output']}")
+
+    def print_report(self, report):
+        latency = report['latency']
+        self.stdout.write("\n" + "="*60)
+        self.stdout.write("LOAD TEST SUMMARY")
+        self.stdout.write("="*60)
+        self.stdout.write(f"  Requests:    {report['requests']:,} in {report['duration_s']:.1f}s")
+        self.stdout.write(f"  Throughput:  {report['throughput_rps']:.1f} req/s")
+        self.stdout.write(f"  Error rate:  {report['error_rate']:.2%}  {report['status_codes']}")
+        self.stdout.write(
+            f"  Latency:     p50 {latency['p50_ms']:.1f}ms  p95 {latency['p95_ms']:.1f}ms  "
+            f"p99 {latency['p99_ms']:.1f}ms  max {latency['max_ms']:.1f}ms"
+        )
+
+        self.stdout.write("\nPer endpoint:")
+        for endpoint, stats in sorted(report['endpoints'].items()):
+            self.stdout.write(
+                f"  {endpoint:<12} {stats['requests']:>7,} req  p50 {stats['p50_ms']:>8.1f}ms  "
+                f"p95 {stats['p95_ms']:>8.1f}ms  p99 {stats['p99_ms']:>8.1f}ms"
+            )
+
+        self.stdout.write("\nLatency over time:")
+        self.stdout.write(f"  {'t(s)':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'max':>9} {'errors':>7}")
+        for point in report['timeline']:
+            self.stdout.write(
+                f"  {point['t_s']:>7.1f} {point['rps']:>8.1f} {point['p50_ms']:>9.1f} "
+                f"{point['p95_ms']:>9.1f} {point['max_ms']:>9.1f} {point['errors']:>7}"
+            )
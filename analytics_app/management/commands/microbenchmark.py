@@ -0,0 +1,86 @@
+
+import json
+import logging
+import platform
+from contextlib import contextmanager, nullcontext
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from analytics_app.microbenchmarks import MICROBENCHMARKS, run_microbenchmarks
+
+
+@contextmanager
+def null_log_handlers(logger_name):
+    """
+    Keep log records being created and formatted by the code under test,
+    but drop them before they reach the console / log files.
+    """
+    log = logging.getLogger(logger_name)
+    handlers, propagate = log.handlers, log.propagate
+    log.handlers, log.propagate = [logging.NullHandler()], False
+    try:
+        yield
+    finally:
+        log.handlers, log.propagate = handlers, propagate
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark the pure-Python request layers (ns/op and bytes/op)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--case', action='append', default=[],
+                            help=f"Only run benchmarks whose name contains this text (repeatable). "
+                                 f"Available: {', '.join(MICROBENCHMARKS)}")
+        parser.add_argument('--number', type=int, help='Calls per timing round (default: auto-range)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing rounds; the fastest is reported')
+        parser.add_argument('--min-time', type=float, default=0.2, help='Target seconds per round when auto-ranging')
+        parser.add_argument('--with-log-output', action='store_true',
+                            help='Let analytics_app log records reach the configured handlers')
+        parser.add_argument('--output', help='Write JSON results to this file')
+        parser.add_argument('--baseline', help='Show the change against a previous JSON results file')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or (options['number'] is not None and options['number'] < 1):
+            raise CommandError("--number and --repeat must be at least 1")
+
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as fh:
+                    baseline = json.load(fh)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        logs = nullcontext() if options['with_log_output'] else null_log_handlers('analytics_app')
+        with logs:
+            results = run_microbenchmarks(
+                names=options['case'],
+                number=options['number'],
+                repeat=options['repeat'],
+                min_time=options['min_time'],
+            )
+        if not results:
+            raise CommandError("No microbenchmark matched --case")
+
+        self.stdout.write(f"{'ns/op':>12} {'bytes/op':>10} {'retained':>9} {'change':>8}  benchmark")
+        for name, stats in results.items():
+            change = ''
+            previous = baseline.get(name)
+            if previous and previous.get('ns_per_op'):
+                change = f"{stats['ns_per_op'] / previous['ns_per_op'] - 1:+.1%}"
+            self.stdout.write(
+                f"{stats['ns_per_op']:>12,.0f} {stats['bytes_per_op']:>10,} "
+                f"{stats['retained_bytes_per_op']:>9,} {change:>8}  {name}"
+            )
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'timestamp': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'log_output': options['with_log_output'],
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"\nResults written to {options['output']}")
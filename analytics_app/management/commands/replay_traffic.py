@@ -0,0 +1,154 @@
+
+import re
+import json
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from analytics_app.models import APIRequestLog
+from analytics_app.routers import reads_from_replica
+from analytics_app.benchmarks import ReplayLoadGenerator, build_report, query_shape, compare_shapes
+
+DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_moment(value):
+    """
+    Accept an ISO datetime or a relative duration like '90m', '6h', '2d' (ago)
+    """
+    match = re.fullmatch(r'(\d+)([smhd])', value.strip())
+    if match:
+        return timezone.now() - timedelta(**{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+    moment = parse_datetime(value)
+    if moment is None:
+        raise CommandError(f"Cannot parse time '{value}'")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = 'Export logged analytics requests, replay them against a server, and compare builds per query shape'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        export = subparsers.add_parser('export', help='Write a time window of APIRequestLog to a replay file')
+        export.add_argument('output', help='Replay file (JSON lines)')
+        export.add_argument('--since', default='1h', help="Window start: ISO datetime or '30m', '6h', '2d' ago")
+        export.add_argument('--until', help='Window end (default: now)')
+        export.add_argument('--path-prefix', default='/analytics/', help='Only export requests under this path')
+        export.add_argument('--limit', type=int, help='Maximum number of requests')
+
+        replay = subparsers.add_parser('replay', help='Replay a capture file against a running server')
+        replay.add_argument('input', help='Replay file written by export')
+        replay.add_argument('--url', default='http://localhost:8000', help='Base URL of the target instance')
+        replay.add_argument('--mode', choices=['fast', 'timed'], default='fast',
+                            help='fast: as quickly as possible; timed: keep original inter-arrival times')
+        replay.add_argument('--speed', type=float, default=1.0, help='Time compression factor in timed mode')
+        replay.add_argument('--concurrency', type=int, default=8)
+        replay.add_argument('--timeout', type=float, default=10.0)
+        replay.add_argument('--output', help='Write the replay report (JSON) for later comparison')
+
+        compare = subparsers.add_parser('compare', help='Compare two replay reports per query shape')
+        compare.add_argument('before', help='Report of the baseline build')
+        compare.add_argument('after', help='Report of the candidate build')
+        compare.add_argument('--metric', default='p50_ms', help='Latency statistic to compare (p50_ms, p95_ms, ...)')
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    @reads_from_replica
+    def handle_export(self, options):
+        since = parse_moment(options['since'])
+        until = parse_moment(options['until']) if options['until'] else timezone.now()
+
+        logs = APIRequestLog.objects.filter(
+            request_time__gte=since,
+            request_time__lt=until,
+            method='GET',
+            path__startswith=options['path_prefix'],
+        ).order_by('request_time').values_list('request_time', 'path', 'query_params')
+        if options['limit']:
+            logs = logs[:options['limit']]
+
+        count = 0
+        first = None
+        with open(options['output'], 'w') as fh:
+            for request_time, path, query_params in logs.iterator(chunk_size=5000):
+                first = first or request_time
+                query_params = query_params or {}
+                fh.write(json.dumps({
+                    't': round((request_time - first).total_seconds(), 6),
+                    'path': path,
+                    'query_params': query_params,
+                    'shape': query_shape(path, query_params),
+                }) + '\n')
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {count:,} requests from {since.isoformat()} to {until.isoformat()} into {options['output']}"
+        ))
+
+    def handle_replay(self, options):
+        try:
+            with open(options['input']) as fh:
+                entries = [json.loads(line) for line in fh if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read replay file: {e}")
+        if not entries:
+            raise CommandError("Replay file is empty")
+
+        speed = options['speed'] if options['mode'] == 'timed' else None
+        try:
+            generator = ReplayLoadGenerator(
+                options['url'], entries,
+                concurrency=options['concurrency'],
+                speed=speed,
+                timeout=options['timeout'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Replaying {len(entries):,} requests against {options['url']} ({options['mode']} mode)...")
+        samples = generator.run()
+        report = build_report(samples, generator.elapsed, interval=max(1.0, generator.elapsed / 20))
+        report['shapes'] = report.pop('endpoints')
+        report['config'] = {key: options[key] for key in ('input', 'url', 'mode', 'speed', 'concurrency')}
+
+        latency = report['latency']
+        self.stdout.write(
+            f"  {report['requests']:,} requests, {report['throughput_rps']:.1f} req/s, "
+            f"errors {report['error_rate']:.2%}, p50 {latency['p50_ms']:.1f}ms, p95 {latency['p95_ms']:.1f}ms"
+        )
+        self.stdout.write(f"\n  {'requests':>8} {'p50':>9} {'p95':>9}  shape")
+        for shape, stats in sorted(report['shapes'].items(), key=lambda item: -item[1]['requests']):
+            self.stdout.write(f"  {stats['requests']:>8,} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f}  {shape}")
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"\nReport written to {options['output']}")
+
+    def handle_compare(self, options):
+        reports = []
+        for path in (options['before'], options['after']):
+            try:
+                with open(path) as fh:
+                    reports.append(json.load(fh)['shapes'])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read replay report {path}: {e}")
+
+        metric = options['metric']
+        rows = compare_shapes(reports[0], reports[1], metric)
+        self.stdout.write(f"{'before':>10} {'after':>10} {'change':>9}  shape ({metric})")
+        for row in rows:
+            before = f"{row['before_ms']:.1f}" if row['before_ms'] is not None else '-'
+            after = f"{row['after_ms']:.1f}" if row['after_ms'] is not None else '-'
+            change = f"{row['change']:+.1%}" if row['change'] is not None else 'n/a'
+            line = f"{before:>10} {after:>10} {change:>9}  {row['shape']}"
+            if row['change'] is not None and row['change'] > 0.1:
+                line = self.style.ERROR(line)
+            elif row['change'] is not None and row['change'] < -0.1:
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
@@ -0,0 +1,33 @@
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.snapshots import restore_snapshot, SnapshotError
+
+
+class Command(BaseCommand):
+    help = 'Restore a snapshot written by snapshot_dataset using bulk loads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot directory')
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete existing countries, users, blogs and views first')
+        parser.add_argument('--no-verify', action='store_true',
+                            help='Skip checking table hashes against the manifest')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.stdout.write(f"Restoring snapshot from {options['path']}...")
+        try:
+            manifest = restore_snapshot(
+                options['path'],
+                replace=options['replace'],
+                verify=not options['no_verify'],
+                progress=self.stdout.write,
+            )
+        except SnapshotError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot restored in {time.perf_counter() - started:.1f}s\n"
+            f"  content hash: {manifest['content_hash']}"
+        ))
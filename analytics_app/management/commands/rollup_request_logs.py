@@ -0,0 +1,25 @@
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics_app.monitoring.rollup import rebuild_rollups
+from .replay_traffic import parse_moment
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly APIRequestRollup rows from APIRequestLog (backfill or repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='30d', help="Window start: ISO datetime or '6h', '30d' ago")
+        parser.add_argument('--until', help='Window end (default: now). Both ends are truncated to the hour.')
+
+    def handle(self, *args, **options):
+        since = parse_moment(options['since'])
+        until = parse_moment(options['until']) if options['until'] else timezone.now()
+        count = rebuild_rollups(since, until)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {count:,} logged requests from {since.isoformat()} to {until.isoformat()}"
+        ))
+        self.stdout.write(
+            "Note: only requests kept by API_MONITORING sampling are in the log; "
+            "live rollups count every request."
+        )
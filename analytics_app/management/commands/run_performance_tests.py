@@ -1,95 +1,251 @@
 
-import time
-import statistics
-from django.core.management.base import BaseCommand
-from django.test import Client
-from django.urls import reverse
+import os
+import csv
 import json
+import platform
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.db.models import F
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from analytics_app.models import BlogView
+from analytics_app.services import AnalyticsService
+from analytics_app.benchmarks import (
+    BENCHMARK_CASES,
+    SCALING_SIZES,
+    SCALING_DRIVERS,
+    run_case,
+    compare_to_baseline,
+    scaling_cases,
+    fit_scaling,
+)
+from analytics_app.snapshots import MANIFEST_NAME, SnapshotError, dump_snapshot, restore_snapshot
+
 
 class Command(BaseCommand):
-    help = 'Run performance tests on all API endpoints'
-    
+    help = 'Benchmark all API endpoints with percentiles, query counts and baseline comparison'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per case')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per case before timing')
+        parser.add_argument('--sizes', default='',
+                            help='Comma-separated dataset sizes (views), e.g. 10000,100000. '
+                                 'Each size REPLACES the current data. Default: use the current database.')
+        parser.add_argument('--snapshot-dir', default='snapshots',
+                            help='Per-size snapshots are restored from / saved to <dir>/<size>')
+        parser.add_argument('--output', help='Write machine-readable JSON results to this file')
+        parser.add_argument('--baseline', help='Compare against a previous JSON results file')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative regression of --metric before failing (0.2 = +20%%)')
+        parser.add_argument('--metric', default='p95_ms', help='Latency statistic compared with the baseline')
+        parser.add_argument('--case', action='append', default=[],
+                            help='Only run cases whose name contains this text (repeatable)')
+        parser.add_argument('--scaling', action='store_true',
+                            help='Run every endpoint across ranges/periods at each size (default sizes '
+                                 f"{','.join(map(str, SCALING_SIZES))}) and fit how latency grows")
+        parser.add_argument('--scaling-metric', default='p50_ms', help='Statistic the scaling curves are fitted to')
+        parser.add_argument('--csv', default='scaling.csv', help='CSV file for the scaling table')
+
     def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+
+        cases = [
+            case for case in (scaling_cases() if options['scaling'] else BENCHMARK_CASES)
+            if not options['case'] or any(f.lower() in case['name'].lower() for f in options['case'])
+        ]
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        if options['scaling'] and not sizes:
+            sizes = list(SCALING_SIZES)
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'datasets': {},
+            },
+            'results': {},
+        }
+
+        for size in sizes or [None]:
+            dataset_key, dataset_info = self.prepare_dataset(size, options['snapshot_dir'])
+            report['meta']['datasets'][dataset_key] = dataset_info
+            report['results'][dataset_key] = self.run_cases(cases, dataset_key, options)
+            if options['scaling']:
+                for case in cases:
+                    report['results'][dataset_key][case['name']].update(self.measure_drivers(case))
+
+        self.print_summary(report['results'])
+
+        if options['scaling']:
+            report['scaling'] = self.fit_curves(cases, report['results'], options['scaling_metric'])
+            self.print_scaling(report['scaling'], options['scaling_metric'])
+            self.write_scaling_csv(report['scaling'], options['csv'])
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"\nResults written to {options['output']}")
+
+        if options['baseline']:
+            self.check_baseline(report, options)
+
+    def prepare_dataset(self, size, snapshot_dir):
+        """
+        Make the database hold a dataset of ``size`` views.
+        Restores <snapshot_dir>/<size> if present, otherwise generates and snapshots it.
+        """
+        if size is None:
+            views = BlogView.objects.count()
+            return 'current', {'views': views}
+
+        path = os.path.join(snapshot_dir, str(size))
+        manifest = None
+        if os.path.exists(os.path.join(path, MANIFEST_NAME)):
+            self.stdout.write(f"\nRestoring {size:,}-view dataset from {path}...")
+            try:
+                manifest = restore_snapshot(path, replace=True)
+            except SnapshotError as e:
+                # e.g. written by an older snapshot format
+                self.stdout.write(self.style.WARNING(f"  Cannot restore ({e}), regenerating"))
+        if manifest is None:
+            self.stdout.write(f"\nGenerating {size:,}-view dataset...")
+            call_command(
+                'generate_dataset',
+                views=size,
+                users=max(100, size // 500),
+                blogs=max(100, size // 200),
+                clear=True,
+                stdout=self.stdout,
+            )
+            manifest = dump_snapshot(path)
+        return str(size), {'views': size, 'content_hash': manifest['content_hash']}
+
+    def run_cases(self, cases, dataset_key, options):
         client = Client()
         results = {}
-        
-        test_cases = [
-            {
-                'name': 'API #1 - Blog Views by Country',
-                'url': '/analytics/blog-views/',
-                'params': {'object_type': 'country', 'range': 'month'}
-            },
-            {
-                'name': 'API #1 - Blog Views by User',
-                'url': '/analytics/blog-views/',
-                'params': {'object_type': 'user', 'range': 'month'}
-            },
-            {
-                'name': 'API #2 - Top Users',
-                'url': '/analytics/top/',
-                'params': {'top': 'user'}
-            },
-            {
-                'name': 'API #2 - Top Countries',
-                'url': '/analytics/top/',
-                'params': {'top': 'country'}
-            },
-            {
-                'name': 'API #2 - Top Blogs',
-                'url': '/analytics/top/',
-                'params': {'top': 'blog'}
-            },
-            {
-                'name': 'API #3 - Monthly Performance',
-                'url': '/analytics/performance/',
-                'params': {'compare': 'month'}
-            },
-            {
-                'name': 'API #3 - Weekly Performance',
-                'url': '/analytics/performance/',
-                'params': {'compare': 'week'}
-            },
-        ]
-        
-        for test_case in test_cases:
-            self.stdout.write(f"\nTesting: {test_case['name']}")
-            
-            response_times = []
-            for i in range(10):  # Run 10 iterations
-                start_time = time.perf_counter()
-                response = client.get(test_case['url'], test_case['params'])
-                end_time = time.perf_counter()
-                
-                response_time = (end_time - start_time) * 1000  # Convert to ms
-                response_times.append(response_time)
-                
-                if i == 0:  # First response
-                    status = "✓" if response.status_code == 200 else "✗"
-                    self.stdout.write(f"  {status} Status: {response.status_code}")
-            
-            # Calculate statistics
-            avg_time = statistics.mean(response_times)
-            min_time = min(response_times)
-            max_time = max(response_times)
-            std_dev = statistics.stdev(response_times) if len(response_times) > 1 else 0
-            
-            results[test_case['name']] = {
-                'avg_response_time_ms': round(avg_time, 2),
-                'min_response_time_ms': round(min_time, 2),
-                'max_response_time_ms': round(max_time, 2),
-                'std_dev_ms': round(std_dev, 2),
-                'iterations': len(response_times)
-            }
-            
-            self.stdout.write(f"  Average: {avg_time:.2f}ms")
-            self.stdout.write(f"  Range: {min_time:.2f}ms - {max_time:.2f}ms")
-        
-        # Print summary
-        self.stdout.write("\n" + "="*50)
+        for case in cases:
+            self.stdout.write(f"\n[{dataset_key}] {case['name']}")
+            stats = run_case(client, case, options['iterations'], options['warmup'])
+            results[case['name']] = stats
+
+            status = "✓" if stats['status_codes'] == [200] else "✗"
+            self.stdout.write(f"  {status} Status: {', '.join(map(str, stats['status_codes']))}")
+            self.stdout.write(
+                f"  p50 {stats['p50_ms']:.2f}ms  p95 {stats['p95_ms']:.2f}ms  "
+                f"p99 {stats['p99_ms']:.2f}ms  max {stats['max_ms']:.2f}ms"
+            )
+            self.stdout.write(f"  {stats['queries']} queries, {stats['db_mean_ms']:.2f}ms DB per request")
+        return results
+
+    def measure_drivers(self, case):
+        """
+        Size variables a case may scale with: all views, views in the
+        selected range, and the number of groups the query aggregates.
+        """
+        queryset = BlogView.objects.all()
+        total_views = queryset.count()
+        if case['range']:
+            queryset = AnalyticsService._apply_date_range(queryset, case['range'])
+        range_views = queryset.count() if case['range'] else total_views
+
+        if case.get('trunc'):
+            groups = queryset.annotate(period=Trunc(case['group_by'], case['trunc'])).values('period').distinct()
+        else:
+            groups = queryset.filter(**{f"{case['group_by']}__isnull": False}).values(
+                group=F(case['group_by'])
+            ).distinct()
+        return {'total_views': total_views, 'range_views': range_views, 'groups': groups.count()}
+
+    def fit_curves(self, cases, results, metric):
+        families = {}
+        for case in cases:
+            families.setdefault(case['family'], []).extend(
+                cases_by_size[case['name']] for cases_by_size in results.values() if case['name'] in cases_by_size
+            )
+        return {family: fit_scaling(points, metric) for family, points in families.items()}
+
+    def print_scaling(self, scaling, metric):
+        self.stdout.write("\n" + "="*92)
+        self.stdout.write(f"SCALING ({metric} ~ driver^exponent)")
+        self.stdout.write("="*92)
+        header = ''.join(f"{driver:>18}" for driver in SCALING_DRIVERS)
+        self.stdout.write(f"{'Endpoint':<26} {'scales with':<12} {'complexity':<12}{header}")
+        for family, fit in scaling.items():
+            columns = ''.join(f"{self.format_fit(fit['fits'][driver]):>18}" for driver in SCALING_DRIVERS)
+            self.stdout.write(f"{family:<26} {fit['driver'] or '-':<12} {fit['complexity']:<12}{columns}")
+
+    @staticmethod
+    def format_fit(driver_fit):
+        if not driver_fit:
+            return '-'
+        return f"{driver_fit['exponent']:.2f} (R2 {driver_fit['r2']:.2f})"
+
+    def write_scaling_csv(self, scaling, path):
+        fields = ['endpoint', 'driver', 'exponent', 'r2', 'complexity']
+        for driver in SCALING_DRIVERS:
+            fields += [f"{driver}_exponent", f"{driver}_r2"]
+        with open(path, 'w', newline='') as fh:
+            writer = csv.DictWriter(fh, fieldnames=fields)
+            writer.writeheader()
+            for family, fit in scaling.items():
+                row = {key: fit[key] for key in ('driver', 'exponent', 'r2', 'complexity')}
+                row['endpoint'] = family
+                for driver, driver_fit in fit['fits'].items():
+                    if driver_fit:
+                        row[f"{driver}_exponent"] = driver_fit['exponent']
+                        row[f"{driver}_r2"] = driver_fit['r2']
+                writer.writerow(row)
+        self.stdout.write(f"\nScaling table written to {path}")
+
+    def print_summary(self, results):
+        self.stdout.write("\n" + "="*92)
         self.stdout.write("PERFORMANCE TEST SUMMARY")
-        self.stdout.write("="*50)
-        
-        for test_name, stats in results.items():
-            self.stdout.write(f"\n{test_name}:")
-            for key, value in stats.items():
-                self.stdout.write(f"  {key.replace('_', ' ').title()}: {value}")
\ No newline at end of file
+        self.stdout.write("="*92)
+        self.stdout.write(
+            f"{'Dataset':<10} {'Case':<34} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'queries':>8}"
+        )
+        for dataset_key, cases in results.items():
+            for name, stats in cases.items():
+                self.stdout.write(
+                    f"{dataset_key:<10} {name:<34} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                    f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f} {stats['queries']:>8}"
+                )
+
+    def check_baseline(self, report, options):
+        try:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        for dataset_key, info in report['meta']['datasets'].items():
+            previous = baseline.get('meta', {}).get('datasets', {}).get(dataset_key, {})
+            if previous.get('content_hash') and previous.get('content_hash') != info.get('content_hash'):
+                self.stdout.write(self.style.WARNING(
+                    f"Dataset {dataset_key} differs from the baseline dataset; comparison may be misleading"
+                ))
+
+        regressions = compare_to_baseline(
+            report['results'], baseline.get('results', {}), options['threshold'], options['metric']
+        )
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nNo regressions beyond {options['threshold']:.0%} against {options['baseline']}"
+            ))
+            return
+
+        self.stdout.write(self.style.ERROR("\nREGRESSIONS:"))
+        for regression in regressions:
+            self.stdout.write(
+                f"  [{regression['dataset']}] {regression['case']}: {regression['metric']} "
+                f"{regression['baseline']} -> {regression['current']} ({regression['change']:+})"
+            )
+        raise CommandError(f"{len(regressions)} case(s) regressed against the baseline")
@@ -0,0 +1,47 @@
+
+import signal
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.monitoring import metrics
+from analytics_app.monitoring.sampler import get_system_metrics_settings, run_sampler, downsample
+
+
+class Command(BaseCommand):
+    help = 'Sample CPU, memory, connections and request rates into SystemMetrics and downsample old samples'
+
+    def add_arguments(self, parser):
+        config = get_system_metrics_settings()
+        parser.add_argument('--interval', type=float, default=config['INTERVAL'], help='Seconds between samples')
+        parser.add_argument('--downsample-every', type=float, default=config['DOWNSAMPLE_EVERY'],
+                            help='Seconds between downsampling passes')
+        parser.add_argument('--count', type=int, help='Stop after this many samples (default: run until killed)')
+        parser.add_argument('--downsample-only', action='store_true', help='Run one downsampling pass and exit')
+
+    def handle(self, *args, **options):
+        if options['downsample_only']:
+            created = downsample()
+            self.stdout.write(self.style.SUCCESS(
+                "Downsampled into " + ", ".join(f"{count} {tier} rows" for tier, count in created.items())
+            ))
+            return
+
+        if options['interval'] <= 0:
+            raise CommandError("--interval must be positive")
+        if not metrics.get_metrics_settings()['MULTIPROCESS_DIR']:
+            # this process serves no requests: without the workers' snapshot
+            # files every request rate it records would be 0
+            raise CommandError(
+                "METRICS['MULTIPROCESS_DIR'] is not set, so the web workers' request counters "
+                "cannot be read from this process. Set it to a directory shared with the workers, "
+                "or set SYSTEM_METRICS['THREAD'] to sample inside a single-process server."
+            )
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(f"Sampling every {options['interval']:g}s (Ctrl+C to stop)...")
+        try:
+            # the first reading only establishes the baseline for rates
+            iterations = options['count'] + 1 if options['count'] else None
+            run_sampler(options['interval'], options['downsample_every'], stop, iterations)
+        except KeyboardInterrupt:
+            pass
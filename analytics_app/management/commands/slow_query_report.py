@@ -0,0 +1,53 @@
+import glob
+import json
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.monitoring.slow_queries import (
+    get_slow_query_settings, read_slow_query_log, summarize_fingerprints,
+)
+from .replay_traffic import parse_moment
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow-query log: worst statement fingerprints by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Log files (default: SLOW_QUERIES['LOG_FILE'] and its rotations)")
+        parser.add_argument('--since', help="Only queries logged after: ISO datetime or '30m', '6h', '2d' ago")
+        parser.add_argument('--endpoint', help='Only queries of this URL name')
+        parser.add_argument('--top', type=int, default=10, help='Number of fingerprints to show')
+        parser.add_argument('--plans', action='store_true', help='Print the plan of the slowest occurrence')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        if not paths:
+            log_file = get_slow_query_settings()['LOG_FILE']
+            paths = sorted(glob.glob(f"{log_file}*"))
+            if not paths:
+                raise CommandError(f"No slow-query log at {log_file}")
+        since = parse_moment(options['since']) if options['since'] else None
+
+        try:
+            records = list(read_slow_query_log(paths, since=since, endpoint=options['endpoint']))
+        except OSError as e:
+            raise CommandError(f"Cannot read slow-query log: {e}")
+        summary = summarize_fingerprints(records)[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2, default=str))
+            return
+        if not summary:
+            self.stdout.write("No slow queries logged")
+            return
+
+        self.stdout.write(f"{len(records):,} slow queries in {len(paths)} file(s)\n")
+        self.stdout.write(f"{'fingerprint':<16} {'count':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9}  endpoints")
+        for item in summary:
+            self.stdout.write(
+                f"{item['fingerprint_id']:<16} {item['count']:>7} {item['total_ms']:>11.1f} "
+                f"{item['mean_ms']:>9.1f} {item['max_ms']:>9.1f}  {', '.join(item['endpoints'])}"
+            )
+            self.stdout.write(f"    {item['fingerprint'][:300]}")
+            if options['plans'] and item['plan']:
+                plan = item['plan'] if isinstance(item['plan'], str) else json.dumps(item['plan'], indent=2)
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
@@ -0,0 +1,24 @@
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.snapshots import dump_snapshot, SnapshotError
+
+
+class Command(BaseCommand):
+    help = 'Dump Country, User, Blog and BlogView to a compressed columnar snapshot directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot directory (created if missing)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.stdout.write(f"Writing snapshot to {options['path']}...")
+        try:
+            manifest = dump_snapshot(options['path'], progress=self.stdout.write)
+        except SnapshotError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot written in {time.perf_counter() - started:.1f}s\n"
+            f"  content hash: {manifest['content_hash']}"
+        ))
@@ -0,0 +1,83 @@
+import json
+import tempfile
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from analytics_app.benchmarks import SQLiteContentionBenchmark
+from analytics_app.sqlite_pragmas import SQLITE_DEFAULT_PRAGMAS, get_sqlite_pragmas, copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = 'Concurrent read/write throughput of SQLite with its defaults vs the SQLITE_PRAGMAS profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='SQLite file to copy for each run (default: the default database)')
+        parser.add_argument('--readers', type=int, default=4, help='Threads running the analytics queries')
+        parser.add_argument('--writers', type=int, default=1, help='Threads inserting BlogView batches')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per profile')
+        parser.add_argument('--batch-size', type=int, default=20, help='Rows per write transaction')
+        parser.add_argument('--seed', type=int, help='Seed for the query / row mix')
+        parser.add_argument('--output', help='Write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] == 0:
+            raise CommandError("Need at least one reader or writer")
+        if options['duration'] <= 0 or options['batch_size'] < 1:
+            raise CommandError("--duration and --batch-size must be positive")
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("The default database is not SQLite")
+        source = Path(options['database'] or connections['default'].settings_dict['NAME'])
+        if not source.exists():
+            raise CommandError(f"{source} does not exist")
+
+        profiles = {
+            # SQLite defaults, new connection per operation (CONN_MAX_AGE = 0)
+            'default': (SQLITE_DEFAULT_PRAGMAS, False),
+            'tuned': (get_sqlite_pragmas(), True),
+        }
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, (pragmas, persistent) in profiles.items():
+                # A fresh copy per run: journal_mode is stored in the file
+                path = Path(tmp) / f"{name}.sqlite3"
+                copy_sqlite_database(source, path)
+                self.stdout.write(f"Running '{name}' for {options['duration']:g}s "
+                                  f"({options['readers']} readers, {options['writers']} writers)...")
+                try:
+                    benchmark = SQLiteContentionBenchmark(
+                        path, pragmas,
+                        readers=options['readers'],
+                        writers=options['writers'],
+                        duration=options['duration'],
+                        batch_size=options['batch_size'],
+                        persistent=persistent,
+                        seed=options['seed'],
+                    )
+                    results[name] = benchmark.run()
+                except ValueError as e:
+                    raise CommandError(str(e))
+                results[name]['pragmas'] = pragmas
+
+        self.print_report(results)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'config': {key: options[key] for key in
+                                      ('readers', 'writers', 'duration', 'batch_size', 'seed')},
+                           'results': results}, fh, indent=2)
+            self.stdout.write(f"\nResults written to {options['output']}")
+
+    def print_report(self, results):
+        self.stdout.write("\n" + "=" * 72)
+        self.stdout.write(f"{'profile':<10} {'journal':<8} {'reads/s':>9} {'read p95':>9} "
+                          f"{'rows/s':>9} {'write p95':>10} {'errors':>7}")
+        for name, result in results.items():
+            read, write = result['read'], result['write']
+            self.stdout.write(
+                f"{name:<10} {result['journal_mode']:<8} {read['ops_per_s']:>9,.1f} "
+                f"{read['latency'].get('p95_ms', 0):>7.1f}ms {write['rows_per_s']:>9,.1f} "
+                f"{write['latency'].get('p95_ms', 0):>8.1f}ms {read['errors'] + write['errors']:>7}"
+            )
+        before, after = results['default'], results['tuned']
+        for kind, metric in (('read', 'ops_per_s'), ('write', 'rows_per_s')):
+            if before[kind][metric]:
+                self.stdout.write(f"{kind} throughput: {after[kind][metric] / before[kind][metric]:.2f}x")
@@ -0,0 +1,49 @@
+import time
+import signal
+import threading
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from analytics_app.sqlite_pragmas import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = 'Refresh a SQLite read replica (local stand-in) by copying the primary database file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default', help='Database alias to copy from')
+        parser.add_argument('--replica', default='replica', help='Database alias to copy to')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between copies (default: copy once and exit)')
+
+    def handle(self, *args, **options):
+        paths = {}
+        for key in ('source', 'replica'):
+            alias = options[key]
+            if alias not in connections:
+                raise CommandError(f"Unknown database alias: {alias}")
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"Database {alias} is not SQLite")
+            paths[key] = Path(connections[alias].settings_dict['NAME'])
+        if paths['source'] == paths['replica']:
+            raise CommandError("Source and replica are the same file")
+        if not paths['source'].exists():
+            raise CommandError(f"{paths['source']} does not exist")
+        if options['interval'] < 0:
+            raise CommandError("--interval must not be negative")
+        paths['replica'].parent.mkdir(parents=True, exist_ok=True)
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        if options['interval']:
+            self.stdout.write(f"Copying {paths['source']} to {paths['replica']} every "
+                              f"{options['interval']:g}s (Ctrl+C to stop)...")
+        try:
+            while True:
+                started = time.perf_counter()
+                copy_sqlite_database(paths['source'], paths['replica'])
+                self.stdout.write(f"Replica refreshed in {time.perf_counter() - started:.2f}s")
+                if not options['interval'] or stop.wait(options['interval']):
+                    break
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,163 @@
+"""
+Microbenchmarks of the pure-Python layers of a request (filter parsing,
+filterset construction, pagination, rendering), measured without SQL.
+"""
+import gc
+import json
+import time
+import tracemalloc
+import urllib.parse
+
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .models import BlogView
+from .services import AnalyticsService
+from .filters import BlogViewFilter, PerformanceFilter
+from .pagination import AnalyticsPagination
+from .renderers import COLUMNS, ColumnarJSONRenderer, to_columns
+
+
+SAMPLE_FILTERS = json.dumps({
+    'operator': 'and',
+    'conditions': [
+        {'field': 'country__name', 'operator': 'eq', 'value': 'Kenya'},
+        {'field': 'blog__title', 'operator': 'contains', 'value': 'python'},
+        {'field': 'user__username', 'operator': 'startswith', 'value': 'bench_user_1'},
+    ],
+})
+
+
+def sample_rows(count):
+    """
+    Rows shaped like a page of API #1 results
+    """
+    return [
+        {'x': f"Country {i}", 'y': 100 + i, 'z': 10000 + i * 7}
+        for i in range(count)
+    ]
+
+
+def measure(func, number=None, repeat=5, min_time=0.2):
+    """
+    Time ``func`` timeit-style and track its allocations with tracemalloc.
+
+    ``number`` calls are timed per round (auto-ranged to ``min_time`` seconds
+    when omitted), the fastest of ``repeat`` rounds gives ns/op. Allocations
+    are measured in a separate pass because tracemalloc slows execution down.
+    """
+    func()  # warm caches / lazy imports
+
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= min_time:
+                break
+            number *= 2
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        rounds = []
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            for _ in range(number):
+                func()
+            rounds.append((time.perf_counter_ns() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    alloc_calls = min(number, 1000)
+    tracemalloc.start()
+    try:
+        peaks = []
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(alloc_calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ns_per_op': round(min(rounds), 1),
+        'ns_per_op_median': round(sorted(rounds)[len(rounds) // 2], 1),
+        'bytes_per_op': round(sum(peaks) / len(peaks)),
+        'retained_bytes_per_op': round(retained / alloc_calls),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def _apply_filters_case(filters):
+    queryset = BlogView.objects.all()
+    return lambda: AnalyticsService._apply_filters(queryset, filters)
+
+
+def _filterset_class_case(backend_class):
+    backend = backend_class()
+    return lambda: backend.get_filterset_class(None, BlogView.objects.all())
+
+
+def _pagination_case(rows, limit):
+    factory = RequestFactory()
+    request = Request(factory.get('/analytics/blog-views/', {'limit': limit, 'offset': limit}))
+
+    def paginate():
+        paginator = AnalyticsPagination()
+        page = paginator.paginate_queryset(rows, request)
+        return paginator.get_paginated_response({'data': page})
+    return paginate
+
+
+def _render_case(rows):
+    renderer = JSONRenderer()
+    payload = {'count': len(rows), 'next': None, 'previous': None, 'limit': len(rows), 'offset': 0, 'data': rows}
+    return lambda: renderer.render(payload)
+
+
+def _columnar_render_case(rows):
+    # values_list() tuples, transposed and rendered per call
+    rows = [tuple(row[field] for field in COLUMNS) for row in rows]
+    renderer = ColumnarJSONRenderer()
+
+    def render():
+        payload = {'count': len(rows), 'next': None, 'previous': None, 'limit': len(rows), 'offset': 0,
+                   'data': to_columns(rows)}
+        return renderer.render(payload)
+    return render
+
+
+# name -> factory returning the zero-argument callable to measure
+MICROBENCHMARKS = {
+    'apply_filters/3-conditions': lambda: _apply_filters_case(SAMPLE_FILTERS),
+    'apply_filters/url-encoded': lambda: _apply_filters_case(urllib.parse.quote(SAMPLE_FILTERS)),
+    'apply_filters/none': lambda: _apply_filters_case(None),
+    'filterset_class/blog-views': lambda: _filterset_class_case(BlogViewFilter),
+    'filterset_class/performance': lambda: _filterset_class_case(PerformanceFilter),
+    'pagination/100-of-1000': lambda: _pagination_case(sample_rows(1000), 100),
+    'render/json-100-rows': lambda: _render_case(sample_rows(100)),
+    'render/json-1000-rows': lambda: _render_case(sample_rows(1000)),
+    'render/json-50000-rows': lambda: _render_case(sample_rows(50000)),
+    'render/columnar-1000-rows': lambda: _columnar_render_case(sample_rows(1000)),
+    'render/columnar-50000-rows': lambda: _columnar_render_case(sample_rows(50000)),
+}
+
+
+def run_microbenchmarks(names=None, number=None, repeat=5, min_time=0.2):
+    """
+    Run the selected microbenchmarks (all by default) and return {name: stats}
+    """
+    results = {}
+    for name, factory in MICROBENCHMARKS.items():
+        if names and not any(selected in name for selected in names):
+            continue
+        results[name] = measure(factory(), number=number, repeat=repeat, min_time=min_time)
+    return results
@@ -2,98 +2,482 @@
 import time
 import uuid
 import json
+import random
 import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.http.request import RawPostDataException
 from django.utils.deprecation import MiddlewareMixin
+from .instrumentation import QueryRecorder, query_wrapper
+from .query_budget import get_budget, check_budget, QueryBudgetExceeded
+from .routers import get_read_replica_settings, start_client_pin, end_client_pin
+from .admission import get_admission_settings, AdmissionController, get_table_stats, estimate_cost, client_key
+from .exceptions import RetryLaterException
+from . import tracing
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_REQUEST_LOGGING_SETTINGS = {
+    'SAMPLE_RATE': 1.0,           # default share of requests logged
+    'ROUTE_SAMPLE_RATES': {},     # URL name -> share, e.g. {'blog-views-analytics': 0.1}
+    'SLOW_REQUEST_MS': 1000,      # slower requests are always logged
+    'EXCLUDE_PREFIXES': ('/admin/', '/static/'),
+}
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for new-style middleware that runs natively in both WSGI and ASGI
+    stacks, so an async request never holds a thread for its duration.
+    Subclasses implement ``__call__`` and ``__acall__`` and dispatch with
+    ``if self.async_mode: return self.__acall__(request)``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
 class RequestLoggingMiddleware(MiddlewareMixin):
-    """Middleware for logging all API requests and responses"""
-    
-
-def process_request(self, request):
-    request.start_time = time.time()
-    request.request_id = str(uuid.uuid4())
-    
-    # Add trailing slash to certain URLs
-    if request.path in ['/swagger', '/redoc']:
-        from django.shortcuts import redirect
-        return redirect(request.path + '/')
-
-def process_request(self, request):
-    request.start_time = time.time()
-    request.request_id = str(uuid.uuid4())
-    
-    # Don't log admin or static requests
-    if not request.path.startswith('/admin/') and not request.path.startswith('/static/'):
+    """
+    Middleware for logging API requests and responses.
+
+    Emits one structured record per request when the response is ready (fields
+    passed via ``extra`` for the JSON formatter). Server errors and requests
+    slower than SLOW_REQUEST_MS are always logged, the rest are sampled per
+    route with REQUEST_LOGGING['ROUTE_SAMPLE_RATES'].
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = {**DEFAULT_REQUEST_LOGGING_SETTINGS, **getattr(settings, 'REQUEST_LOGGING', {})}
+        self.exclude_prefixes = tuple(self.config['EXCLUDE_PREFIXES'])
+
+    def process_request(self, request):
+        request.start_time = time.time()
+        if not getattr(request, 'request_id', None):
+            request.request_id = str(uuid.uuid4())
+
         # Normalize path by adding trailing slash if missing for certain paths
         if request.path in ['/swagger', '/redoc']:
             request.path = request.path + '/'
-        
+        return None
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'start_time') or request.path.startswith(self.exclude_prefixes):
+            return response
+
+        response['X-Request-ID'] = request.request_id
+        duration_ms = (time.time() - request.start_time) * 1000
+        if not self.should_log(request, response.status_code, duration_ms):
+            return response
+
+        match = getattr(request, 'resolver_match', None)
         log_data = {
             'request_id': request.request_id,
             'method': request.method,
             'path': request.path,
+            'endpoint': match.url_name if match else None,
             'query_params': dict(request.GET),
+            'status_code': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'response_size': len(response.content) if not response.streaming else None,
             'client_ip': self.get_client_ip(request),
             'user_agent': request.META.get('HTTP_USER_AGENT', ''),
         }
-        
-        if request.body and request.content_type == 'application/json':
+        if request.content_type == 'application/json' and request.body:
             try:
                 log_data['request_body'] = json.loads(request.body.decode('utf-8'))
-            except:
+            except (ValueError, UnicodeDecodeError, RawPostDataException):
                 pass
-        
-        logger.info(f"API Request: {json.dumps(log_data)}")
-    
-    return None
-    
-    def process_response(self, request, response):
-        if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            
-            if not request.path.startswith('/admin/') and not request.path.startswith('/static/'):
-                log_data = {
-                    'request_id': request.request_id,
-                    'method': request.method,
-                    'path': request.path,
-                    'status_code': response.status_code,
-                    'duration_ms': round(duration * 1000, 2),
-                    'response_size': len(response.content) if hasattr(response, 'content') else 0,
-                }
-                
-                logger.info(f"API Response: {json.dumps(log_data)}")
-                
-                # Add request ID to response headers
-                if isinstance(response, dict):
-                    response['X-Request-ID'] = request.request_id
-                elif hasattr(response, 'headers'):
-                    response.headers['X-Request-ID'] = request.request_id
-        
+
+        logger.info(
+            "API %s %s %s %.1fms", request.method, request.path, response.status_code, duration_ms,
+            extra=log_data,
+        )
         return response
-    
+
     def process_exception(self, request, exception):
         if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            
-            log_data = {
-                'request_id': getattr(request, 'request_id', 'unknown'),
-                'method': request.method,
-                'path': request.path,
-                'exception': str(exception),
-                'exception_type': type(exception).__name__,
-                'duration_ms': round(duration * 1000, 2),
-            }
-            
-            logger.error(f"API Exception: {json.dumps(log_data)}")
-        
+            logger.error(
+                "API Exception %s %s: %s", request.method, request.path, exception,
+                extra={
+                    'request_id': getattr(request, 'request_id', 'unknown'),
+                    'method': request.method,
+                    'path': request.path,
+                    'exception_type': type(exception).__name__,
+                    'duration_ms': round((time.time() - request.start_time) * 1000, 2),
+                },
+            )
         return None
-    
+
+    def should_log(self, request, status_code, duration_ms):
+        if status_code >= 500 or duration_ms >= self.config['SLOW_REQUEST_MS']:
+            return True
+        match = getattr(request, 'resolver_match', None)
+        rate = self.config['ROUTE_SAMPLE_RATES'].get(match.url_name if match else None, self.config['SAMPLE_RATE'])
+        return rate >= 1 or random.random() < rate
+
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
             ip = x_forwarded_for.split(',')[0]
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip
\ No newline at end of file
+        return ip
+
+
+class QueryBudgetMiddleware(AsyncCapableMiddleware):
+    """
+    Checks every budgeted endpoint's queries against QUERY_BUDGETS in DEBUG mode.
+
+    QUERY_BUDGET_ENFORCEMENT selects 'warn' (log a warning), 'raise' (fail the
+    request with QueryBudgetExceeded) or 'off'. Place it last so only the view
+    and inner middleware are counted.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.mode = getattr(settings, 'QUERY_BUDGET_ENFORCEMENT', 'warn')
+        if not settings.DEBUG or self.mode == 'off':
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.check(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.check(request, response, recorder)
+
+    def check(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match else None
+        if endpoint and get_budget(endpoint):
+            violations = check_budget(endpoint, recorder)
+            if violations:
+                message = "Query budget exceeded: " + "; ".join(violations)
+                if self.mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+        return response
+
+
+DEFAULT_SERVER_TIMING_SETTINGS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,      # fraction of requests instrumented
+    'HEADER': True,          # emit the Server-Timing response header
+    'LOG': True,             # emit a structured "Request timing" log record
+    'SLOWEST_SQL_CHARS': 500,
+}
+
+
+class ServerTimingMiddleware(AsyncCapableMiddleware):
+    """
+    Splits request time into database, view/Python and rendering time.
+
+    A per-request execute wrapper counts queries, DB time and the slowest
+    statement. Results go to a ``Server-Timing`` header and to a structured log
+    record (fields passed via ``extra``). Only a SAMPLE_RATE fraction of
+    requests is instrumented; unsampled requests pay a single random() call.
+    It sits after MetricsMiddleware (which times the whole stack for /metrics)
+    and TracingMiddleware, so its total covers everything below it but not
+    those two.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = {**DEFAULT_SERVER_TIMING_SETTINGS, **getattr(settings, 'SERVER_TIMING', {})}
+        if not self.config['ENABLED'] or self.config['SAMPLE_RATE'] <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(fingerprint=False)
+        request._server_timing = {'recorder': recorder}
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder(fingerprint=False)
+        request._server_timing = {'recorder': recorder}
+        start = time.perf_counter()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        timing = self.summarize(request._server_timing, total_ms)
+        if self.config['HEADER']:
+            response['Server-Timing'] = self.header(timing)
+        if self.config['LOG']:
+            self.log(request, response, timing, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook: mark where the view ended
+        state = getattr(request, '_server_timing', None)
+        if state is not None:
+            state['view_done'] = time.perf_counter()
+            state['view_db_ms'] = state['recorder'].total_ms
+            response.add_post_render_callback(lambda r: self.mark_rendered(state))
+        return response
+
+    @staticmethod
+    def mark_rendered(state):
+        state['render_ms'] = (time.perf_counter() - state['view_done']) * 1000
+        state['render_db_ms'] = state['recorder'].total_ms - state['view_db_ms']
+
+    @staticmethod
+    def summarize(state, total_ms):
+        recorder = state['recorder']
+        render_ms = max(0.0, state.get('render_ms', 0.0) - state.get('render_db_ms', 0.0))
+        return {
+            'total_ms': total_ms,
+            'db_ms': recorder.total_ms,
+            'db_queries': recorder.count,
+            'db_slowest_ms': recorder.slowest_ms,
+            'render_ms': render_ms,
+            'app_ms': max(0.0, total_ms - recorder.total_ms - render_ms),
+        }
+
+    @staticmethod
+    def header(timing):
+        return ', '.join([
+            f'db;dur={timing["db_ms"]:.2f};desc="{timing["db_queries"]} queries"',
+            f'db-slowest;dur={timing["db_slowest_ms"]:.2f}',
+            f'app;dur={timing["app_ms"]:.2f}',
+            f'render;dur={timing["render_ms"]:.2f}',
+            f'total;dur={timing["total_ms"]:.2f}',
+        ])
+
+    def log(self, request, response, timing, recorder):
+        match = getattr(request, 'resolver_match', None)
+        slowest_sql = recorder.slowest_sql
+        if slowest_sql and len(slowest_sql) > self.config['SLOWEST_SQL_CHARS']:
+            slowest_sql = slowest_sql[:self.config['SLOWEST_SQL_CHARS']] + '...'
+        fields = {key: round(value, 3) if isinstance(value, float) else value for key, value in timing.items()}
+        fields.update({
+            'request_id': getattr(request, 'request_id', None),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': match.url_name if match else None,
+            'status_code': response.status_code,
+            'db_slowest_sql': slowest_sql,
+        })
+        logger.info(
+            "Request timing %s %s: %.1fms (db %.1fms in %d queries)",
+            request.method, request.path, timing['total_ms'], timing['db_ms'], timing['db_queries'],
+            extra=fields,
+        )
+
+
+class TracingMiddleware(AsyncCapableMiddleware):
+    """
+    Opens the root span of each head-sampled request (SERVER kind) and
+    records a CLIENT span per SQL statement on every database. The request_id
+    is derived from the trace id, taken from an incoming W3C ``traceparent``
+    header when present. Place it near the top so the root span covers the
+    stack.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = tracing.get_tracing_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.query_spans = tracing.QuerySpans(self.config['STATEMENT_CHARS'])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        trace = self.begin(request)
+        if trace is None:
+            return self.get_response(request)
+        try:
+            with query_wrapper(self.query_spans):
+                response = self.get_response(request)
+            return self.set_status(trace[0], response)
+        except Exception as e:
+            trace[0].record_error(e)
+            raise
+        finally:
+            self.end(request, *trace)
+
+    async def __acall__(self, request):
+        trace = self.begin(request)
+        if trace is None:
+            return await self.get_response(request)
+        try:
+            with query_wrapper(self.query_spans):
+                response = await self.get_response(request)
+            return self.set_status(trace[0], response)
+        except Exception as e:
+            trace[0].record_error(e)
+            raise
+        finally:
+            self.end(request, *trace)
+
+    def begin(self, request):
+        """
+        Assign the request_id and, if sampled, open the root span:
+        (root, token) or None
+        """
+        parent = tracing.parse_traceparent(request.META.get('HTTP_TRACEPARENT'))
+        trace_id = parent[0] if parent else uuid.uuid4().hex
+        request.request_id = str(uuid.UUID(hex=trace_id))
+        if not tracing.should_sample(self.config, parent):
+            return None
+        return tracing.start_trace(
+            f"{request.method} {request.path}", trace_id, parent[1] if parent else None,
+            **{'http.method': request.method, 'http.target': request.get_full_path(),
+               'request_id': request.request_id},
+        )
+
+    @staticmethod
+    def set_status(root, response):
+        root.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            root.status = tracing.STATUS_ERROR
+        return response
+
+    def end(self, request, root, token):
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            root.name = f"{request.method} {match.route}"
+            root.set_attribute('http.route', match.route)
+        tracing.finish_trace(root, token, self.config['SERVICE_NAME'])
+
+    def process_template_response(self, request, response):
+        # DRF renders after this hook: time rendering as its own span
+        render, token = tracing.start_span('render', renderer=type(getattr(response, 'accepted_renderer', None)).__name__)
+        if render is not None:
+            response.add_post_render_callback(lambda r: tracing.end_span(render, token))
+        return response
+
+
+class ReadYourWritesMiddleware(AsyncCapableMiddleware):
+    """
+    Pins a client to the primary database for READ_REPLICAS['READ_YOUR_WRITES_SECONDS']
+    after a request in which it wrote, with a short-lived cookie, so it does
+    not read stale data from a lagging replica. Reads later in the same
+    request go to the primary too.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = get_read_replica_settings()
+        if not self.config['REPLICAS'] or not self.config['READ_YOUR_WRITES_SECONDS']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        pin, token = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            end_client_pin(token)
+        return self.end(pin, response)
+
+    async def __acall__(self, request):
+        pin, token = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_client_pin(token)
+        return self.end(pin, response)
+
+    def begin(self, request):
+        return start_client_pin(pinned=self.config['PIN_COOKIE'] in request.COOKIES)
+
+    def end(self, pin, response):
+        if pin.wrote:
+            response.set_cookie(
+                self.config['PIN_COOKIE'], '1',
+                max_age=self.config['READ_YOUR_WRITES_SECONDS'],
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class AdmissionControlMiddleware(AsyncCapableMiddleware):
+    """
+    Estimates the cost of ADMISSION_CONTROL['ENDPOINTS'] requests and admits
+    them into the cheap or expensive lane, or answers at once with 429 (client
+    over its quota) or 503 (lane full) and Retry-After. Admitted responses
+    carry the estimate in X-Query-Cost. Place it after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = get_admission_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.endpoints = set(self.config['ENDPOINTS'])
+        self.controller = AdmissionController(self.config)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            ticket = getattr(request, '_admission_ticket', None)
+            if ticket is not None:
+                ticket.release()
+        return self.annotate(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            ticket = getattr(request, '_admission_ticket', None)
+            if ticket is not None:
+                ticket.release()
+        return self.annotate(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        endpoint = match.url_name.removesuffix('-async') if match and match.url_name else None
+        if endpoint not in self.endpoints:
+            return None
+        stats = get_table_stats().get(self.config['STATS_TTL'])
+        cost = estimate_cost(endpoint, request.GET, stats)
+        try:
+            request._admission_ticket = self.controller.admit(client_key(request), cost)
+        except RetryLaterException as e:
+            response = JsonResponse({'error': str(e.detail), 'code': e.default_code}, status=e.status_code)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        request.query_cost = cost
+        return None
+
+    @staticmethod
+    def annotate(request, response):
+        cost = getattr(request, 'query_cost', None)
+        if cost is not None:
+            response['X-Query-Cost'] = f"{cost:.1f}"
+        return response
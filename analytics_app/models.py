@@ -76,4 +76,9 @@ class BlogView(models.Model):
         ordering = ['-viewed_at']
     
     def __str__(self):
-        return f"{self.blog.title} viewed at {self.viewed_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"{self.blog.title} viewed at {self.viewed_at.strftime('%Y-%m-%d %H:%M')}"
+
+# Register monitoring models with the analytics_app app
+from .monitoring.models import (  # noqa: E402,F401
+    APIRequestLog, SystemMetrics, AnalyticsMetrics, APIRequestRollup, APIUserRollup,
+)
@@ -0,0 +1,333 @@
+"""
+In-process metrics: log-scale latency histograms, counters and gauges,
+exported in the Prometheus text format. With METRICS['MULTIPROCESS_DIR'] set,
+every worker process periodically writes its values to that directory and an
+export merges the files of all workers.
+"""
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import tempfile
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# 0.5ms .. ~33s, doubling
+LATENCY_BUCKETS = tuple(0.0005 * 2 ** i for i in range(17))
+
+DEFAULT_METRICS_SETTINGS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': None,   # shared directory; wipe it when the server restarts
+    'SYNC_INTERVAL': 5.0,       # seconds between per-process snapshot writes
+}
+
+
+def get_metrics_settings():
+    return {**DEFAULT_METRICS_SETTINGS, **getattr(settings, 'METRICS', {})}
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram family keyed by label values. Each observation
+    takes one short uncontended lock (bisect + three increments).
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # per-bucket counts (+Inf last), sum
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+    @staticmethod
+    def merge(into, other):
+        for labels, (counts, total) in other.items():
+            series = into.setdefault(labels, [[0] * len(counts), 0.0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+        return into
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into, other):
+        for labels, value in other.items():
+            into[labels] = into.get(labels, 0) + value
+        return into
+
+
+class Gauge:
+    """
+    Last value set per label values. Workers are merged by taking the
+    maximum, i.e. the worst process.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into, other):
+        for labels, value in other.items():
+            into[labels] = max(into.get(labels, value), value)
+        return into
+
+
+REQUEST_DURATION = Histogram(
+    'analytics_request_duration_seconds', 'Request latency', ('endpoint', 'status_class'),
+)
+DB_TIME = Counter(
+    'analytics_db_time_seconds_total', 'Time spent in SQL queries', ('endpoint',),
+)
+DB_QUERIES = Counter(
+    'analytics_db_queries_total', 'Number of SQL queries', ('endpoint',),
+)
+CACHE_LOOKUPS = Counter(
+    'analytics_cache_lookups_total', 'Cache lookups by result', ('cache', 'result'),
+)
+
+VIEW_DEDUP_CHECKED = Counter(
+    'analytics_view_dedup_checked_total', 'Blog views checked by the deduplicator', (),
+)
+VIEW_DEDUP_DROPPED = Counter(
+    'analytics_view_dedup_dropped_total', 'Blog views dropped as repeats', (),
+)
+VIEW_DEDUP_FALSE_POSITIVE_RATE = Gauge(
+    'analytics_view_dedup_false_positive_rate', 'Estimated chance a new view is wrongly dropped', (),
+)
+
+METRICS = (REQUEST_DURATION, DB_TIME, DB_QUERIES, CACHE_LOOKUPS,
+           VIEW_DEDUP_CHECKED, VIEW_DEDUP_DROPPED, VIEW_DEDUP_FALSE_POSITIVE_RATE)
+
+
+def observe_request(endpoint, status_code, duration_s, db_s=0.0, db_queries=0):
+    labels = (endpoint,)
+    REQUEST_DURATION.observe((endpoint, f"{status_code // 100}xx"), duration_s)
+    DB_TIME.inc(labels, db_s)
+    DB_QUERIES.inc(labels, db_queries)
+    _syncer.maybe_start()
+
+
+def record_cache_lookup(cache, hit):
+    """
+    Count a lookup in one of the in-process caches: 'table_stats' (admission
+    control row statistics) or 'replica_health' (read replica probe results)
+    """
+    CACHE_LOOKUPS.inc((cache, 'hit' if hit else 'miss'))
+
+
+def record_view_dedup(duplicate, false_positive_rate):
+    VIEW_DEDUP_CHECKED.inc(())
+    if duplicate:
+        VIEW_DEDUP_DROPPED.inc(())
+    VIEW_DEDUP_FALSE_POSITIVE_RATE.set((), false_positive_rate)
+
+
+def local_snapshot():
+    return {metric.name: metric.snapshot() for metric in METRICS}
+
+
+def collect():
+    """
+    Current values of all metrics, summed over worker processes when a
+    multiprocess directory is configured.
+    """
+    directory = get_metrics_settings()['MULTIPROCESS_DIR']
+    if not directory:
+        return local_snapshot()
+
+    _syncer.write()
+    merged = {metric.name: {} for metric in METRICS}
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue  # being replaced or truncated: counted on the next scrape
+        for metric in METRICS:
+            values = {tuple(json.loads(key)): value for key, value in data.get(metric.name, {}).items()}
+            metric.merge(merged[metric.name], values)
+    return merged
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus(snapshot=None):
+    """
+    Prometheus text exposition format (version 0.0.4)
+    """
+    snapshot = collect() if snapshot is None else snapshot
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in sorted(snapshot.get(metric.name, {}).items()):
+            if metric.kind != 'histogram':
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {value:g}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(
+                    f"{metric.name}_bucket{_format_labels(metric.labelnames, labels, [('le', le)])} {cumulative}"
+                )
+            lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {total:g}")
+            lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_quantile(q, buckets, counts):
+    """
+    Estimate a quantile from bucket counts by linear interpolation inside the
+    bucket, like PromQL's histogram_quantile.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if i == len(buckets):
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+def request_summary(snapshot=None):
+    """
+    Totals, error rate and latency percentiles over all endpoints
+    """
+    snapshot = collect() if snapshot is None else snapshot
+    counts = [0] * (len(REQUEST_DURATION.buckets) + 1)
+    total_s = 0.0
+    errors = 0
+    for (endpoint, status_class), (series_counts, series_total) in snapshot[REQUEST_DURATION.name].items():
+        counts = [a + b for a, b in zip(counts, series_counts)]
+        total_s += series_total
+        if status_class in ('4xx', '5xx'):
+            errors += sum(series_counts)
+
+    requests = sum(counts)
+    summary = {
+        'requests': requests,
+        'error_rate_percent': round(errors / requests * 100, 2) if requests else 0,
+        'avg_response_time_ms': round(total_s / requests * 1000, 2) if requests else 0,
+    }
+    for q in (0.5, 0.95, 0.99):
+        value = histogram_quantile(q, REQUEST_DURATION.buckets, counts)
+        summary[f"p{int(q * 100)}_ms"] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+
+class _SnapshotSyncer:
+    """
+    Writes this process's snapshot to <MULTIPROCESS_DIR>/<pid>.json every
+    SYNC_INTERVAL seconds from a daemon thread.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def maybe_start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            config = get_metrics_settings()
+            if config['MULTIPROCESS_DIR']:
+                thread = threading.Thread(
+                    target=self._run, args=(config['SYNC_INTERVAL'],), name='metrics-sync', daemon=True,
+                )
+                thread.start()
+                atexit.register(self.write)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            self.write()
+
+    def write(self):
+        directory = get_metrics_settings()['MULTIPROCESS_DIR']
+        if not directory:
+            return
+        data = {
+            name: {json.dumps(list(labels)): value for labels, value in values.items()}
+            for name, values in local_snapshot().items()
+        }
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(data, fh)
+            os.replace(tmp_path, os.path.join(directory, f"{os.getpid()}.json"))
+        except OSError as e:
+            logger.warning("Could not write metrics snapshot to %s: %s", directory, e)
+
+
+_syncer = _SnapshotSyncer()
@@ -1,75 +1,285 @@
-
 import time
 import json
+import uuid
+import random
+import hashlib
+import logging
+from datetime import timedelta
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.db import connection
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from ..monitoring.models import APIRequestLog
+from ..instrumentation import QueryRecorder, query_wrapper, untracked
+from ..middleware import AsyncCapableMiddleware
+from . import metrics
+from .writer import get_monitoring_settings, get_request_log_writer
+from .rollup import RollupBatch
+from .sampler import start_sampler_thread
+from .profiling import RequestProfile, get_profiling_settings, get_continuous_profiler
+from .slow_queries import SlowQueryLogger, get_slow_query_settings
+
+logger = logging.getLogger(__name__)
 
 class APIMonitoringMiddleware(MiddlewareMixin):
     """
-    Middleware for monitoring API performance and usage
+    Middleware for monitoring API performance and usage.
+
+    Records are handed to the background RequestLogWriter. Only error
+    responses keep their body; others store its size and SHA-256. With head
+    sampling the keep/drop decision is made before the view runs; with tail
+    sampling errors and slow requests are always kept.
     """
-    
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = get_monitoring_settings()
+
     def process_request(self, request):
         request.start_time = time.time()
+        if not getattr(request, 'request_id', None):
+            request.request_id = str(uuid.uuid4())
+        if self.config['SAMPLING'] == 'head':
+            request.monitoring_sampled = random.random() < self.config['SAMPLE_RATE']
         return None
-    
+
     def process_response(self, request, response):
-        if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            
-            # Only log API requests
-            if request.path.startswith('/analytics/'):
+        if not self.config['ENABLED'] or not hasattr(request, 'start_time'):
+            return response
+        # Only log API requests
+        if not request.path.startswith('/analytics/'):
+            return response
+
+        duration = time.time() - request.start_time
+        try:
+            # The hourly rollup counts every request, before sampling
+            user = getattr(request, 'user', None)
+            observation = (
+                timezone.now() - timedelta(seconds=duration), request.path, user.pk if user is not None and user.is_authenticated else None,
+                response.status_code, duration * 1000,
+            )
+            record = None
+            if self.should_record(request, response.status_code, duration * 1000):
+                record = self.build_record(request, response, duration)
+
+            if connection.in_atomic_block:
+                # A background connection could not see rows of the still-open
+                # transaction (e.g. the user FK), so write inline as part of it
+                rollup = RollupBatch()
+                rollup.add(*observation)
+                rollup.flush()
+                if record:
+                    with untracked():
+                        APIRequestLog.objects.create(**record)
+            else:
+                writer = get_request_log_writer()
+                writer.observe(*observation)
+                if record:
+                    writer.submit(record)
+        except Exception as e:
+            # Don't fail the request if monitoring fails
+            logger.error("Failed to log API request: %s", e)
+
+        return response
+
+    def should_record(self, request, status_code, duration_ms):
+        if self.config['SAMPLING'] == 'head':
+            return getattr(request, 'monitoring_sampled', True)
+        if status_code >= 400 or duration_ms >= self.config['SLOW_REQUEST_MS']:
+            return True
+        return self.config['SAMPLE_RATE'] >= 1 or random.random() < self.config['SAMPLE_RATE']
+
+    def build_record(self, request, response, duration):
+        user = getattr(request, 'user', None)
+
+        # Extract client IP
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            client_ip = x_forwarded_for.split(',')[0]
+        else:
+            client_ip = request.META.get('REMOTE_ADDR')
+
+        # Extract request body (if JSON)
+        request_body = None
+        if request.content_type == 'application/json' and request.body:
+            try:
+                request_body = json.loads(request.body.decode('utf-8'))
+            except ValueError:
+                pass
+
+        # Keep response bodies of errors only; otherwise size and hash
+        content = b'' if response.streaming else response.content
+        response_body = None
+        if response.status_code >= 400:
+            if hasattr(response, 'data'):
+                response_body = response.data
+            elif response.get('Content-Type', '').startswith('application/json'):
                 try:
-                    # Extract user from request
-                    user = request.user if request.user.is_authenticated else None
-                    
-                    # Extract client IP
-                    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                    if x_forwarded_for:
-                        client_ip = x_forwarded_for.split(',')[0]
-                    else:
-                        client_ip = request.META.get('REMOTE_ADDR')
-                    
-                    # Extract query params
-                    query_params = dict(request.GET)
-                    
-                    # Extract request body (if JSON)
-                    request_body = None
-                    if request.body and request.content_type == 'application/json':
-                        try:
-                            request_body = json.loads(request.body.decode('utf-8'))
-                        except:
-                            pass
-                    
-                    # Extract response body (if JSON)
-                    response_body = None
-                    if hasattr(response, 'data'):
-                        response_body = response.data
-                    elif response.get('Content-Type', '').startswith('application/json'):
-                        try:
-                            response_body = json.loads(response.content.decode('utf-8'))
-                        except:
-                            pass
-                    
-                    # Create log entry
-                    APIRequestLog.objects.create(
-                        request_id=getattr(request, 'request_id', None),
-                        method=request.method,
-                        path=request.path,
-                        query_params=query_params,
-                        request_body=request_body,
-                        status_code=response.status_code,
-                        response_body=response_body,
-                        user=user,
-                        client_ip=client_ip,
-                        user_agent=request.META.get('HTTP_USER_AGENT'),
-                        request_time=timezone.now() - timedelta(seconds=duration),
-                        response_time=timezone.now(),
-                        duration_ms=duration * 1000
-                    )
-                    
-                except Exception as e:
-                    # Don't fail the request if monitoring fails
-                    logger.error(f"Failed to log API request: {str(e)}")
-        
-        return response
\ No newline at end of file
+                    response_body = json.loads(content.decode('utf-8'))
+                except ValueError:
+                    pass
+
+        now = timezone.now()
+        return {
+            'request_id': getattr(request, 'request_id', None),
+            'method': request.method,
+            'path': request.path,
+            'query_params': dict(request.GET),
+            'request_body': request_body,
+            'status_code': response.status_code,
+            'response_body': response_body,
+            'response_size': len(content),
+            'response_hash': hashlib.sha256(content).hexdigest() if content else None,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'client_ip': client_ip,
+            'user_agent': request.META.get('HTTP_USER_AGENT'),
+            'request_time': now - timedelta(seconds=duration),
+            'response_time': now,
+            'duration_ms': duration * 1000,
+        }
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name or match.route) if match else 'unmatched'
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Staff-only request profiling. ``?profile=1`` runs the rest of the stack
+    under cProfile, stores <id>.prof/.txt/.collapsed under PROFILING['DIR']
+    and returns the normal response with an ``X-Profile-Id`` header;
+    ``?profile=text`` returns the top functions as text/plain instead.
+
+    With PROFILING['CONTINUOUS'] every request is also attributed to the
+    low-rate stack sampler, which writes per-endpoint collapsed stacks
+    (WSGI only: async requests are not bound to one thread).
+    Place it after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = get_profiling_settings()
+        if not self.config['ENABLED'] and not self.config['CONTINUOUS']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        continuous = get_continuous_profiler()
+        try:
+            mode = request.GET.get('profile')
+            if mode in ('1', 'text') and self.config['ENABLED'] and self.is_allowed(request):
+                return self.profile(request, mode)
+            return self.get_response(request)
+        finally:
+            if continuous is not None:
+                continuous.exit()
+
+    async def __acall__(self, request):
+        mode = request.GET.get('profile')
+        if mode in ('1', 'text') and self.config['ENABLED']:
+            user = await request.auser()
+            if user.is_authenticated and user.is_staff:
+                profiler = RequestProfile(self.config['REQUEST_SAMPLE_INTERVAL'], self.config['TOP_FUNCTIONS'])
+                response = await profiler.arun(self.get_response, request)
+                if profiler.profile is not None:
+                    return self.finish(request, mode, profiler, response)
+                return response
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        continuous = None if self.async_mode else get_continuous_profiler()
+        if continuous is not None:
+            continuous.enter(endpoint_name(request))
+        return None
+
+    @staticmethod
+    def is_allowed(request):
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated and user.is_staff
+
+    def profile(self, request, mode):
+        profiler = RequestProfile(self.config['REQUEST_SAMPLE_INTERVAL'], self.config['TOP_FUNCTIONS'])
+        response = profiler.run(self.get_response, request)
+        return self.finish(request, mode, profiler, response)
+
+    def finish(self, request, mode, profiler, response):
+        endpoint = endpoint_name(request)
+        try:
+            profile_id = profiler.save(self.config['DIR'], endpoint)
+        except OSError as e:
+            logger.warning("Could not store request profile: %s", e)
+            profile_id = None
+        logger.info("Profiled %s %s in %.1fms (profile %s)",
+                    request.method, request.path, profiler.duration_ms, profile_id)
+
+        if mode == 'text':
+            return HttpResponse(
+                f"# {request.method} {request.get_full_path()} -> {response.status_code}, "
+                f"{profiler.duration_ms:.1f}ms, profile {profile_id}\n\n{profiler.report()}",
+                content_type='text/plain; charset=utf-8',
+            )
+        if profile_id:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+
+class SlowQueryMiddleware(AsyncCapableMiddleware):
+    """
+    Installs a SlowQueryLogger on every configured database for the rest of
+    the stack, so statements over SLOW_QUERIES['THRESHOLD_MS'] are logged
+    with their plan, endpoint and request_id.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = get_slow_query_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with query_wrapper(SlowQueryLogger(request, self.config)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with query_wrapper(SlowQueryLogger(request, self.config)):
+            return await self.get_response(request)
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Feeds every request into the in-process latency histogram and DB-time
+    counters served at /metrics. Place it first so the whole stack is timed.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if not metrics.get_metrics_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        start_sampler_thread()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder(fingerprint=False)
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.observe(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(fingerprint=False)
+        start = time.perf_counter()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.observe(request, response, recorder, time.perf_counter() - start)
+
+    @staticmethod
+    def observe(request, response, recorder, duration):
+        endpoint = endpoint_name(request)
+        metrics.observe_request(endpoint, response.status_code, duration, recorder.total_ms / 1000, recorder.count)
+        return response
@@ -15,6 +15,8 @@ class APIRequestLog(models.Model):
     
     status_code = models.IntegerField()
     response_body = models.JSONField(null=True, blank=True)
+    response_size = models.IntegerField(null=True, blank=True)
+    response_hash = models.CharField(max_length=64, null=True, blank=True)
     
     user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
     client_ip = models.GenericIPAddressField(null=True, blank=True)
@@ -44,9 +46,19 @@ class APIRequestLog(models.Model):
 
 class SystemMetrics(models.Model):
     """
-    Model for storing system performance metrics
+    Model for storing system performance metrics. Raw samples are
+    downsampled into 1-minute, 1-hour and 1-day rows as they age.
     """
+    RESOLUTION_CHOICES = [
+        ('raw', 'Raw sample'),
+        ('1m', '1 minute'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    resolution = models.CharField(max_length=3, choices=RESOLUTION_CHOICES, default='raw')
+    samples = models.IntegerField(default=1)
     cpu_percent = models.FloatField()
     memory_percent = models.FloatField()
     active_connections = models.IntegerField()
@@ -57,6 +69,7 @@ class SystemMetrics(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['timestamp']),
+            models.Index(fields=['resolution', 'timestamp']),
         ]
 
 class AnalyticsMetrics(models.Model):
@@ -76,4 +89,43 @@ class AnalyticsMetrics(models.Model):
         indexes = [
             models.Index(fields=['period', 'metric_type']),
         ]
-        unique_together = ['period', 'metric_type']
\ No newline at end of file
+        unique_together = ['period', 'metric_type']
+
+
+class APIRequestRollup(models.Model):
+    """
+    Hourly per-path request counts and latency, maintained incrementally
+    from the request log writer
+    """
+    hour = models.DateTimeField()
+    path = models.CharField(max_length=500)
+
+    requests = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    duration_sum_ms = models.FloatField(default=0.0)
+    # counts per metrics.LATENCY_BUCKETS bucket, +Inf last
+    duration_buckets = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+        unique_together = ['hour', 'path']
+
+
+class APIUserRollup(models.Model):
+    """
+    Hourly per-user request counts (authenticated requests only), kept apart
+    from APIRequestRollup so per-path rows do not multiply by active users
+    """
+    hour = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    requests = models.IntegerField(default=0)
+    duration_sum_ms = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+        unique_together = ['hour', 'user']
@@ -0,0 +1,265 @@
+"""
+Profiling helpers: cProfile reports for single requests and a stack-sampling
+profiler that aggregates collapsed stacks (flamegraph.pl / speedscope input).
+"""
+import io
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import itertools
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PROFILING_SETTINGS = {
+    'ENABLED': True,                 # staff-only ?profile=1 / ?profile=text
+    'DIR': None,                     # defaults to BASE_DIR / 'var' / 'profiles'
+    'TOP_FUNCTIONS': 30,
+    'REQUEST_SAMPLE_INTERVAL': 0.001,
+    'CONTINUOUS': False,             # background stack sampling of all requests
+    'CONTINUOUS_INTERVAL': 0.05,     # 20 Hz
+    'FLUSH_INTERVAL': 60.0,          # seconds between collapsed-stack file writes
+}
+
+
+def get_profiling_settings():
+    config = {**DEFAULT_PROFILING_SETTINGS, **getattr(settings, 'PROFILING', {})}
+    if config['DIR'] is None:
+        config['DIR'] = os.path.join(settings.BASE_DIR, 'var', 'profiles')
+    return config
+
+
+def endpoint_filename(endpoint):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', endpoint).strip('_') or 'root'
+
+
+def frame_label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """
+    Root-to-leaf 'a;b;c' string for a frame
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def format_collapsed(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(profile, limit=30, sort='cumulative'):
+    """
+    pstats report of the ``limit`` most expensive functions
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+_profile_lock = threading.Lock()
+_profile_ids = itertools.count(1)
+
+
+class RequestProfile:
+    """
+    Runs a callable under cProfile while sampling the calling thread's stack.
+    Only one request is profiled at a time (cProfile is interpreter-wide).
+    """
+
+    def __init__(self, sample_interval=0.001, limit=30):
+        self.sample_interval = sample_interval
+        self.limit = limit
+        self.profile = None
+        self.stacks = Counter()
+        self.duration_ms = None
+
+    def run(self, func, *args, **kwargs):
+        with _profile_lock:
+            self.profile = cProfile.Profile()
+            start = time.perf_counter()
+            with ThreadSampler(threading.get_ident(), self.sample_interval) as sampler:
+                try:
+                    return self.profile.runcall(func, *args, **kwargs)
+                finally:
+                    self.duration_ms = (time.perf_counter() - start) * 1000
+                    self.stacks = sampler.stacks
+
+    async def arun(self, coroutine_func, *args, **kwargs):
+        """
+        Profile an awaited call. cProfile sees every thread (the async ORM's
+        worker threads included), so concurrent requests show up too. If
+        another request is being profiled the call runs unprofiled and
+        ``profile`` stays None.
+        """
+        if not _profile_lock.acquire(blocking=False):
+            return await coroutine_func(*args, **kwargs)
+        try:
+            self.profile = cProfile.Profile()
+            start = time.perf_counter()
+            with ThreadSampler(threading.get_ident(), self.sample_interval) as sampler:
+                self.profile.enable()
+                try:
+                    return await coroutine_func(*args, **kwargs)
+                finally:
+                    self.profile.disable()
+                    self.duration_ms = (time.perf_counter() - start) * 1000
+                    self.stacks = sampler.stacks
+        finally:
+            _profile_lock.release()
+
+    def report(self):
+        return top_functions(self.profile, self.limit)
+
+    def save(self, directory, endpoint):
+        """
+        Write <id>.prof (pstats dump), <id>.txt (top functions) and
+        <id>.collapsed under <directory>/requests; returns the id
+        """
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{endpoint_filename(endpoint)}-{os.getpid()}-{next(_profile_ids)}"
+        directory = os.path.join(directory, 'requests')
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile_id)
+        self.profile.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w') as fh:
+            fh.write(self.report())
+        with open(base + '.collapsed', 'w') as fh:
+            fh.write(format_collapsed(self.stacks))
+        return profile_id
+
+
+class ThreadSampler:
+    """
+    Samples the stack of one thread every ``interval`` seconds while active,
+    to build the collapsed stacks of a single profiled request.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+
+class ContinuousProfiler:
+    """
+    Low-rate sampler of all threads currently serving a request. Threads are
+    attributed to the endpoint registered with ``enter``; stacks are appended
+    per endpoint to <dir>/continuous/<endpoint>-<YYYYmmddHH>-<pid>.collapsed
+    every ``flush_interval`` seconds (duplicate stacks across flushes are
+    summed by flamegraph tools).
+    """
+
+    def __init__(self, directory, interval=0.05, flush_interval=60.0):
+        self.directory = os.path.join(directory, 'continuous')
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.active = {}
+        self.stacks = defaultdict(Counter)
+        self.samples = 0
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enter(self, endpoint):
+        self.active[threading.get_ident()] = endpoint
+
+    def exit(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='continuous-profiler', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, endpoint in list(self.active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[endpoint][collapse_stack(frame)] += 1
+                    self.samples += 1
+
+    def flush(self):
+        with self._lock:
+            stacks, self.stacks = self.stacks, defaultdict(Counter)
+        if not stacks:
+            return
+        hour = datetime.now().strftime('%Y%m%d%H')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for endpoint, counts in stacks.items():
+                path = os.path.join(self.directory, f"{endpoint_filename(endpoint)}-{hour}-{os.getpid()}.collapsed")
+                with open(path, 'a') as fh:
+                    fh.write(format_collapsed(counts))
+        except OSError as e:
+            logger.warning("Could not write profiles to %s: %s", self.directory, e)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_interval
+
+
+_continuous = None
+_continuous_lock = threading.Lock()
+
+
+def get_continuous_profiler():
+    """
+    Process-wide continuous profiler, started on first use (and again in a
+    forked worker) if PROFILING['CONTINUOUS'] is set; None otherwise
+    """
+    global _continuous
+    config = get_profiling_settings()
+    if not config['CONTINUOUS']:
+        return None
+    if _continuous is None or _continuous.pid != os.getpid():
+        with _continuous_lock:
+            if _continuous is None or _continuous.pid != os.getpid():
+                _continuous = ContinuousProfiler(
+                    config['DIR'], config['CONTINUOUS_INTERVAL'], config['FLUSH_INTERVAL']
+                )
+                _continuous.start()
+    return _continuous
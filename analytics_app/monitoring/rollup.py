@@ -0,0 +1,216 @@
+"""
+Hourly APIRequestLog rollups: observations are accumulated in memory and
+merged into APIRequestRollup (per path) and APIUserRollup (per user) rows, so
+dashboards run a few grouped queries instead of scanning the raw request log.
+"""
+import bisect
+from collections import defaultdict
+from django.db import transaction, IntegrityError
+from django.db.models import Sum
+
+from ..instrumentation import untracked
+from .metrics import LATENCY_BUCKETS, histogram_quantile
+from .models import APIRequestLog, APIRequestRollup, APIUserRollup
+
+
+def truncate_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_index(duration_ms):
+    return bisect.bisect_left(LATENCY_BUCKETS, duration_ms / 1000)
+
+
+class RollupBatch:
+    """
+    In-memory partial rollups keyed by (hour, path) and, for authenticated
+    requests, (hour, user_id)
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.user_rows = {}
+
+    def __len__(self):
+        return len(self.rows) + len(self.user_rows)
+
+    def add(self, moment, path, user_id, status_code, duration_ms):
+        hour = truncate_hour(moment)
+        row = self.rows.get((hour, path))
+        if row is None:
+            row = self.rows[(hour, path)] = [0, 0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+        row[0] += 1
+        row[1] += status_code >= 400
+        row[2] += duration_ms
+        row[3][bucket_index(duration_ms)] += 1
+        if user_id is not None:
+            user_row = self.user_rows.setdefault((hour, user_id), [0, 0.0])
+            user_row[0] += 1
+            user_row[1] += duration_ms
+
+    def flush(self, attempts=3):
+        """
+        Add this batch to the stored rollups (read-modify-write under
+        select_for_update) and clear it
+        """
+        if not self.rows and not self.user_rows:
+            return
+        for attempt in range(attempts):
+            try:
+                with untracked(), transaction.atomic():
+                    self._merge_paths()
+                    self._merge_users()
+                break
+            except IntegrityError:
+                # another process created one of the rows first: merge into it
+                if attempt == attempts - 1:
+                    raise
+        self.rows = {}
+        self.user_rows = {}
+
+    def _merge_paths(self):
+        if not self.rows:
+            return
+        hours = {hour for hour, _ in self.rows}
+        paths = {path for _, path in self.rows}
+        existing = {
+            (rollup.hour, rollup.path): rollup
+            for rollup in APIRequestRollup.objects.select_for_update().filter(hour__in=hours, path__in=paths)
+        }
+
+        changed, created = [], []
+        for key, (requests, errors, duration_sum, buckets) in self.rows.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                hour, path = key
+                created.append(APIRequestRollup(
+                    hour=hour, path=path, requests=requests, errors=errors,
+                    duration_sum_ms=duration_sum, duration_buckets=buckets,
+                ))
+                continue
+            rollup.requests += requests
+            rollup.errors += errors
+            rollup.duration_sum_ms += duration_sum
+            stored = rollup.duration_buckets or [0] * len(buckets)
+            rollup.duration_buckets = [a + b for a, b in zip(stored, buckets)]
+            changed.append(rollup)
+
+        if changed:
+            APIRequestRollup.objects.bulk_update(
+                changed, ['requests', 'errors', 'duration_sum_ms', 'duration_buckets']
+            )
+        if created:
+            APIRequestRollup.objects.bulk_create(created)
+
+    def _merge_users(self):
+        if not self.user_rows:
+            return
+        hours = {hour for hour, _ in self.user_rows}
+        user_ids = {user_id for _, user_id in self.user_rows}
+        existing = {
+            (rollup.hour, rollup.user_id): rollup
+            for rollup in APIUserRollup.objects.select_for_update().filter(hour__in=hours, user_id__in=user_ids)
+        }
+
+        changed, created = [], []
+        for (hour, user_id), (requests, duration_sum) in self.user_rows.items():
+            rollup = existing.get((hour, user_id))
+            if rollup is None:
+                created.append(APIUserRollup(
+                    hour=hour, user_id=user_id, requests=requests, duration_sum_ms=duration_sum,
+                ))
+                continue
+            rollup.requests += requests
+            rollup.duration_sum_ms += duration_sum
+            changed.append(rollup)
+
+        if changed:
+            APIUserRollup.objects.bulk_update(changed, ['requests', 'duration_sum_ms'])
+        if created:
+            APIUserRollup.objects.bulk_create(created)
+
+
+def rebuild_rollups(start, end, chunk_size=5000):
+    """
+    Recompute rollups for whole hours in [start, end) from APIRequestLog
+    (backfill or repair). Returns the number of log rows read.
+    """
+    start, end = truncate_hour(start), truncate_hour(end)
+    logs = APIRequestLog.objects.filter(request_time__gte=start, request_time__lt=end).values_list(
+        'request_time', 'path', 'user_id', 'status_code', 'duration_ms'
+    )
+    batch = RollupBatch()
+    count = 0
+    for row in logs.iterator(chunk_size=chunk_size):
+        batch.add(*row)
+        count += 1
+
+    with transaction.atomic():
+        APIRequestRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+        APIUserRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+        batch.flush()
+    return count
+
+
+def latency_summary(requests, errors, duration_sum_ms, buckets=None):
+    """
+    Totals with mean and (given merged buckets) p95 latency
+    """
+    p95 = histogram_quantile(0.95, LATENCY_BUCKETS, buckets) if buckets else None
+    return {
+        'total_requests': requests,
+        'error_count': errors,
+        'avg_response_time': round(duration_sum_ms / requests, 2) if requests else 0,
+        'p95_response_time': round(p95 * 1000, 2) if p95 is not None else None,
+    }
+
+
+def path_statistics(since, limit=10):
+    """
+    Busiest paths from ``since``: totals grouped in the database, p95 from
+    the latency buckets of those paths (one row per path and hour)
+    """
+    rollups = APIRequestRollup.objects.filter(hour__gte=truncate_hour(since))
+    totals = list(rollups.values('path').annotate(
+        requests_sum=Sum('requests'), errors_sum=Sum('errors'), duration_sum=Sum('duration_sum_ms'),
+    ).order_by('-requests_sum', 'path')[:limit])
+
+    buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    for path, path_buckets in rollups.filter(path__in=[row['path'] for row in totals]).values_list(
+            'path', 'duration_buckets'):
+        if path_buckets:
+            buckets[path] = [a + b for a, b in zip(buckets[path], path_buckets)]
+
+    return [
+        {'path': row['path'], **latency_summary(
+            row['requests_sum'], row['errors_sum'], row['duration_sum'], buckets.get(row['path']),
+        )}
+        for row in totals
+    ]
+
+
+def hourly_totals(since):
+    """
+    {hour: (requests, duration_sum_ms)} from ``since``, grouped in the database
+    """
+    rows = APIRequestRollup.objects.filter(hour__gte=truncate_hour(since)).values('hour').annotate(
+        requests_sum=Sum('requests'), duration_sum=Sum('duration_sum_ms'),
+    ).order_by()
+    return {row['hour']: (row['requests_sum'], row['duration_sum']) for row in rows}
+
+
+def top_users(since, limit=5):
+    """
+    Users with the most requests from ``since``, grouped in the database
+    """
+    rows = APIUserRollup.objects.filter(hour__gte=truncate_hour(since)).values('user__username').annotate(
+        request_count=Sum('requests'), duration_sum=Sum('duration_sum_ms'),
+    ).order_by('-request_count', 'user__username')[:limit]
+    return [
+        {
+            'user__username': row['user__username'],
+            'request_count': row['request_count'],
+            'avg_response_time': round(row['duration_sum'] / row['request_count'], 2),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,224 @@
+"""
+Host and request-rate sampling into SystemMetrics, with downsampling of
+older samples into 1-minute, 1-hour and 1-day rows.
+"""
+import time
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+
+from ..instrumentation import untracked
+from . import metrics
+from .models import SystemMetrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SYSTEM_METRICS_SETTINGS = {
+    'THREAD': False,           # sample from a thread in the web process (single-process servers)
+    'INTERVAL': 10.0,          # seconds between samples
+    'DOWNSAMPLE_EVERY': 300,   # seconds between downsampling passes
+    # how long each resolution is kept before it is folded into the next tier
+    'RETENTION': {
+        'raw': timedelta(hours=6),
+        '1m': timedelta(days=7),
+        '1h': timedelta(days=90),
+    },
+}
+
+# source resolution -> (target resolution, target bucket width)
+TIERS = [
+    ('raw', '1m', timedelta(minutes=1)),
+    ('1m', '1h', timedelta(hours=1)),
+    ('1h', '1d', timedelta(days=1)),
+]
+
+AVERAGED_FIELDS = ('cpu_percent', 'memory_percent', 'active_connections',
+                   'queries_per_second', 'response_time_avg', 'error_rate')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_system_metrics_settings():
+    config = {**DEFAULT_SYSTEM_METRICS_SETTINGS, **getattr(settings, 'SYSTEM_METRICS', {})}
+    config['RETENTION'] = {**DEFAULT_SYSTEM_METRICS_SETTINGS['RETENTION'], **config['RETENTION']}
+    return config
+
+
+def read_cpu_times(path='/proc/stat'):
+    """
+    (idle, total) jiffies of all CPUs
+    """
+    with open(path) as fh:
+        values = [int(v) for v in fh.readline().split()[1:]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    return idle, sum(values)
+
+
+def read_memory_percent(path='/proc/meminfo'):
+    fields = {}
+    with open(path) as fh:
+        for line in fh:
+            name, _, value = line.partition(':')
+            fields[name] = int(value.split()[0])
+    total = fields['MemTotal']
+    available = fields.get('MemAvailable', fields.get('MemFree', 0))
+    return (total - available) / total * 100 if total else 0.0
+
+
+def count_established_connections(paths=('/proc/net/tcp', '/proc/net/tcp6')):
+    count = 0
+    for path in paths:
+        try:
+            with open(path) as fh:
+                next(fh)
+                count += sum(1 for line in fh if line.split()[3] == '01')
+        except (OSError, StopIteration):
+            continue
+    return count
+
+
+def request_totals(snapshot):
+    """
+    (requests, errors, latency seconds) summed over all endpoints
+    """
+    requests = errors = 0
+    seconds = 0.0
+    for (_, status_class), (counts, total) in snapshot[metrics.REQUEST_DURATION.name].items():
+        count = sum(counts)
+        requests += count
+        seconds += total
+        if status_class in ('4xx', '5xx'):
+            errors += count
+    return requests, errors, seconds
+
+
+class SystemSampler:
+    """
+    Produces SystemMetrics values from /proc and the request counters of
+    monitoring.metrics (summed over workers when METRICS['MULTIPROCESS_DIR']
+    is set). Rates are deltas since the previous sample;
+    queries_per_second counts API requests.
+    """
+
+    def __init__(self):
+        self._previous = None
+
+    def sample(self):
+        now = time.monotonic()
+        cpu = read_cpu_times()
+        requests = request_totals(metrics.collect())
+        previous, self._previous = self._previous, (now, cpu, requests)
+        if previous is None:
+            return None  # rates need two readings
+
+        elapsed = now - previous[0]
+        idle = cpu[0] - previous[1][0]
+        total = cpu[1] - previous[1][1]
+        count = requests[0] - previous[2][0]
+        errors = requests[1] - previous[2][1]
+        seconds = requests[2] - previous[2][2]
+        return {
+            'cpu_percent': round((1 - idle / total) * 100, 2) if total > 0 else 0.0,
+            'memory_percent': round(read_memory_percent(), 2),
+            'active_connections': count_established_connections(),
+            'queries_per_second': round(count / elapsed, 3) if elapsed > 0 else 0.0,
+            'response_time_avg': round(seconds / count * 1000, 3) if count > 0 else 0.0,
+            'error_rate': round(errors / count * 100, 3) if count > 0 else 0.0,
+        }
+
+    def record(self):
+        values = self.sample()
+        if values is None:
+            return None
+        with untracked():
+            return SystemMetrics.objects.create(**values)
+
+
+def _bucket_start(moment, width):
+    seconds = width.total_seconds()
+    return _EPOCH + timedelta(seconds=(moment - _EPOCH).total_seconds() // seconds * seconds)
+
+
+def downsample(now=None):
+    """
+    Fold rows older than their tier's retention into the next tier: sample-
+    weighted averages per bucket, then delete the source rows. Only complete
+    buckets are folded. Returns {target resolution: rows created}.
+    """
+    now = now or timezone.now()
+    retention = get_system_metrics_settings()['RETENTION']
+    created = {}
+    for source, target, width in TIERS:
+        cutoff = _bucket_start(now - retention[source], width)
+        rows = SystemMetrics.objects.filter(resolution=source, timestamp__lt=cutoff)
+
+        buckets = defaultdict(list)
+        for row in rows.iterator():
+            buckets[_bucket_start(row.timestamp, width)].append(row)
+
+        aggregated = []
+        for bucket, bucket_rows in sorted(buckets.items()):
+            weight = sum(row.samples for row in bucket_rows)
+            values = {
+                field: sum(getattr(row, field) * row.samples for row in bucket_rows) / weight
+                for field in AVERAGED_FIELDS
+            }
+            values['active_connections'] = round(values['active_connections'])
+            aggregated.append(SystemMetrics(timestamp=bucket, resolution=target, samples=weight, **values))
+
+        with untracked(), transaction.atomic():
+            SystemMetrics.objects.bulk_create(aggregated)
+            rows.delete()
+        created[target] = len(aggregated)
+    return created
+
+
+def run_sampler(interval, downsample_every, stop_event=None, iterations=None):
+    """
+    Sample every ``interval`` seconds and downsample every
+    ``downsample_every`` seconds until ``stop_event`` is set
+    """
+    stop_event = stop_event or threading.Event()
+    sampler = SystemSampler()
+    next_downsample = time.monotonic()
+    done = 0
+    while not stop_event.is_set():
+        try:
+            sampler.record()
+            if time.monotonic() >= next_downsample:
+                downsample()
+                next_downsample = time.monotonic() + downsample_every
+        except Exception as e:
+            logger.error("System metrics sampling failed: %s", e)
+        finally:
+            close_old_connections()
+        done += 1
+        if iterations is not None and done >= iterations:
+            break
+        stop_event.wait(interval)
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def start_sampler_thread():
+    """
+    Start the in-process sampler once if SYSTEM_METRICS['THREAD'] is set
+    """
+    global _thread
+    config = get_system_metrics_settings()
+    if not config['THREAD'] or _thread is not None:
+        return
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=run_sampler, args=(config['INTERVAL'], config['DOWNSAMPLE_EVERY']),
+                name='system-metrics-sampler', daemon=True,
+            )
+            _thread.start()
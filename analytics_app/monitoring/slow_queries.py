@@ -0,0 +1,210 @@
+"""
+Slow-query log: statements slower than SLOW_QUERIES['THRESHOLD_MS'] are
+logged with their fingerprint, parameters, endpoint, request_id and an
+EXPLAIN taken right after they ran. Records go through the
+'analytics_app.slow_queries' logger to a size-capped rotating JSON-lines
+file (see LOGGING), which ``manage.py slow_query_report`` summarizes.
+"""
+import json
+import time
+import hashlib
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..instrumentation import fingerprint_sql, untracked, is_untracked
+
+logger = logging.getLogger('analytics_app.slow_queries')
+
+
+DEFAULT_SLOW_QUERY_SETTINGS = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 200,
+    'ENDPOINT_THRESHOLDS_MS': {},   # url name -> threshold
+    'EXPLAIN': True,
+    'LOG_FILE': 'logs/slow_queries.jsonl',   # read by slow_query_report; written by LOGGING
+}
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN (FORMAT JSON) ',
+    'mysql': 'EXPLAIN FORMAT=JSON ',
+}
+
+
+def get_slow_query_settings():
+    return {**DEFAULT_SLOW_QUERY_SETTINGS, **getattr(settings, 'SLOW_QUERIES', {})}
+
+
+def fingerprint_id(fingerprint):
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+
+
+def explain(connection, sql, params):
+    """
+    Backend-appropriate plan of a SELECT, or None. Runs in a savepoint inside
+    transactions so a failing EXPLAIN cannot abort the caller's transaction.
+    """
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    keyword = sql.lstrip()[:6].upper()
+    if prefix is None or not keyword.startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        with untracked():
+            if connection.in_atomic_block:
+                with transaction.atomic(using=connection.alias):
+                    rows = _fetch_plan(connection, prefix + sql, params)
+            else:
+                rows = _fetch_plan(connection, prefix + sql, params)
+    except DatabaseError as e:
+        return f"EXPLAIN failed: {e}"
+
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail) rows -> indented tree
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return '\n'.join(lines)
+    plan = rows[0][0] if rows else None
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def _fetch_plan(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _loggable_params(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _loggable_value(value) for key, value in params.items()}
+    return [_loggable_value(value) for value in params]
+
+
+def _loggable_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class SlowQueryLogger:
+    """
+    Execute wrapper for one request: times each statement and logs those
+    over the endpoint's threshold. The endpoint is read from the request
+    when a slow query happens, so the wrapper can be installed before URL
+    resolution.
+    """
+
+    def __init__(self, request=None, config=None):
+        self.request = request
+        self.config = config or get_slow_query_settings()
+        self.logged = 0
+
+    def endpoint(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return (match.url_name or match.route) if match else None
+
+    def threshold_ms(self):
+        endpoint = self.endpoint()
+        return self.config['ENDPOINT_THRESHOLDS_MS'].get(endpoint, self.config['THRESHOLD_MS'])
+
+    def __call__(self, execute, sql, params, many, context):
+        if is_untracked():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= self.threshold_ms():
+            try:
+                self.log(context['connection'], sql, params, many, duration_ms)
+            except Exception as e:
+                logger.error("Failed to log slow query: %s", e)
+        return result
+
+    def log(self, connection, sql, params, many, duration_ms):
+        fingerprint = fingerprint_sql(sql)
+        plan = None
+        if self.config['EXPLAIN'] and not many:
+            plan = explain(connection, sql, params)
+        endpoint = self.endpoint()
+        self.logged += 1
+        logger.warning(
+            "Slow query %.1fms on %s: %s", duration_ms, endpoint, fingerprint[:200],
+            extra={
+                'logged_at': timezone.now().isoformat(),
+                'fingerprint': fingerprint,
+                'fingerprint_id': fingerprint_id(fingerprint),
+                'sql': sql,
+                'params': None if many else _loggable_params(params),
+                'duration_ms': round(duration_ms, 3),
+                'endpoint': endpoint,
+                'request_id': getattr(self.request, 'request_id', None),
+                'database': connection.alias,
+                'vendor': connection.vendor,
+                'plan': plan,
+            },
+        )
+
+
+def read_slow_query_log(paths, since=None, endpoint=None):
+    """
+    Yield slow-query records (dicts) from JSON-lines log files, skipping
+    other or unreadable lines
+    """
+    for path in paths:
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'fingerprint_id' not in record:
+                    continue
+                if endpoint and record.get('endpoint') != endpoint:
+                    continue
+                if since:
+                    logged_at = parse_datetime(record.get('logged_at') or '')
+                    if logged_at is None or logged_at < since:
+                        continue
+                yield record
+
+
+def summarize_fingerprints(records):
+    """
+    Per-fingerprint count, total/mean/max time, endpoints and the plan of
+    the slowest occurrence, worst total time first
+    """
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set()})
+    for record in records:
+        group = groups[record['fingerprint_id']]
+        group['fingerprint'] = record['fingerprint']
+        group['count'] += 1
+        group['total_ms'] += record['duration_ms']
+        group['endpoints'].add(record.get('endpoint') or '-')
+        if record['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = record['duration_ms']
+            group['slowest'] = record
+
+    summary = []
+    for fid, group in groups.items():
+        summary.append({
+            'fingerprint_id': fid,
+            'fingerprint': group['fingerprint'],
+            'count': group['count'],
+            'total_ms': round(group['total_ms'], 3),
+            'mean_ms': round(group['total_ms'] / group['count'], 3),
+            'max_ms': round(group['max_ms'], 3),
+            'endpoints': sorted(group['endpoints']),
+            'slowest_params': group['slowest'].get('params'),
+            'slowest_request_id': group['slowest'].get('request_id'),
+            'plan': group['slowest'].get('plan'),
+        })
+    summary.sort(key=lambda item: item['total_ms'], reverse=True)
+    return summary
@@ -1,10 +1,14 @@
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Count, Avg, Sum, F
-from datetime import datetime, timedelta
+from django.http import HttpResponse
+from datetime import timedelta
 from django.utils import timezone
-from ..monitoring.models import APIRequestLog, SystemMetrics
+from ..dedup import get_deduplicator
+from .writer import get_request_log_writer
+from .rollup import path_statistics, hourly_totals, top_users
+from ..routers import reads_from_replica, get_replica_health
+from . import metrics
 
 class HealthCheckView(APIView):
     """
@@ -19,20 +23,9 @@ class HealthCheckView(APIView):
         except Exception as e:
             db_status = f'unhealthy: {str(e)}'
         
-        # Check recent API performance
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        recent_requests = APIRequestLog.objects.filter(
-            response_time__gte=one_hour_ago
-        )
-        
-        total_requests = recent_requests.count()
-        error_rate = recent_requests.filter(status_code__gte=400).count()
-        error_rate = (error_rate / total_requests * 100) if total_requests > 0 else 0
-        
-        avg_response_time = recent_requests.aggregate(
-            avg_time=Avg('duration_ms')
-        )['avg_time'] or 0
-        
+        # API performance since start, from the in-process histograms (no DB load)
+        summary = metrics.request_summary()
+
         return Response({
             'status': 'healthy',
             'timestamp': timezone.now().isoformat(),
@@ -40,12 +33,18 @@ class HealthCheckView(APIView):
                 'database': db_status,
                 'api': 'healthy',
                 'cache': 'healthy',
+                'read_replicas': get_replica_health().status(),
             },
             'metrics': {
-                'total_requests_last_hour': total_requests,
-                'error_rate_percent': round(error_rate, 2),
-                'avg_response_time_ms': round(avg_response_time, 2),
+                'total_requests': summary['requests'],
+                'error_rate_percent': summary['error_rate_percent'],
+                'avg_response_time_ms': summary['avg_response_time_ms'],
+                'p50_response_time_ms': summary['p50_ms'],
+                'p95_response_time_ms': summary['p95_ms'],
+                'p99_response_time_ms': summary['p99_ms'],
                 'uptime': self.get_uptime(),
+                'view_dedup': get_deduplicator().stats(),
+                'request_log_writer': get_request_log_writer().stats(),
             }
         })
     
@@ -56,62 +55,61 @@ class HealthCheckView(APIView):
 
 class PerformanceDashboardView(APIView):
     """
-    Dashboard for performance metrics
+    Dashboard for performance metrics, read from the hourly request rollups
+    with four grouped queries whatever the traffic (?days= sets the API
+    statistics window, default 30)
     """
+    @reads_from_replica
     def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= 366:
+            return Response({'error': 'days must be an integer between 1 and 366'}, status=400)
+
         # Time ranges
         now = timezone.now()
-        today = now.date()
+        today_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        today = today_start.date()
         week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
+        window_start = now - timedelta(days=days)
+
         # API usage statistics
-        api_stats = APIRequestLog.objects.filter(
-            response_time__gte=month_ago
-        ).values('path').annotate(
-            total_requests=Count('id'),
-            avg_response_time=Avg('duration_ms'),
-            error_count=Count('id', filter=F('status_code__gte', 400))
-        ).order_by('-total_requests')[:10]
-        
+        api_stats = path_statistics(window_start, limit=10)
+
         # Hourly traffic for today
+        per_hour = hourly_totals(today_start)
         hourly_traffic = []
         for hour in range(24):
-            hour_start = timezone.make_aware(datetime.combine(today, time(hour, 0, 0)))
-            hour_end = hour_start + timedelta(hours=1)
-            
-            count = APIRequestLog.objects.filter(
-                response_time__gte=hour_start,
-                response_time__lt=hour_end
-            ).count()
-            
+            hour_start = today_start + timedelta(hours=hour)
             hourly_traffic.append({
                 'hour': hour,
-                'requests': count
+                'requests': per_hour.get(hour_start, (0, 0.0))[0],
             })
-        
+
         # Top users by API usage
-        top_users = APIRequestLog.objects.filter(
-            user__isnull=False,
-            response_time__gte=week_ago
-        ).values('user__username').annotate(
-            request_count=Count('id'),
-            avg_response_time=Avg('duration_ms')
-        ).order_by('-request_count')[:5]
-        
+        users = top_users(week_ago, limit=5)
+
+        requests_today = sum(requests for requests, _ in per_hour.values())
+        duration_today = sum(duration for _, duration in per_hour.values())
         return Response({
             'time_period': {
                 'today': today.isoformat(),
                 'week_ago': week_ago.isoformat(),
-                'month_ago': month_ago.isoformat(),
+                'window_start': window_start.isoformat(),
             },
-            'api_statistics': list(api_stats),
+            'api_statistics': api_stats,
             'hourly_traffic': hourly_traffic,
-            'top_users': list(top_users),
+            'top_users': users,
             'summary': {
-                'total_requests_today': sum(h['requests'] for h in hourly_traffic),
-                'avg_response_time': APIRequestLog.objects.filter(
-                    response_time__gte=today
-                ).aggregate(avg=Avg('duration_ms'))['avg'] or 0,
+                'total_requests_today': requests_today,
+                'avg_response_time': round(duration_today / requests_today, 2) if requests_today else 0,
             }
-        })
\ No newline at end of file
+        })
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint
+    """
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,181 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection, close_old_connections
+
+from ..instrumentation import untracked
+from .models import APIRequestLog
+from .rollup import RollupBatch
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MONITORING_SETTINGS = {
+    'ENABLED': True,
+    'SAMPLING': 'tail',        # 'head': decide before the view runs, 'tail': after the response
+    'SAMPLE_RATE': 1.0,        # share of ordinary requests kept
+    'SLOW_REQUEST_MS': 1000,   # tail sampling always keeps slower requests and errors
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,     # seconds a partial batch may wait
+    'MAX_QUEUE': 10000,        # records beyond this are dropped, never blocking the request
+}
+
+
+def get_monitoring_settings():
+    return {**DEFAULT_MONITORING_SETTINGS, **getattr(settings, 'API_MONITORING', {})}
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class RequestLogWriter:
+    """
+    Buffers APIRequestLog rows in memory and writes them with bulk_create from
+    a background thread, in batches of BATCH_SIZE or every FLUSH_INTERVAL.
+    Rollup observations (every request, sampled or not) are merged into the
+    hourly APIRequestRollup on the same schedule.
+
+    ``submit`` never blocks: when the queue is full the record is dropped and
+    counted.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fields):
+        """
+        Queue one record (APIRequestLog field values). Returns False if dropped.
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(fields)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def observe(self, moment, path, user_id, status_code, duration_ms):
+        """
+        Queue one request for the hourly rollup. Returns False if dropped.
+        """
+        return self.submit((moment, path, user_id, status_code, duration_ms))
+
+    def write(self, records, rollup=None):
+        try:
+            # bulk_create sizes its batches from the live connection's limits
+            connection.ensure_connection()
+            with untracked():
+                APIRequestLog.objects.bulk_create(
+                    [APIRequestLog(**fields) for fields in records], batch_size=self.batch_size
+                )
+            self.written += len(records)
+        except Exception as e:
+            self.failed += len(records)
+            logger.error("Failed to write %d API request logs: %s", len(records), e)
+
+        if rollup:
+            try:
+                rollup.flush()
+            except Exception as e:
+                logger.error("Failed to update request rollups: %s", e)
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until everything queued so far has been written
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return
+        marker = _Flush()
+        self.queue.put(marker)
+        marker.done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _ensure_started(self):
+        # (Re)start lazily so forked workers get their own thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='api-request-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch = []
+        rollup = RollupBatch()
+        pending = 0
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = _Flush()
+
+                if item is None or isinstance(item, _Flush):
+                    if pending:
+                        self.write(batch, rollup)
+                        batch, pending, deadline = [], 0, None
+                    if item is None:
+                        return
+                    item.done.set()
+                    continue
+
+                if isinstance(item, tuple):
+                    rollup.add(*item)
+                else:
+                    batch.append(item)
+                pending += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if pending >= self.batch_size:
+                    self.write(batch, rollup)
+                    batch, pending, deadline = [], 0, None
+                    close_old_connections()
+        finally:
+            connection.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_request_log_writer():
+    """
+    Process-wide writer configured from ``settings.API_MONITORING``
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = get_monitoring_settings()
+                _writer = RequestLogWriter(config['BATCH_SIZE'], config['FLUSH_INTERVAL'], config['MAX_QUEUE'])
+                atexit.register(_writer.stop)
+    return _writer
@@ -2,6 +2,8 @@
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from collections import OrderedDict
+from .parallel import run_parallel
+from .deadlines import unless_timed_out
 
 
 
@@ -38,6 +40,38 @@ class AnalyticsPagination(LimitOffsetPagination):
     """
     default_limit = 100
     max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        As LimitOffsetPagination, but the count and the page query run in
+        parallel. In degraded mode a count that times out becomes None and
+        the page is still returned.
+        """
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count, page = run_parallel(
+            unless_timed_out(lambda: self.get_count(queryset)),
+            lambda: list(queryset[self.offset:self.offset + self.limit]),
+        )
+        self.page_length = len(page)
+        if self.count is not None and (self.count == 0 or self.offset > self.count):
+            return []
+        return page
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        # Without a count, assume a full page is followed by another one
+        if self.page_length < self.limit:
+            return None
+        self.count = self.offset + self.limit + 1
+        try:
+            return super().get_next_link()
+        finally:
+            self.count = None
     
     def get_paginated_response(self, data):
         """
@@ -50,7 +84,12 @@ class AnalyticsPagination(LimitOffsetPagination):
             ('limit', self.limit),
             ('offset', self.offset),
             ('data', data.get('data', []))
-        ]))
+        ] + self.degraded_fields()))
+
+    def degraded_fields(self):
+        if self.count is not None:
+            return []
+        return [('degraded', {'reason': 'query_timeout', 'missing': ['count']})]
     
     def get_paginated_response_schema(self, schema):
         return {
@@ -0,0 +1,112 @@
+"""
+Bounded thread pool for running independent queries of one request in
+parallel. Each worker thread keeps its own database connection, managed like
+a request's (close_old_connections before and after every task, so
+CONN_MAX_AGE applies). The caller's context variables (tracing span, query
+recorders) are copied into each task.
+"""
+import os
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+DEFAULT_PARALLEL_QUERY_SETTINGS = {
+    'ENABLED': True,
+    'MAX_WORKERS': 8,        # pool size = extra database connections per process
+    'MAX_PER_REQUEST': 4,    # sub-queries of one call in flight at once
+}
+
+_state = threading.local()
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_parallel_query_settings():
+    return {**DEFAULT_PARALLEL_QUERY_SETTINGS, **getattr(settings, 'PARALLEL_QUERIES', {})}
+
+
+def get_executor():
+    """
+    Process-wide pool, recreated in a forked worker
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_parallel_query_settings()['MAX_WORKERS'],
+                    thread_name_prefix='analytics-query',
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _run_isolated(func):
+    _state.in_worker = True
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+        _state.in_worker = False
+
+
+def _submit(executor, func):
+    return executor.submit(contextvars.copy_context().run, _run_isolated, func)
+
+
+def should_run_inline(funcs):
+    """
+    Worker connections cannot see rows of an open transaction, nested calls
+    from a worker could starve the pool, and one callable gains nothing
+    """
+    return (
+        len(funcs) < 2
+        or not get_parallel_query_settings()['ENABLED']
+        or getattr(_state, 'in_worker', False)
+        or any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+    )
+
+
+def run_parallel(*funcs, max_parallel=None):
+    """
+    Call independent ORM callables on the pool, at most ``max_parallel``
+    (default MAX_PER_REQUEST) at a time, and return their results in order.
+    Waits for all of them; the first exception is then re-raised.
+    """
+    if should_run_inline(funcs):
+        return [func() for func in funcs]
+
+    executor = get_executor()
+    slots = threading.BoundedSemaphore(max_parallel or get_parallel_query_settings()['MAX_PER_REQUEST'])
+    futures = []
+    for func in funcs:
+        slots.acquire()
+        future = _submit(executor, func)
+        future.add_done_callback(lambda f: slots.release())
+        futures.append(future)
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+async def run_parallel_async(*funcs, max_parallel=None):
+    """
+    ``run_parallel`` for async callers: awaits the pool without blocking
+    the event loop
+    """
+    if should_run_inline(funcs):
+        return [await sync_to_async(func)() for func in funcs]
+
+    executor = get_executor()
+    slots = asyncio.Semaphore(max_parallel or get_parallel_query_settings()['MAX_PER_REQUEST'])
+
+    async def run(func):
+        async with slots:
+            return await asyncio.wrap_future(_submit(executor, func))
+
+    return await asyncio.gather(*(run(func) for func in funcs))
@@ -0,0 +1,89 @@
+import logging
+from contextlib import contextmanager
+from django.conf import settings
+
+from .instrumentation import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+# Per-endpoint budgets keyed by URL name. max_db_ms is calibrated for the
+# test fixtures / a small reference dataset, not for production volumes.
+DEFAULT_QUERY_BUDGETS = {
+    'blog-views-analytics': {'max_queries': 3, 'max_db_ms': 100},
+    'top-analytics': {'max_queries': 1, 'max_db_ms': 100},
+    'performance-analytics': {'max_queries': 2, 'max_db_ms': 100},
+}
+
+# A statement shape repeated this many times within one request is reported as N+1
+DEFAULT_N_PLUS_ONE_THRESHOLD = 3
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budgets():
+    """
+    DEFAULT_QUERY_BUDGETS with settings.QUERY_BUDGETS merged in per endpoint;
+    an override of None removes the endpoint's budget
+    """
+    budgets = {endpoint: dict(budget) for endpoint, budget in DEFAULT_QUERY_BUDGETS.items()}
+    for endpoint, budget in getattr(settings, 'QUERY_BUDGETS', {}).items():
+        if budget is None:
+            budgets.pop(endpoint, None)
+        else:
+            budgets[endpoint] = {**budgets.get(endpoint, {}), **budget}
+    return budgets
+
+
+def get_budget(endpoint):
+    return get_query_budgets().get(endpoint)
+
+
+def check_budget(endpoint, recorder, budget=None, n_plus_one_threshold=None):
+    """
+    Returns a list of human-readable violations of ``endpoint``'s budget
+    """
+    budget = budget or get_budget(endpoint)
+    if n_plus_one_threshold is None:
+        n_plus_one_threshold = getattr(settings, 'QUERY_BUDGET_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+
+    violations = []
+    if budget:
+        max_queries = budget.get('max_queries')
+        if max_queries is not None and recorder.count > max_queries:
+            violations.append(f"{endpoint}: {recorder.count} queries (budget {max_queries})")
+        max_db_ms = budget.get('max_db_ms')
+        if max_db_ms is not None and recorder.total_ms > max_db_ms:
+            violations.append(f"{endpoint}: {recorder.total_ms:.1f}ms DB time (budget {max_db_ms}ms)")
+
+    for fingerprint, count in recorder.repeated(n_plus_one_threshold).items():
+        violations.append(f"{endpoint}: possible N+1, {count}x {fingerprint}")
+    return violations
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin providing ``assertWithinQueryBudget``::
+
+        with self.assertWithinQueryBudget('top-analytics'):
+            self.client.get('/analytics/top/', {'top': 'user'})
+    """
+
+    @contextmanager
+    def assertWithinQueryBudget(self, endpoint, budget=None):
+        budget = budget or get_budget(endpoint)
+        if budget is None:
+            self.fail(f"No query budget defined for {endpoint}")
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+
+        violations = check_budget(endpoint, recorder, budget)
+        if violations:
+            queries = '\n'.join(
+                f"  {count}x {fingerprint}" for fingerprint, count in recorder.fingerprints.most_common()
+            )
+            self.fail('\n'.join(violations) + f"\nExecuted statements:\n{queries}")
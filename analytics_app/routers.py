@@ -0,0 +1,289 @@
+"""
+Read-replica routing. Reads made inside a ``replica_reads`` scope (analytics
+services and views, the monitoring dashboard, exports) go to a healthy
+replica picked by weight; every other read and all writes go to the primary.
+A client that wrote recently is pinned to the primary (read-your-writes).
+"""
+import time
+import random
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError, InterfaceError
+
+from .instrumentation import query_wrapper
+from .deadlines import is_statement_cancel, time_limit_exceeded
+from .monitoring.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READ_REPLICA_SETTINGS = {
+    'REPLICAS': {},                  # alias -> weight; empty sends everything to the primary
+    'HEALTH_CHECK_INTERVAL': 5.0,    # seconds before a replica's health is probed again
+    'READ_YOUR_WRITES_SECONDS': 5,   # keep a client on the primary after it writes (0 = off)
+    'PIN_COOKIE': 'primary_pin',
+}
+
+# Fails on a replica that is down or has no schema yet (e.g. an empty SQLite copy)
+PROBE_SQL = 'SELECT 1 FROM django_migrations LIMIT 1'
+
+
+def get_read_replica_settings():
+    return {**DEFAULT_READ_REPLICA_SETTINGS, **getattr(settings, 'READ_REPLICAS', {})}
+
+
+class ReplicaHealth:
+    """
+    Per-process replica status, refreshed by a probe at most every
+    HEALTH_CHECK_INTERVAL and set to unhealthy as soon as a query fails
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}  # alias -> (healthy, checked_at)
+
+    def is_healthy(self, alias, interval):
+        with self._lock:
+            healthy, checked_at = self._status.get(alias, (None, 0.0))
+            if healthy is not None:
+                if time.monotonic() - checked_at < interval:
+                    record_cache_lookup('replica_health', True)
+                    return healthy
+                # Other threads keep the previous answer while this one probes
+                self._status[alias] = (healthy, time.monotonic())
+        record_cache_lookup('replica_health', False)
+        return self.probe(alias)
+
+    def probe(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            # raw cursor: probes are not part of the request's queries
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute(PROBE_SQL)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            healthy = True
+        except Exception as e:
+            logger.warning("Read replica %s failed its health check: %s", alias, e)
+            connection.close_if_unusable_or_obsolete()
+            healthy = False
+        self.set(alias, healthy)
+        return healthy
+
+    def set(self, alias, healthy):
+        with self._lock:
+            previous, _ = self._status.get(alias, (None, 0.0))
+            self._status[alias] = (healthy, time.monotonic())
+        if previous is not None and previous != healthy:
+            log = logger.info if healthy else logger.warning
+            log("Read replica %s is now %s", alias, 'healthy' if healthy else 'unhealthy')
+
+    def mark_unhealthy(self, alias):
+        self.set(alias, False)
+
+    def status(self):
+        with self._lock:
+            return {alias: healthy for alias, (healthy, _) in self._status.items()}
+
+    def reset(self):
+        with self._lock:
+            self._status.clear()
+
+
+_health = ReplicaHealth()
+
+
+def get_replica_health():
+    return _health
+
+
+class ReadScope:
+    __slots__ = ('use_replica', 'used', 'failed')
+
+    def __init__(self, use_replica=True):
+        self.use_replica = use_replica
+        self.used = set()     # replica aliases that served reads in this scope
+        self.failed = None    # replica alias a query failed on
+
+
+class ClientPin:
+    """
+    Read-your-writes state of one request: ``pinned`` if the client wrote
+    within READ_YOUR_WRITES_SECONDS, ``wrote`` once it writes in this request
+    """
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_read_scope = contextvars.ContextVar('analytics_read_scope', default=None)
+_client_pin = contextvars.ContextVar('analytics_client_pin', default=None)
+
+
+def start_client_pin(pinned):
+    """
+    Begin tracking a request's writes; returns (pin, token for end_client_pin)
+    """
+    pin = ClientPin(pinned)
+    return pin, _client_pin.set(pin)
+
+
+def end_client_pin(token):
+    _client_pin.reset(token)
+
+
+def choose_replica():
+    """
+    Weighted pick among healthy replicas, or None for the primary
+    """
+    config = get_read_replica_settings()
+    candidates = [
+        (alias, weight) for alias, weight in config['REPLICAS'].items()
+        if weight > 0 and _health.is_healthy(alias, config['HEALTH_CHECK_INTERVAL'])
+    ]
+    if not candidates:
+        return None
+    aliases, weights = zip(*candidates)
+    return random.choices(aliases, weights=weights)[0]
+
+
+def _is_connection_error(exc):
+    """
+    Whether a database connection error caused ``exc`` (services re-raise
+    their own exception types)
+    """
+    if time_limit_exceeded(exc):
+        return False
+    while exc is not None:
+        if isinstance(exc, (OperationalError, InterfaceError)):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def _watch_replica_errors(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError) as e:
+        alias = context['connection'].alias
+        if alias in get_read_replica_settings()['REPLICAS'] and not is_statement_cancel(e):
+            _health.mark_unhealthy(alias)
+            scope = _read_scope.get()
+            if scope is not None:
+                scope.failed = alias
+        raise
+
+
+@contextmanager
+def replica_reads(use_replica=True):
+    """
+    Route reads in this block (and threads the context is copied to) to a
+    replica; ``use_replica=False`` forces the primary inside an outer scope
+    """
+    scope = ReadScope(use_replica)
+    token = _read_scope.set(scope)
+    try:
+        with query_wrapper(_watch_replica_errors):
+            yield scope
+    finally:
+        _read_scope.reset(token)
+
+
+def replica_failed(exc, scope=None):
+    """
+    Whether ``exc`` comes from a replica of the current read scope. Views
+    that turn errors into responses re-raise these so ``reads_from_replica``
+    can retry on the primary.
+    """
+    scope = scope or _read_scope.get()
+    if scope is None:
+        return False
+    if scope.failed is None and scope.used and _is_connection_error(exc):
+        # Connecting happens outside the execute wrappers
+        for alias in scope.used:
+            _health.mark_unhealthy(alias)
+        scope.failed = ', '.join(sorted(scope.used))
+    return scope.failed is not None
+
+
+def reads_from_replica(func):
+    """
+    Decorator form of ``replica_reads``. If a query failed on the replica,
+    the call is repeated once on the primary.
+    """
+    def failed_over(scope, exc):
+        if not replica_failed(exc, scope):
+            return False
+        logger.warning("Read replica %s failed in %s, retrying on the primary", scope.failed, func.__qualname__)
+        return True
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with replica_reads() as scope:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if not failed_over(scope, e):
+                        raise
+            with replica_reads(use_replica=False):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads() as scope:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not failed_over(scope, e):
+                    raise
+        with replica_reads(use_replica=False):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """
+    DATABASE_ROUTERS entry. Replicas are copies of the primary, so they take
+    no migrations and objects may relate across them.
+    """
+
+    def db_for_read(self, model, **hints):
+        scope = _read_scope.get()
+        if scope is None or not scope.use_replica:
+            return None
+        pin = _client_pin.get()
+        if pin is not None and (pin.pinned or pin.wrote):
+            return None
+        alias = choose_replica()
+        if alias is not None:
+            scope.used.add(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        pin = _client_pin.get()
+        if pin is not None:
+            pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_read_replica_settings()['REPLICAS']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_read_replica_settings()['REPLICAS']:
+            return False
+        return None
@@ -8,11 +8,18 @@ import logging
 import urllib.parse
 
 from .models import BlogView, Blog, User
+from .dedup import get_deduplicator
+from .parallel import run_parallel, run_parallel_async
+from .tracing import traced
+from .routers import reads_from_replica
+from .deadlines import unless_timed_out
+from .renderers import COLUMNS
 from .exceptions import (
     InvalidFilterException, 
     TimeRangeException, 
     DataNotFoundException,
-    DatabaseQueryException
+    DatabaseQueryException,
+    QueryTimeoutException,
 )
 
 logger = logging.getLogger(__name__)
@@ -21,13 +28,15 @@ logger = logging.getLogger(__name__)
 class AnalyticsService:
     
     @staticmethod
+    @traced()
+    @reads_from_replica
     def get_blog_views_analytics(object_type, date_range, filters=None):
         """
         API #1: Group blogs and views by selected object_type
         Returns: x=grouping_key, y=number_of_blogs, z=total_views
         """
         try:
-            logger.info(f"get_blog_views_analytics called: object_type={object_type}, range={date_range}")
+            logger.debug("get_blog_views_analytics called: object_type=%s, range=%s", object_type, date_range)
             
             # Validate object_type
             if object_type not in ['country', 'user']:
@@ -35,54 +44,16 @@ class AnalyticsService:
                     f"Invalid object_type: {object_type}. Must be 'country' or 'user'"
                 )
             
-            queryset = BlogView.objects.select_related(
-                'blog', 'user', 'country', 'blog__author'
-            )
-            
-            # Apply date range
-            queryset = AnalyticsService._apply_date_range(queryset, date_range)
-            
-            # Apply dynamic filters
-            if filters:
-                queryset = AnalyticsService._apply_filters(queryset, filters)
-            
-            # Group by object_type
-            if object_type == 'country':
-                # Filter out null countries first
-                queryset = queryset.filter(country__isnull=False)
-                result = queryset.values(
-                    x=F('country__name')
-                ).annotate(
-                    y=Count('blog', distinct=True),
-                    z=Count('id')
-                ).order_by('-z')
-            
-            elif object_type == 'user':
-                # Filter out null users first
-                queryset = queryset.filter(user__isnull=False)
-                result = queryset.annotate(
-                    full_name=Concat(
-                        F('user__first_name'), 
-                        Value(' '), 
-                        F('user__last_name'),
-                        output_field=CharField()
-                    )
-                ).values(
-                    x=F('full_name')
-                ).annotate(
-                    y=Count('blog', distinct=True),
-                    z=Count('id')
-                ).order_by('-z')
+            result = AnalyticsService._blog_views_queryset(object_type, date_range, filters)
             
             # Check if data exists
             if not result.exists():
-                logger.info(f"No data found for object_type={object_type}, range={date_range}")
+                logger.info("No data found for object_type=%s, range=%s", object_type, date_range)
                 raise DataNotFoundException("No data found for the specified criteria")
             
-            logger.info(f"get_blog_views_analytics returning {result.count()} results")
             return result
             
-        except (InvalidFilterException, TimeRangeException, DataNotFoundException) as e:
+        except (InvalidFilterException, TimeRangeException, DataNotFoundException, QueryTimeoutException) as e:
             # Re-raise known exceptions
             raise e
         except Exception as e:
@@ -96,12 +67,15 @@ class AnalyticsService:
             raise DatabaseQueryException(f"Database query error: {str(e)}")
     
     @staticmethod
-    def get_top_analytics(top_type, date_range=None, filters=None):
+    @traced()
+    @reads_from_replica
+    def get_top_analytics(top_type, date_range=None, filters=None, columnar=False):
         """
         API #2: Returns Top 10 based on total views
+        (as (x, y, z) tuples if ``columnar``)
         """
         try:
-            logger.info(f"get_top_analytics called: top_type={top_type}, range={date_range}")
+            logger.debug("get_top_analytics called: top_type=%s, range=%s", top_type, date_range)
             
             # Validate top_type
             if top_type not in ['user', 'country', 'blog']:
@@ -109,51 +83,12 @@ class AnalyticsService:
                     f"Invalid top_type: {top_type}. Must be 'user', 'country', or 'blog'"
                 )
             
-            queryset = BlogView.objects.select_related(
-                'blog', 'user', 'country', 'blog__author'
-            )
-            
-            if date_range:
-                queryset = AnalyticsService._apply_date_range(queryset, date_range)
-            
-            if filters:
-                queryset = AnalyticsService._apply_filters(queryset, filters)
-            
-            if top_type == 'user':
-                queryset = queryset.filter(blog__author__isnull=False)
-                result = queryset.values(
-                    x=Concat(
-                        F('blog__author__first_name'),
-                        Value(' '),
-                        F('blog__author__last_name'),
-                        output_field=CharField()
-                    )
-                ).annotate(
-                    y=Count('blog', distinct=True),
-                    z=Count('id')
-                ).order_by('-z')[:10]
-            
-            elif top_type == 'country':
-                queryset = queryset.filter(country__isnull=False)
-                result = queryset.values(
-                    x=F('country__name')
-                ).annotate(
-                    y=Count('blog', distinct=True),
-                    z=Count('id')
-                ).order_by('-z')[:10]
+            result = AnalyticsService._top_queryset(top_type, date_range, filters, columnar)
             
-            elif top_type == 'blog':
-                result = queryset.values(
-                    x=F('blog__title'),
-                    y=F('blog__author__username')
-                ).annotate(
-                    z=Count('id')
-                ).order_by('-z')[:10]
-            
-            logger.info(f"get_top_analytics returning {len(result)} results")
+            logger.debug("get_top_analytics returning %s results", len(result))
             return result
             
-        except (InvalidFilterException, TimeRangeException) as e:
+        except (InvalidFilterException, TimeRangeException, QueryTimeoutException) as e:
             raise e
         except Exception as e:
             logger.error(f"Error in get_top_analytics: {str(e)}", 
@@ -166,13 +101,15 @@ class AnalyticsService:
             raise DatabaseQueryException(f"Database query error: {str(e)}")
     
     @staticmethod
+    @traced()
+    @reads_from_replica
     def get_performance_analytics(compare_type, user_id=None, filters=None):
         """
         API #3: Time-series performance for a user or all users
         Returns: x=period_label + number_of_blogs created, y=views, z=growth_percentage
         """
         try:
-            logger.info(f"get_performance_analytics called: compare={compare_type}, user_id={user_id}")
+            logger.debug("get_performance_analytics called: compare=%s, user_id=%s", compare_type, user_id)
             
             # Validate compare_type
             if compare_type not in ['day', 'week', 'month', 'year']:
@@ -180,84 +117,21 @@ class AnalyticsService:
                     f"Invalid compare_type: {compare_type}. Must be 'day', 'week', 'month', or 'year'"
                 )
             
-            # Get blogs created per period
-            blog_queryset = Blog.objects.all()
-            if user_id:
-                blog_queryset = blog_queryset.filter(author_id=user_id)
-            
-            trunc_kwarg = AnalyticsService._get_trunc_kwarg(compare_type)
-            
-            # Get blog creation counts per period
-            blogs_per_period = list(blog_queryset.annotate(
-                period=Trunc('created_at', **trunc_kwarg)
-            ).values('period').annotate(
-                blogs_created=Count('id')
-            ).order_by('period'))
-            
-            # Get views per period
-            views_queryset = BlogView.objects.select_related('blog')
-            if user_id:
-                views_queryset = views_queryset.filter(blog__author_id=user_id)
-            
-            if filters:
-                views_queryset = AnalyticsService._apply_filters(views_queryset, filters)
-            
-            views_per_period = list(views_queryset.annotate(
-                period=Trunc('viewed_at', **trunc_kwarg)
-            ).values('period').annotate(
-                total_views=Count('id')
-            ).order_by('period'))
-            
-            # Combine data and calculate growth
-            result = []
-            previous_views = 0
+            blogs_queryset, views_queryset = AnalyticsService._performance_querysets(compare_type, user_id, filters)
+            blogs_per_period, views_per_period = run_parallel(
+                lambda: list(blogs_queryset), lambda: list(views_queryset)
+            )
             
-            for period_data in views_per_period:
-                period = period_data['period']
-                views = period_data['total_views']
-                
-                # Get blogs created in this period
-                blogs_in_period = 0
-                for blog_period in blogs_per_period:
-                    if blog_period['period'] == period:
-                        blogs_in_period = blog_period['blogs_created']
-                        break
-                
-                # Calculate growth percentage
-                if previous_views > 0:
-                    growth_pct = ((views - previous_views) / previous_views) * 100
-                else:
-                    growth_pct = 0 if views == 0 else 100
-                
-                # Format period label based on compare_type
-                if compare_type == 'day':
-                    period_label = period.strftime('%Y-%m-%d')
-                elif compare_type == 'week':
-                    # Get week number and year
-                    week_num = period.strftime('%U')
-                    year = period.strftime('%Y')
-                    period_label = f"Week {week_num}, {year}"
-                elif compare_type == 'month':
-                    period_label = period.strftime('%B %Y')
-                else:  # year
-                    period_label = period.strftime('%Y')
-                
-                result.append({
-                    'x': f"{period_label} ({blogs_in_period} blogs)",
-                    'y': views,
-                    'z': round(growth_pct, 2)
-                })
-                
-                previous_views = views
+            result = AnalyticsService._combine_periods(compare_type, blogs_per_period, views_per_period)
             
             if not result:
-                logger.info(f"No performance data found for compare={compare_type}, user_id={user_id}")
+                logger.info("No performance data found for compare=%s, user_id=%s", compare_type, user_id)
                 raise DataNotFoundException("No performance data found for the specified criteria")
             
-            logger.info(f"get_performance_analytics returning {len(result)} periods")
+            logger.debug("get_performance_analytics returning %s periods", len(result))
             return result
             
-        except (InvalidFilterException, DataNotFoundException) as e:
+        except (InvalidFilterException, DataNotFoundException, QueryTimeoutException) as e:
             raise e
         except Exception as e:
             logger.error(f"Error in get_performance_analytics: {str(e)}", 
@@ -270,6 +144,264 @@ class AnalyticsService:
             raise DatabaseQueryException(f"Database query error: {str(e)}")
     
     @staticmethod
+    @traced()
+    @reads_from_replica
+    async def aget_blog_views_page(object_type, date_range, filters=None, offset=0, limit=100, columnar=False):
+        """
+        Async API #1: (total groups, rows of one page). The count and the page
+        run concurrently; an empty count replaces the separate exists() check.
+        The count is None if it timed out in degraded mode. Rows are (x, y, z)
+        tuples if ``columnar``.
+        """
+        try:
+            if object_type not in ['country', 'user']:
+                raise InvalidFilterException(
+                    f"Invalid object_type: {object_type}. Must be 'country' or 'user'"
+                )
+            result = AnalyticsService._blog_views_queryset(object_type, date_range, filters)
+            if columnar:
+                result = result.values_list(*COLUMNS)
+            count, page = await run_parallel_async(
+                unless_timed_out(result.count), lambda: list(result[offset:offset + limit])
+            )
+            if count == 0 or (count is None and not page):
+                logger.info("No data found for object_type=%s, range=%s", object_type, date_range)
+                raise DataNotFoundException("No data found for the specified criteria")
+            return count, page
+
+        except (InvalidFilterException, TimeRangeException, DataNotFoundException, QueryTimeoutException):
+            raise
+        except Exception as e:
+            logger.error("Error in aget_blog_views_page: %s", e, exc_info=True)
+            raise DatabaseQueryException(f"Database query error: {str(e)}")
+
+    @staticmethod
+    @traced()
+    @reads_from_replica
+    async def aget_top_analytics(top_type, date_range=None, filters=None, columnar=False):
+        """
+        Async API #2 with the async ORM
+        """
+        try:
+            if top_type not in ['user', 'country', 'blog']:
+                raise InvalidFilterException(
+                    f"Invalid top_type: {top_type}. Must be 'user', 'country', or 'blog'"
+                )
+            result = AnalyticsService._top_queryset(top_type, date_range, filters, columnar)
+            return [row async for row in result]
+
+        except (InvalidFilterException, TimeRangeException, QueryTimeoutException):
+            raise
+        except Exception as e:
+            logger.error("Error in aget_top_analytics: %s", e, exc_info=True)
+            raise DatabaseQueryException(f"Database query error: {str(e)}")
+
+    @staticmethod
+    @traced()
+    @reads_from_replica
+    async def aget_performance_analytics(compare_type, user_id=None, filters=None):
+        """
+        Async API #3: the blog-count and view-count queries run concurrently
+        """
+        try:
+            if compare_type not in ['day', 'week', 'month', 'year']:
+                raise InvalidFilterException(
+                    f"Invalid compare_type: {compare_type}. Must be 'day', 'week', 'month', or 'year'"
+                )
+            blogs_queryset, views_queryset = AnalyticsService._performance_querysets(compare_type, user_id, filters)
+            blogs_per_period, views_per_period = await run_parallel_async(
+                lambda: list(blogs_queryset), lambda: list(views_queryset)
+            )
+            result = AnalyticsService._combine_periods(compare_type, blogs_per_period, views_per_period)
+            if not result:
+                logger.info("No performance data found for compare=%s, user_id=%s", compare_type, user_id)
+                raise DataNotFoundException("No performance data found for the specified criteria")
+            return result
+
+        except (InvalidFilterException, DataNotFoundException, QueryTimeoutException):
+            raise
+        except Exception as e:
+            logger.error("Error in aget_performance_analytics: %s", e, exc_info=True)
+            raise DatabaseQueryException(f"Database query error: {str(e)}")
+
+    @staticmethod
+    def _blog_views_queryset(object_type, date_range, filters=None):
+        """
+        Grouped queryset for API #1 (not evaluated)
+        """
+        queryset = BlogView.objects.select_related(
+            'blog', 'user', 'country', 'blog__author'
+        )
+        
+        # Apply date range
+        queryset = AnalyticsService._apply_date_range(queryset, date_range)
+        
+        # Apply dynamic filters
+        if filters:
+            queryset = AnalyticsService._apply_filters(queryset, filters)
+        
+        # Group by object_type
+        if object_type == 'country':
+            # Filter out null countries first
+            queryset = queryset.filter(country__isnull=False)
+            result = queryset.values(
+                x=F('country__name')
+            ).annotate(
+                y=Count('blog', distinct=True),
+                z=Count('id')
+            ).order_by('-z')
+        
+        elif object_type == 'user':
+            # Filter out null users first
+            queryset = queryset.filter(user__isnull=False)
+            result = queryset.annotate(
+                full_name=Concat(
+                    F('user__first_name'), 
+                    Value(' '), 
+                    F('user__last_name'),
+                    output_field=CharField()
+                )
+            ).values(
+                x=F('full_name')
+            ).annotate(
+                y=Count('blog', distinct=True),
+                z=Count('id')
+            ).order_by('-z')
+        return result
+
+    @staticmethod
+    def _top_queryset(top_type, date_range=None, filters=None, columnar=False):
+        """
+        Top-10 queryset for API #2 (not evaluated); values_list() tuples
+        instead of dicts if ``columnar``
+        """
+        queryset = BlogView.objects.select_related(
+            'blog', 'user', 'country', 'blog__author'
+        )
+
+        if date_range:
+            queryset = AnalyticsService._apply_date_range(queryset, date_range)
+
+        if filters:
+            queryset = AnalyticsService._apply_filters(queryset, filters)
+
+        if top_type == 'user':
+            queryset = queryset.filter(blog__author__isnull=False)
+            result = queryset.values(
+                x=Concat(
+                    F('blog__author__first_name'),
+                    Value(' '),
+                    F('blog__author__last_name'),
+                    output_field=CharField()
+                )
+            ).annotate(
+                y=Count('blog', distinct=True),
+                z=Count('id')
+            ).order_by('-z')
+
+        elif top_type == 'country':
+            queryset = queryset.filter(country__isnull=False)
+            result = queryset.values(
+                x=F('country__name')
+            ).annotate(
+                y=Count('blog', distinct=True),
+                z=Count('id')
+            ).order_by('-z')
+
+        elif top_type == 'blog':
+            result = queryset.values(
+                x=F('blog__title'),
+                y=F('blog__author__username')
+            ).annotate(
+                z=Count('id')
+            ).order_by('-z')
+        if columnar:
+            result = result.values_list(*COLUMNS)
+        return result[:10]
+
+    @staticmethod
+    def _performance_querysets(compare_type, user_id=None, filters=None):
+        """
+        (blogs created per period, views per period) querysets for API #3,
+        independent of each other and not evaluated
+        """
+        trunc_kwarg = AnalyticsService._get_trunc_kwarg(compare_type)
+
+        # Blog creation counts per period
+        blog_queryset = Blog.objects.all()
+        if user_id:
+            blog_queryset = blog_queryset.filter(author_id=user_id)
+        blogs_per_period = blog_queryset.annotate(
+            period=Trunc('created_at', **trunc_kwarg)
+        ).values('period').annotate(
+            blogs_created=Count('id')
+        ).order_by('period')
+
+        # Views per period
+        views_queryset = BlogView.objects.select_related('blog')
+        if user_id:
+            views_queryset = views_queryset.filter(blog__author_id=user_id)
+        if filters:
+            views_queryset = AnalyticsService._apply_filters(views_queryset, filters)
+        views_per_period = views_queryset.annotate(
+            period=Trunc('viewed_at', **trunc_kwarg)
+        ).values('period').annotate(
+            total_views=Count('id')
+        ).order_by('period')
+
+        return blogs_per_period, views_per_period
+
+    @staticmethod
+    def _combine_periods(compare_type, blogs_per_period, views_per_period):
+        """
+        Join per-period blog and view counts into API #3 rows with growth
+        """
+        # Combine data and calculate growth
+        result = []
+        previous_views = 0
+
+        for period_data in views_per_period:
+            period = period_data['period']
+            views = period_data['total_views']
+
+            # Get blogs created in this period
+            blogs_in_period = 0
+            for blog_period in blogs_per_period:
+                if blog_period['period'] == period:
+                    blogs_in_period = blog_period['blogs_created']
+                    break
+
+            # Calculate growth percentage
+            if previous_views > 0:
+                growth_pct = ((views - previous_views) / previous_views) * 100
+            else:
+                growth_pct = 0 if views == 0 else 100
+
+            # Format period label based on compare_type
+            if compare_type == 'day':
+                period_label = period.strftime('%Y-%m-%d')
+            elif compare_type == 'week':
+                # Get week number and year
+                week_num = period.strftime('%U')
+                year = period.strftime('%Y')
+                period_label = f"Week {week_num}, {year}"
+            elif compare_type == 'month':
+                period_label = period.strftime('%B %Y')
+            else:  # year
+                period_label = period.strftime('%Y')
+
+            result.append({
+                'x': f"{period_label} ({blogs_in_period} blogs)",
+                'y': views,
+                'z': round(growth_pct, 2)
+            })
+
+            previous_views = views
+
+        return result
+
+    @staticmethod
+    @traced('date_range')
     def _apply_date_range(queryset, date_range):
         today = timezone.now()
         if date_range == 'week':
@@ -284,24 +416,25 @@ class AnalyticsService:
         return queryset.filter(viewed_at__gte=start_date)
     
     @staticmethod
+    @traced('filters.parse')
     def _apply_filters(queryset, filters):
         try:
             if not filters:
                 return queryset
             
-            logger.info(f"Raw filters string: {filters}")
+            logger.debug("Raw filters string: %s", filters)
             
             # Try to decode URL-encoded JSON
             try:
                 # Check if it's URL-encoded
                 if '%' in filters or '=' in filters:
                     decoded = urllib.parse.unquote(filters)
-                    logger.info(f"Decoded filters: {decoded}")
+                    logger.debug("Decoded filters: %s", decoded)
                     filters_data = json.loads(decoded)
                 else:
                     filters_data = json.loads(filters)
             except json.JSONDecodeError as e:
-                logger.warning(f"Invalid JSON in filters: {filters}, error: {str(e)}")
+                logger.warning("Invalid JSON in filters: %s, error: %s", filters, e)
                 raise InvalidFilterException(f"Invalid JSON format in filters: {str(e)}")
             
             q_objects = Q()
@@ -309,21 +442,21 @@ class AnalyticsService:
             operator = filters_data.get('operator', 'and')
             conditions = filters_data.get('conditions', [])
             
-            logger.info(f"Parsed filter - Operator: {operator}, Conditions: {conditions}")
+            logger.debug("Parsed filter - Operator: %s, Conditions: %s", operator, conditions)
             
             for condition in conditions:
                 field = condition.get('field')
                 op = condition.get('operator')
                 value = condition.get('value')
                 
-                logger.info(f"Processing condition - Field: {field}, Operator: {op}, Value: {value}")
+                logger.debug("Processing condition - Field: %s, Operator: %s, Value: %s", field, op, value)
                 
                 if not all([field, op, value]):
-                    logger.warning(f"Incomplete condition: {condition}")
+                    logger.warning("Incomplete condition: %s", condition)
                     continue
                 
                 lookup = AnalyticsService._get_lookup(field, op)
-                logger.info(f"Lookup expression: {lookup}")
+                logger.debug("Lookup expression: %s", lookup)
                 
                 # Create Q object
                 q_obj = Q(**{lookup: value})
@@ -335,14 +468,14 @@ class AnalyticsService:
                 elif operator == 'not':
                     q_objects &= ~q_obj
             
-            logger.info(f"Final Q objects: {q_objects}")
+            logger.debug("Final Q objects: %s", q_objects)
             return queryset.filter(q_objects)
             
         except json.JSONDecodeError as e:
-            logger.warning(f"Invalid JSON in filters: {filters}")
+            logger.warning("Invalid JSON in filters: %s", filters)
             raise InvalidFilterException(f"Invalid JSON format in filters: {str(e)}")
         except KeyError as e:
-            logger.warning(f"Missing key in filters: {filters}")
+            logger.warning("Missing key in filters: %s", filters)
             raise InvalidFilterException(f"Missing key in filters: {str(e)}")
         except Exception as e:
             logger.error(f"Error applying filters: {str(e)}", exc_info=True)
@@ -373,4 +506,27 @@ class AnalyticsService:
             'month': 'month',
             'year': 'year',
         }
-        return {'kind': trunc_map.get(compare_type, 'month')}
\ No newline at end of file
+        return {'kind': trunc_map.get(compare_type, 'month')}
+
+
+class ViewIngestionService:
+
+    @staticmethod
+    def record_view(blog, user=None, country=None, client_id=None, viewed_at=None, duration=1):
+        """
+        Ingest a single blog view.
+        Returns the created BlogView, or None if it was dropped as a repeat of the
+        same (user or client, blog) pair inside the dedupe window.
+        """
+        user_id = user.pk if user is not None else None
+        if get_deduplicator().is_duplicate(blog.pk, user_id=user_id, client_id=client_id):
+            logger.debug("Dropped duplicate view: blog=%s user=%s client=%s", blog.pk, user_id, client_id)
+            return None
+
+        return BlogView.objects.create(
+            blog=blog,
+            user=user,
+            country=country,
+            viewed_at=viewed_at or timezone.now(),
+            duration=duration
+        )
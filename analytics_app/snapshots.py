@@ -0,0 +1,332 @@
+"""
+Columnar binary snapshots of the analytics tables.
+
+Each table is written as one compressed ``.npz`` file holding a NumPy array
+per column, next to a ``manifest.json`` with row counts and a content hash.
+The hash covers column names, dtypes and raw array bytes (not the compressed
+files), so the same data always hashes the same way.
+
+Text columns are stored as a UTF-8 byte buffer plus an int64 offsets array
+(``<name>__data`` / ``<name>__offsets``), so one long value costs its own
+length rather than widening every row of a fixed-width array.
+
+Staff and superuser accounts are never deleted or overwritten by a restore.
+"""
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .datasets import BENCH_USER_PREFIX, micros_to_db_strings
+from .models import Country, Blog, BlogView
+
+SNAPSHOT_FORMAT_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+NULL_ID = -1
+STR_DATA = '__data'
+STR_OFFSETS = '__offsets'
+
+# Column kinds: 'int' (nullable ints use NULL_ID), 'bool', 'str', 'datetime'
+# (stored as int64 microseconds since the epoch, UTC). Order matters: parents
+# are restored before children.
+TABLES = [
+    ('country', Country, [
+        ('id', 'int'), ('name', 'str'), ('code', 'str'),
+    ]),
+    ('user', User, [
+        ('id', 'int'), ('username', 'str'), ('first_name', 'str'),
+        ('last_name', 'str'), ('email', 'str'), ('is_staff', 'bool'),
+        ('is_superuser', 'bool'), ('is_active', 'bool'), ('date_joined', 'datetime'),
+    ]),
+    ('blog', Blog, [
+        ('id', 'int'), ('title', 'str'), ('content', 'str'), ('author_id', 'int'),
+        ('country_id', 'int'), ('created_at', 'datetime'), ('updated_at', 'datetime'),
+    ]),
+    ('blogview', BlogView, [
+        ('id', 'int'), ('blog_id', 'int'), ('user_id', 'int'),
+        ('country_id', 'int'), ('viewed_at', 'datetime'), ('duration', 'int'),
+    ]),
+]
+
+FETCH_SIZE = 100000
+INSERT_BATCH_SIZE = 50000
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _select_expression(column, kind):
+    name = connection.ops.quote_name(column)
+    if kind != 'datetime':
+        return name
+    if connection.vendor == 'sqlite':
+        # Concatenation drops the declared type, so the raw text is returned
+        # instead of going through the per-row datetime converter.
+        return f"{name} || ''"
+    if connection.vendor == 'postgresql':
+        return f"(EXTRACT(EPOCH FROM {name}) * 1000000)::bigint"
+    raise SnapshotError(f"Snapshots are not supported on the {connection.vendor} backend")
+
+
+def _column_keys(name, kind):
+    """
+    Array names a column is stored under
+    """
+    if kind == 'str':
+        return [f"{name}{STR_DATA}", f"{name}{STR_OFFSETS}"]
+    return [name]
+
+
+def _to_array(values, kind):
+    """
+    One fetched chunk of a column; a (bytes, lengths) pair for 'str'
+    """
+    if kind == 'int':
+        return np.array([NULL_ID if v is None else v for v in values], dtype=np.int64)
+    if kind == 'bool':
+        return np.array(values, dtype=np.bool_)
+    if kind == 'str':
+        encoded = [b'' if v is None else v.encode('utf-8') for v in values]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), lengths
+    if connection.vendor == 'sqlite':
+        return np.array(values, dtype='datetime64[us]').astype(np.int64)
+    return np.array(values, dtype=np.int64)
+
+
+def _concat_column(name, kind, chunks):
+    """
+    Stored arrays of a column from its fetched chunks
+    """
+    if kind != 'str':
+        dtype = np.bool_ if kind == 'bool' else np.int64
+        return {name: np.concatenate(chunks) if chunks else np.array([], dtype=dtype)}
+    data_key, offsets_key = _column_keys(name, kind)
+    lengths = np.concatenate([lengths for _, lengths in chunks]) if chunks else np.array([], dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    data = np.concatenate([data for data, _ in chunks]) if chunks else np.array([], dtype=np.uint8)
+    return {data_key: data, offsets_key: offsets}
+
+
+def _from_array(arrays, name, kind, start, stop):
+    """
+    Database values for rows [start, stop) of a stored column
+    """
+    if kind == 'str':
+        data_key, offsets_key = _column_keys(name, kind)
+        offsets = arrays[offsets_key][start:stop + 1].tolist()
+        buffer = arrays[data_key][offsets[0]:offsets[-1]].tobytes()
+        base = offsets[0]
+        return [buffer[a - base:b - base].decode('utf-8') for a, b in zip(offsets, offsets[1:])]
+    array = arrays[name][start:stop]
+    if kind == 'int':
+        values = array.astype(object)
+        values[array == NULL_ID] = None
+        return values.tolist()
+    if kind == 'datetime':
+        return micros_to_db_strings(array, connection.vendor).tolist()
+    return array.tolist()
+
+
+def row_count(arrays):
+    return len(arrays['id'])
+
+
+def read_table(model, columns):
+    """
+    Read a table into one NumPy array per column, ordered by primary key
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    select = ', '.join(_select_expression(name, kind) for name, kind in columns)
+    chunks = {name: [] for name, _ in columns}
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {select} FROM {table} ORDER BY {connection.ops.quote_name('id')}")
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for (name, kind), values in zip(columns, zip(*rows)):
+                chunks[name].append(_to_array(values, kind))
+
+    arrays = {}
+    for name, kind in columns:
+        arrays.update(_concat_column(name, kind, chunks[name]))
+    return arrays
+
+
+def hash_arrays(table_name, columns, arrays):
+    digest = hashlib.sha256(table_name.encode('utf-8'))
+    for name, kind in columns:
+        for key in _column_keys(name, kind):
+            array = np.ascontiguousarray(arrays[key])
+            digest.update(f"{key}:{array.dtype.str}:{array.shape}".encode('utf-8'))
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def dump_snapshot(path, progress=None):
+    """
+    Write every table to ``path`` and return the manifest
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'tables': {},
+    }
+    overall = hashlib.sha256()
+
+    for table_name, model, columns in TABLES:
+        started = time.perf_counter()
+        arrays = read_table(model, columns)
+        table_hash = hash_arrays(table_name, columns, arrays)
+        np.savez_compressed(os.path.join(path, f"{table_name}.npz"), **arrays)
+
+        rows = row_count(arrays)
+        manifest['tables'][table_name] = {'rows': rows, 'sha256': table_hash}
+        overall.update(table_hash.encode('ascii'))
+        if progress:
+            progress(f"  {table_name}: {rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+    manifest['content_hash'] = overall.hexdigest()
+    with open(os.path.join(path, MANIFEST_NAME), 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def load_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot read snapshot manifest in {path}: {e}")
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format: {manifest.get('format_version')}")
+    return manifest
+
+
+def _insert_table(model, columns, arrays, extra_columns=None):
+    extra_columns = extra_columns or {}
+    names = [name for name, _ in columns] + list(extra_columns)
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        table,
+        ', '.join(connection.ops.quote_name(name) for name in names),
+        ', '.join(['%s'] * len(names)),
+    )
+
+    total = row_count(arrays)
+    with connection.cursor() as cursor:
+        for start in range(0, total, INSERT_BATCH_SIZE):
+            stop = min(start + INSERT_BATCH_SIZE, total)
+            column_values = [_from_array(arrays, name, kind, start, stop) for name, kind in columns]
+            column_values += [[value] * (stop - start) for value in extra_columns.values()]
+            cursor.executemany(sql, list(zip(*column_values)))
+
+
+def _select_rows(columns, arrays, mask):
+    """
+    Stored arrays restricted to the rows where ``mask`` is True
+    """
+    selected = {}
+    for name, kind in columns:
+        if kind != 'str':
+            selected[name] = arrays[name][mask]
+            continue
+        data_key, offsets_key = _column_keys(name, kind)
+        offsets, data = arrays[offsets_key], arrays[data_key]
+        starts, stops = offsets[:-1][mask], offsets[1:][mask]
+        selected[data_key] = (np.concatenate([data[a:b] for a, b in zip(starts, stops)])
+                              if len(starts) else np.array([], dtype=np.uint8))
+        selected[offsets_key] = np.concatenate([[0], np.cumsum(stops - starts)]).astype(np.int64)
+    return selected
+
+
+def _plan_user_restore(arrays):
+    """
+    (ids of users the restore replaces, mask of snapshot users to insert).
+    Replaced are generator accounts and accounts the snapshot contains (by id
+    or username); staff and superusers are kept as they are, and snapshot
+    rows for them are skipped.
+    """
+    snapshot_ids = arrays['id'].tolist()
+    snapshot_names = _from_array(arrays, 'username', 'str', 0, len(snapshot_ids))
+    snapshot_by_id = dict(zip(snapshot_ids, snapshot_names))
+    names = set(snapshot_names)
+
+    replaced, kept = [], set()
+    accounts = User.objects.values_list('id', 'username', 'is_staff', 'is_superuser')
+    for user_id, username, is_staff, is_superuser in accounts.iterator():
+        in_snapshot = user_id in snapshot_by_id or username in names
+        if is_staff or is_superuser:
+            if in_snapshot and snapshot_by_id.get(user_id) != username:
+                raise SnapshotError(
+                    f"Staff account {username!r} (id {user_id}) conflicts with a snapshot user; "
+                    f"rename or remove it before restoring"
+                )
+            if in_snapshot:
+                kept.add(user_id)
+        elif in_snapshot or username.startswith(BENCH_USER_PREFIX):
+            replaced.append(user_id)
+    return replaced, ~np.isin(arrays['id'], list(kept))
+
+
+def restore_snapshot(path, replace=False, verify=True, progress=None):
+    """
+    Load a snapshot written by ``dump_snapshot``. With ``replace``, existing
+    countries, blogs and views are deleted first, and so are the users the
+    snapshot replaces (generator accounts and users it contains). Staff and
+    superuser accounts are left alone.
+    """
+    manifest = load_manifest(path)
+
+    loaded = []
+    for table_name, model, columns in TABLES:
+        keys = [key for name, kind in columns for key in _column_keys(name, kind)]
+        with np.load(os.path.join(path, f"{table_name}.npz")) as npz:
+            arrays = {key: npz[key] for key in keys}
+        if verify and hash_arrays(table_name, columns, arrays) != manifest['tables'][table_name]['sha256']:
+            raise SnapshotError(f"Content hash mismatch for table {table_name}")
+        loaded.append((table_name, model, columns, arrays))
+
+    with transaction.atomic():
+        user_arrays = next(arrays for _, model, _, arrays in loaded if model is User)
+        replaced_users, insert_users = _plan_user_restore(user_arrays)
+        if replaced_users or any(model.objects.exists() for _, model, _ in TABLES if model is not User):
+            if not replace:
+                raise SnapshotError("Target tables are not empty; use --replace to overwrite them")
+            with connection.cursor() as cursor:
+                # Children first; raw deletes avoid loading millions of rows for cascades
+                for _, model, _ in reversed(TABLES):
+                    if model is not User:
+                        cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+            for start in range(0, len(replaced_users), 500):
+                User.objects.filter(id__in=replaced_users[start:start + 500]).delete()
+
+        for table_name, model, columns, arrays in loaded:
+            started = time.perf_counter()
+            extra = None
+            if model is User:
+                arrays = _select_rows(columns, arrays, insert_users)
+                # Passwords are not snapshotted; restored users get an unusable one
+                extra = {'password': '!'}
+            _insert_table(model, columns, arrays, extra)
+            if progress:
+                progress(f"  {table_name}: {row_count(arrays):,} rows in {time.perf_counter() - started:.1f}s")
+
+        # Move sequences past the restored explicit ids
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [model for _, model, _ in TABLES])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    return manifest
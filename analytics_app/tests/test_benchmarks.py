@@ -0,0 +1,116 @@
+from django.test import SimpleTestCase, TransactionTestCase
+from django.db import connection
+from django.contrib.auth.models import User
+from analytics_app.models import Country, Blog
+from analytics_app.benchmarks import (
+    summarize_latencies, compare_to_baseline, query_shape, fit_scaling, SQLiteContentionBenchmark,
+)
+from analytics_app.microbenchmarks import measure, run_microbenchmarks, MICROBENCHMARKS
+from analytics_app.sqlite_pragmas import get_sqlite_pragmas
+from pathlib import Path
+import json
+import sqlite3
+import tempfile
+
+
+class BenchmarkHarnessTests(SimpleTestCase):
+
+    def test_summarize_latencies(self):
+        """Test percentile summary of latency samples"""
+        summary = summarize_latencies([float(i) for i in range(1, 101)])
+        self.assertAlmostEqual(summary['p50_ms'], 50.5)
+        self.assertAlmostEqual(summary['p99_ms'], 99.01)
+        self.assertEqual(summary['max_ms'], 100.0)
+
+    def test_compare_to_baseline(self):
+        """Test latency and query-count regressions are reported"""
+        baseline = {'current': {
+            'fast': {'p95_ms': 10.0, 'queries': 2},
+            'slow': {'p95_ms': 10.0, 'queries': 2},
+        }}
+        results = {'current': {
+            'fast': {'p95_ms': 11.0, 'queries': 2},
+            'slow': {'p95_ms': 15.0, 'queries': 3},
+            'new': {'p95_ms': 50.0, 'queries': 9},
+        }}
+
+        regressions = compare_to_baseline(results, baseline, threshold=0.2)
+
+        self.assertEqual(
+            sorted((r['case'], r['metric']) for r in regressions),
+            [('slow', 'p95_ms'), ('slow', 'queries')]
+        )
+
+    def test_query_shape(self):
+        """Test request parameters normalize to a query shape without values"""
+        filters = json.dumps({'operator': 'and', 'conditions': [
+            {'field': 'country__name', 'operator': 'eq', 'value': 'Kenya'},
+        ]})
+        shape = query_shape('/analytics/blog-views/', {
+            'object_type': ['user'], 'limit': ['10'], 'filters': [filters],
+        })
+        self.assertEqual(
+            shape,
+            '/analytics/blog-views/?filters=and[country__name:eq]&limit=*&object_type=user'
+        )
+
+    def test_measure_reports_time_and_allocations(self):
+        """Test microbenchmark stats for a callable that allocates"""
+        stats = measure(lambda: [0] * 1000, number=10, repeat=2)
+        self.assertGreater(stats['ns_per_op'], 0)
+        self.assertGreaterEqual(stats['bytes_per_op'], 8000)
+        self.assertEqual(stats['number'], 10)
+
+    def test_all_microbenchmarks_run(self):
+        """Test every registered microbenchmark executes"""
+        results = run_microbenchmarks(number=1, repeat=1)
+        self.assertEqual(set(results), set(MICROBENCHMARKS))
+
+    def test_fit_scaling_picks_driver(self):
+        """Test the scaling fit attributes latency to views in range, not total views"""
+        points = []
+        for total in (10_000, 100_000, 1_000_000):
+            for share in (0.02, 0.1, 1.0):
+                range_views = int(total * share)
+                points.append({
+                    'total_views': total, 'range_views': range_views, 'groups': 40,
+                    'p50_ms': 0.001 * range_views,
+                })
+
+        fit = fit_scaling(points)
+
+        self.assertEqual(fit['driver'], 'range_views')
+        self.assertEqual(fit['complexity'], 'O(n)')
+        self.assertAlmostEqual(fit['exponent'], 1.0, places=2)
+        self.assertIsNone(fit['fits']['groups'])
+
+
+class SQLiteProfileTests(TransactionTestCase):
+
+    def test_pragmas_applied_at_connect(self):
+        """Test new connections get the SQLITE_PRAGMAS profile"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], get_sqlite_pragmas()['cache_size'])
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], get_sqlite_pragmas()['busy_timeout'])
+
+    def test_contention_benchmark(self):
+        """Test the read/write benchmark runs against a WAL copy of the database"""
+        country = Country.objects.create(name="Country 1", code="C1")
+        Blog.objects.create(title="Blog", content="Content", author=User.objects.create_user(username="a"),
+                            country=country)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'copy.sqlite3'
+            target = sqlite3.connect(path)
+            connection.ensure_connection()
+            connection.connection.backup(target)
+            target.close()
+
+            report = SQLiteContentionBenchmark(path, get_sqlite_pragmas(), readers=1, writers=1,
+                                               duration=0.3, batch_size=5, seed=1).run()
+
+        self.assertEqual(report['journal_mode'], 'wal')
+        self.assertGreater(report['read']['operations'], 0)
+        self.assertGreater(report['write']['rows_per_s'], 0)
+        self.assertEqual(report['read']['errors'] + report['write']['errors'], 0)
@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.core.management import call_command, CommandError
+from django.contrib.auth.models import User
+from django.db.models import Count
+from analytics_app.models import Country, Blog, BlogView
+from analytics_app.datasets import ViewDistribution, MAX_COUNTRIES, synthetic_country_code
+from io import StringIO
+import numpy as np
+
+
+def generate(**options):
+    options = {'views': 4000, 'users': 30, 'blogs': 60, 'countries': 8, 'days': 30,
+               'batch_size': 1500, 'workers': 1, 'seed': 7, **options}
+    call_command('generate_dataset', stdout=StringIO(), **options)
+
+
+def view_rows():
+    """Views in a form that does not depend on primary keys or the current time"""
+    return sorted(BlogView.objects.values_list(
+        'blog__title', 'user__username', 'country__code', 'duration'
+    ), key=repr)
+
+
+class ViewDistributionTests(TestCase):
+
+    def test_chunks_are_deterministic(self):
+        """Test a chunk depends only on the seed and its index"""
+        make = lambda seed: ViewDistribution(range(1, 51), range(1, 11), range(1, 6),
+                                             end_ts=1_700_000_000, days=30, seed=seed)
+        first = make(1).generate_chunk(3, 500)
+        again = make(1).generate_chunk(3, 500)
+        other = make(2).generate_chunk(3, 500)
+        for key in first:
+            np.testing.assert_array_equal(first[key], again[key])
+        self.assertFalse(np.array_equal(first['blog_id'], other['blog_id']))
+        self.assertLessEqual(first['viewed_at'].max(), 1_700_000_000)
+        self.assertGreaterEqual(first['viewed_at'].min(), 1_700_000_000 - 31 * 86400)
+
+
+    def test_no_views_piled_up_before_end(self):
+        """Test the last day only gets views from the hours before end_ts"""
+        noon = 19675 * 86400 + 12 * 3600
+        distribution = ViewDistribution(range(1, 11), range(1, 11), range(1, 4), end_ts=noon, days=1, seed=3)
+        viewed_at = distribution.generate_chunk(0, 20000)['viewed_at']
+        self.assertLessEqual(viewed_at.max(), noon)
+        self.assertLess((viewed_at > noon - 60).mean(), 0.01)
+        self.assertGreater((viewed_at > noon - 3600).mean(), 0.05)
+
+
+class GenerateDatasetTests(TestCase):
+
+    def test_seeded_run(self):
+        """Test row counts, anonymous share and blog popularity skew of a small run"""
+        generate()
+        self.assertEqual(Country.objects.count(), 8)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Blog.objects.count(), 60)
+        self.assertEqual(BlogView.objects.count(), 4000)
+
+        anonymous = BlogView.objects.filter(user__isnull=True).count() / 4000
+        self.assertAlmostEqual(anonymous, 0.2, delta=0.04)
+
+        # Zipf(1.1) over 60 blogs: the top 10% get about half the views (uniform: 10%)
+        per_blog = sorted(
+            Blog.objects.annotate(view_count=Count('views')).values_list('view_count', flat=True), reverse=True
+        )
+        self.assertGreater(sum(per_blog[:6]) / 4000, 0.4)
+
+    def test_country_codes_fit_the_column(self):
+        """Test synthetic country codes stay within Country.code's 3 characters"""
+        generate(views=0, countries=120)
+        codes = set(Country.objects.values_list('code', flat=True))
+        self.assertEqual(len(codes), 120)
+        self.assertLessEqual(max(map(len, codes)), 3)
+        self.assertEqual(synthetic_country_code(MAX_COUNTRIES - 1), 'XZZ')
+        with self.assertRaises(CommandError):
+            generate(views=0, countries=MAX_COUNTRIES + 1)
+
+    def test_same_seed_same_data(self):
+        """Test regenerating with the same seed reproduces the views"""
+        generate()
+        first = view_rows()
+        generate(clear=True)
+        self.assertEqual(view_rows(), first)
+        generate(clear=True, seed=8)
+        self.assertNotEqual(view_rows(), first)
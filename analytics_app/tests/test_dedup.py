@@ -0,0 +1,133 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from analytics_app.models import Country, Blog, BlogView
+from analytics_app.dedup import RollingBloomFilter, ViewDeduplicator
+from analytics_app.services import ViewIngestionService
+from analytics_app.monitoring import metrics
+from unittest import mock
+import os
+import tempfile
+import threading
+import time
+
+
+class RollingBloomFilterTests(TestCase):
+
+    def test_duplicate_within_window(self):
+        """Test a key is reported as seen until its bucket leaves the window"""
+        rolling = RollingBloomFilter(window_seconds=60, num_buckets=6,
+                                     capacity_per_bucket=1000, error_rate=0.001)
+
+        self.assertFalse(rolling.check_and_add(b'key', now=1000)[0])
+        self.assertTrue(rolling.check_and_add(b'key', now=1030)[0])
+        # 60s window + one bucket of slack later the key has expired
+        self.assertFalse(rolling.check_and_add(b'key', now=1200)[0])
+
+    def test_state_survives_restart(self):
+        """Test saved state is restored by a new filter instance"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dedup.bloom')
+            rolling = RollingBloomFilter(3600, 6, 1000, 0.001)
+            rolling.check_and_add(b'key')
+            rolling.save(path)
+
+            restored = RollingBloomFilter.load(path, 3600, 6, 1000, 0.001)
+            self.assertTrue(restored.check_and_add(b'key')[0])
+
+            # A different window layout must not reuse the old bits
+            resized = RollingBloomFilter.load(path, 600, 6, 1000, 0.001)
+            self.assertFalse(resized.check_and_add(b'key')[0])
+
+
+class ViewDeduplicatorTests(TestCase):
+
+    def test_rotation_writes_state_off_the_request_thread(self):
+        """Test a slow state write on bucket rotation does not block other checks"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dedup.bloom')
+            dedup = ViewDeduplicator({'ENABLED': True, 'STATE_FILE': path, 'WINDOW_SECONDS': 60})
+            writing, release = threading.Event(), threading.Event()
+
+            def slow_write(*args):
+                writing.set()
+                release.wait(5)
+
+            with mock.patch('analytics_app.dedup.write_state', side_effect=slow_write):
+                now = time.time()
+                dedup.is_duplicate(1, user_id=1, now=now)   # opens a bucket
+                self.assertTrue(writing.wait(5))
+                # the writer holds no lock the check needs
+                self.assertTrue(dedup.is_duplicate(1, user_id=1, now=now))
+                release.set()
+                dedup._writer.join(5)
+            self.assertFalse(dedup._writer.is_alive())
+
+            dedup.save()
+            restored = ViewDeduplicator({'ENABLED': True, 'STATE_FILE': path, 'WINDOW_SECONDS': 60})
+            self.assertEqual(set(restored.filter.buckets), set(dedup.filter.buckets))
+
+
+class ViewIngestionTests(TestCase):
+
+    def setUp(self):
+        self.country = Country.objects.create(name="Test Country", code="TC")
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.blog = Blog.objects.create(
+            title="Test Blog",
+            content="Test content",
+            author=self.user,
+            country=self.country
+        )
+
+    def test_record_view_drops_repeats(self):
+        """Test repeated views of the same blog by the same viewer are dropped"""
+        dedup = ViewDeduplicator({'ENABLED': True})
+        with mock.patch('analytics_app.services.get_deduplicator', return_value=dedup):
+            first = ViewIngestionService.record_view(self.blog, user=self.user, country=self.country)
+            repeat = ViewIngestionService.record_view(self.blog, user=self.user, country=self.country)
+            anonymous = ViewIngestionService.record_view(self.blog, client_id='10.0.0.1')
+
+        self.assertIsNotNone(first)
+        self.assertIsNone(repeat)
+        self.assertIsNotNone(anonymous)
+        self.assertEqual(BlogView.objects.count(), 2)
+
+        stats = dedup.stats()
+        self.assertEqual(stats['checked'], 3)
+        self.assertEqual(stats['dropped'], 1)
+
+    def test_counts_are_exported(self):
+        """Test checked and dropped views and the false-positive estimate reach /metrics"""
+        dedup = ViewDeduplicator({'ENABLED': True, 'CAPACITY_PER_BUCKET': 10})
+        checked = metrics.VIEW_DEDUP_CHECKED.snapshot().get((), 0)
+        dropped = metrics.VIEW_DEDUP_DROPPED.snapshot().get((), 0)
+        for _ in range(2):
+            dedup.is_duplicate(self.blog.pk, user_id=self.user.pk)
+
+        self.assertEqual(metrics.VIEW_DEDUP_CHECKED.snapshot()[()] - checked, 2)
+        self.assertEqual(metrics.VIEW_DEDUP_DROPPED.snapshot()[()] - dropped, 1)
+        self.assertGreater(metrics.VIEW_DEDUP_FALSE_POSITIVE_RATE.snapshot()[()], 0)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE analytics_view_dedup_false_positive_rate gauge', body)
+        self.assertIn('analytics_view_dedup_dropped_total ', body)
+
+    def test_record_view_keeps_unidentified_views(self):
+        """Test anonymous views without a client id are never treated as repeats"""
+        dedup = ViewDeduplicator({'ENABLED': True})
+        with mock.patch('analytics_app.services.get_deduplicator', return_value=dedup):
+            first = ViewIngestionService.record_view(self.blog)
+            second = ViewIngestionService.record_view(self.blog)
+
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertEqual(BlogView.objects.count(), 2)
+        self.assertEqual(dedup.stats()['dropped'], 0)
+
+    def test_record_view_disabled(self):
+        """Test every view is stored when deduplication is disabled"""
+        dedup = ViewDeduplicator({'ENABLED': False})
+        with mock.patch('analytics_app.services.get_deduplicator', return_value=dedup):
+            ViewIngestionService.record_view(self.blog, user=self.user)
+            ViewIngestionService.record_view(self.blog, user=self.user)
+
+        self.assertEqual(BlogView.objects.count(), 2)
@@ -1,7 +1,7 @@
 
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
-from analytics_app.models import Country, Blog, BlogView
+from analytics_app.models import Country, Blog, BlogView, APIRequestLog
 from django.utils import timezone
 from datetime import timedelta
 import json
@@ -107,4 +107,24 @@ class IntegrationTests(TestCase):
         for test_case in test_cases:
             response = self.client.get(test_case['url'], test_case['params'])
             self.assertEqual(response.status_code, test_case['expected_status'],
-                           f"Failed for {test_case['url']} with {test_case['params']}")
\ No newline at end of file
+                           f"Failed for {test_case['url']} with {test_case['params']}")
+
+    def test_requests_are_logged(self):
+        """Test analytics requests are recorded in APIRequestLog for replay"""
+        self.client.get('/analytics/top/', {'top': 'country', 'range': 'month'})
+
+        log = APIRequestLog.objects.get()
+        self.assertEqual(log.path, '/analytics/top/')
+        self.assertEqual(log.query_params, {'top': ['country'], 'range': ['month']})
+        self.assertEqual(log.status_code, 200)
+        self.assertIsNone(log.response_body)
+        self.assertGreater(log.response_size, 0)
+        self.assertEqual(len(log.response_hash), 64)
+
+    def test_error_responses_keep_body(self):
+        """Test error responses are logged with their body"""
+        self.client.get('/analytics/top/', {'top': 'invalid'})
+
+        log = APIRequestLog.objects.get()
+        self.assertEqual(log.status_code, 400)
+        self.assertIsNotNone(log.response_body)
@@ -0,0 +1,344 @@
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from unittest import skipUnless
+from analytics_app.models import APIRequestLog, APIRequestRollup, APIUserRollup, SystemMetrics, Blog, BlogView, Country
+from analytics_app.monitoring import metrics
+from analytics_app.admission import get_table_stats
+from analytics_app.monitoring.writer import RequestLogWriter
+from analytics_app.monitoring.rollup import rebuild_rollups
+from analytics_app.monitoring.sampler import SystemSampler, downsample
+from analytics_app.monitoring.profiling import ContinuousProfiler
+from analytics_app.monitoring.slow_queries import summarize_fingerprints
+import json
+from django.contrib.auth.models import User
+from datetime import timedelta
+import os
+import shutil
+import tempfile
+import uuid
+import multiprocessing
+from django.core.management import call_command, CommandError
+
+
+def make_record(path='/analytics/top/'):
+    now = timezone.now()
+    return {
+        'request_id': uuid.uuid4(),
+        'method': 'GET',
+        'path': path,
+        'status_code': 200,
+        'request_time': now,
+        'response_time': now,
+        'duration_ms': 1.0,
+    }
+
+
+class RequestLogWriterTests(TransactionTestCase):
+
+    def test_records_are_written_in_batches(self):
+        """Test queued records reach the table from the background thread"""
+        writer = RequestLogWriter(batch_size=2, flush_interval=10)
+        for _ in range(5):
+            self.assertTrue(writer.submit(make_record()))
+            self.assertTrue(writer.observe(timezone.now(), '/analytics/top/', None, 200, 12.0))
+
+        writer.flush()
+        writer.stop()
+
+        self.assertEqual(APIRequestLog.objects.count(), 5)
+        self.assertEqual(writer.stats()['written'], 5)
+        self.assertEqual(sum(APIRequestRollup.objects.values_list('requests', flat=True)), 5)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test submit never blocks when the writer falls behind"""
+        writer = RequestLogWriter(max_queue=1)
+        writer._ensure_started = lambda: None  # no consumer
+        self.assertTrue(writer.submit(make_record()))
+        self.assertFalse(writer.submit(make_record()))
+        self.assertEqual(writer.stats()['dropped'], 1)
+
+
+class MetricsTests(TestCase):
+
+    def test_requests_are_exported(self):
+        """Test requests show up in /metrics and the health check without DB aggregates"""
+        before = metrics.request_summary()['requests']
+        self.client.get('/analytics/top/', {'top': 'invalid'})
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE analytics_request_duration_seconds histogram', body)
+        self.assertIn('analytics_request_duration_seconds_count{endpoint="top-analytics",status_class="4xx"}', body)
+        self.assertIn('analytics_db_queries_total{endpoint="top-analytics"}', body)
+
+        health = self.client.get('/monitoring/health/').json()
+        self.assertGreaterEqual(health['metrics']['total_requests'], before + 2)
+
+    def test_cache_lookups_are_counted(self):
+        """Test the in-process caches report hits and misses to /metrics"""
+        get_table_stats().reset()
+        before = metrics.CACHE_LOOKUPS.snapshot()
+        for _ in range(2):
+            self.client.get('/analytics/top/', {'top': 'user'})
+        after = metrics.CACHE_LOOKUPS.snapshot()
+
+        for result in ('miss', 'hit'):
+            labels = ('table_stats', result)
+            self.assertEqual(after.get(labels, 0) - before.get(labels, 0), 1)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('analytics_cache_lookups_total{cache="table_stats",result="hit"}', body)
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_histogram_quantile(self):
+        """Test quantiles interpolate inside log-scale buckets"""
+        histogram = metrics.Histogram('test_seconds', 'test', ('endpoint',))
+        for _ in range(90):
+            histogram.observe(('a',), 0.0007)   # (0.0005, 0.001] bucket
+        for _ in range(10):
+            histogram.observe(('a',), 0.03)     # (0.016, 0.032] bucket
+
+        counts, total = histogram.snapshot()[('a',)]
+        self.assertEqual(sum(counts), 100)
+        self.assertAlmostEqual(total, 0.363)
+        p50 = metrics.histogram_quantile(0.5, histogram.buckets, counts)
+        p99 = metrics.histogram_quantile(0.99, histogram.buckets, counts)
+        self.assertTrue(0.0005 < p50 <= 0.001)
+        self.assertTrue(0.016 < p99 <= 0.032)
+
+    def test_multiprocess_directory_is_summed(self):
+        """Test snapshots written by other workers are added to the export"""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, '999999.json'), 'w') as fh:
+                fh.write('{"analytics_db_queries_total": {"[\\"other\\"]": 7}}')
+            with override_settings(METRICS={'MULTIPROCESS_DIR': directory}):
+                snapshot = metrics.collect()
+
+            self.assertEqual(snapshot['analytics_db_queries_total'][('other',)], 7)
+            self.assertTrue(os.path.exists(os.path.join(directory, f"{os.getpid()}.json")))
+
+
+class RollupTests(TestCase):
+
+    def test_dashboard_reads_grouped_rollups(self):
+        """Test requests are rolled up hourly per path and per user, and the dashboard groups in SQL"""
+        users = [User.objects.create_user(username=f"user{i}", password="pw") for i in range(3)]
+        for user in users:
+            self.client.force_login(user)
+            self.client.get('/analytics/top/', {'top': 'user'})
+        self.client.get('/analytics/top/', {'top': 'invalid'})
+        self.client.logout()
+        self.client.get('/analytics/top/', {'top': 'user'})
+
+        # one row per path and hour, however many users
+        rollup = APIRequestRollup.objects.get()
+        self.assertEqual((rollup.requests, rollup.errors), (5, 1))
+        self.assertEqual(sum(rollup.duration_buckets), 5)
+        self.assertEqual(dict(APIUserRollup.objects.values_list('user__username', 'requests')),
+                         {'user0': 1, 'user1': 1, 'user2': 2})
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/monitoring/dashboard/', {'days': 7})
+        data = response.json()
+        self.assertEqual(data['api_statistics'][0]['path'], '/analytics/top/')
+        self.assertEqual(data['api_statistics'][0]['total_requests'], 5)
+        self.assertEqual(data['api_statistics'][0]['error_count'], 1)
+        self.assertIsNotNone(data['api_statistics'][0]['p95_response_time'])
+        self.assertEqual(data['summary']['total_requests_today'], 5)
+        self.assertEqual(sum(hour['requests'] for hour in data['hourly_traffic']), 5)
+        self.assertEqual(data['top_users'][0]['user__username'], 'user2')
+        self.assertEqual(data['top_users'][0]['request_count'], 2)
+
+    def test_rebuild_from_request_log(self):
+        """Test rollups can be recomputed from the raw request log"""
+        now = timezone.now()
+        for status_code in (200, 200, 500):
+            record = make_record()
+            record.update(status_code=status_code, request_time=now - timedelta(hours=2), duration_ms=30.0)
+            APIRequestLog.objects.create(**record)
+
+        count = rebuild_rollups(now - timedelta(days=1), now)
+
+        self.assertEqual(count, 3)
+        rollup = APIRequestRollup.objects.get()
+        self.assertEqual((rollup.requests, rollup.errors, rollup.duration_sum_ms), (3, 1, 90.0))
+
+
+class SystemMetricsTests(TestCase):
+
+    def make_sample(self, timestamp, cpu, resolution='raw', samples=1):
+        return SystemMetrics.objects.create(
+            timestamp=timestamp, resolution=resolution, samples=samples, cpu_percent=cpu,
+            memory_percent=50.0, active_connections=4, queries_per_second=10.0,
+            response_time_avg=20.0, error_rate=0.0,
+        )
+
+    def test_downsample_folds_old_samples(self):
+        """Test aged raw samples become sample-weighted 1-minute rows"""
+        now = timezone.now().replace(second=0, microsecond=0)
+        old_minute = now - timedelta(hours=7)
+        self.make_sample(old_minute + timedelta(seconds=5), cpu=10.0)
+        self.make_sample(old_minute + timedelta(seconds=35), cpu=30.0)
+        recent = self.make_sample(now - timedelta(minutes=5), cpu=99.0)
+
+        created = downsample(now)
+
+        self.assertEqual(created['1m'], 1)
+        minute = SystemMetrics.objects.get(resolution='1m')
+        self.assertEqual(minute.timestamp, old_minute)
+        self.assertEqual(minute.samples, 2)
+        self.assertAlmostEqual(minute.cpu_percent, 20.0)
+        self.assertEqual(list(SystemMetrics.objects.filter(resolution='raw')), [recent])
+
+    @skipUnless(os.path.exists('/proc/stat'), 'needs /proc')
+    def test_sampler_reads_proc(self):
+        """Test the sampler produces a row from /proc and request counters"""
+        sampler = SystemSampler()
+        self.assertIsNone(sampler.record())  # baseline reading
+        row = sampler.record()
+        self.assertEqual(row.resolution, 'raw')
+        self.assertTrue(0 <= row.memory_percent <= 100)
+
+    @skipUnless(os.path.exists('/proc/stat'), 'needs /proc')
+    def test_sampler_reads_other_processes(self):
+        """Test request rates come from counters written by another process"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def serve_requests():
+            for metric in metrics.METRICS:
+                metric._values.clear()  # a fresh worker, not a copy of this process's counters
+            for status in (200, 200, 200, 500):
+                metrics.observe_request('other_worker', status, 0.25)
+            metrics._syncer.write()
+
+        with override_settings(METRICS={'MULTIPROCESS_DIR': directory}):
+            sampler = SystemSampler()
+            self.assertIsNone(sampler.sample())
+            worker = multiprocessing.get_context('fork').Process(target=serve_requests)
+            worker.start()
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+            values = sampler.sample()
+
+        self.assertGreater(values['queries_per_second'], 0)
+        self.assertEqual(values['response_time_avg'], 250)
+        self.assertEqual(values['error_rate'], 25)
+
+    def test_command_needs_multiprocess_dir(self):
+        """Test the sampling command refuses to run without the shared metrics directory"""
+        with override_settings(METRICS={'MULTIPROCESS_DIR': None}):
+            with self.assertRaisesMessage(CommandError, "MULTIPROCESS_DIR"):
+                call_command('sample_system_metrics', count=1)
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(PROFILING={'DIR': self.directory})
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_profile_is_staff_only(self):
+        """Test ?profile is ignored for anonymous and non-staff users"""
+        user = User.objects.create_user('viewer', password='x')
+        self.client.force_login(user)
+        response = self.client.get('/analytics/top/', {'top': 'blog', 'profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'requests')))
+
+    def test_staff_profile_is_stored_and_returned(self):
+        """Test staff requests store pstats, top functions and collapsed stacks"""
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get('/analytics/top/', {'top': 'blog', 'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        base = os.path.join(self.directory, 'requests', response['X-Profile-Id'])
+        for suffix in ('.prof', '.txt', '.collapsed'):
+            self.assertTrue(os.path.exists(base + suffix))
+
+        response = self.client.get('/analytics/top/', {'top': 'blog', 'profile': 'text'})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('cumulative', response.content.decode())
+
+    def test_continuous_profiler_writes_per_endpoint_stacks(self):
+        """Test sampled stacks are attributed to the registered endpoint"""
+        profiler = ContinuousProfiler(self.directory)
+        profiler.enter('top-analytics')
+        profiler.sample()
+        profiler.exit()
+        profiler.sample()
+        profiler.flush()
+
+        files = os.listdir(os.path.join(self.directory, 'continuous'))
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith('top-analytics-'))
+        with open(os.path.join(self.directory, 'continuous', files[0])) as fh:
+            stack, count = fh.read().rsplit(' ', 1)
+        self.assertIn('test_continuous_profiler_writes_per_endpoint_stacks', stack)
+        self.assertEqual(int(count), 1)
+
+
+class SlowQueryLogTests(TestCase):
+
+    @override_settings(SLOW_QUERIES={'THRESHOLD_MS': 0})
+    def test_slow_queries_are_logged_with_plan(self):
+        """Test queries over the threshold are logged with endpoint, request_id and EXPLAIN"""
+        with self.assertLogs('analytics_app.slow_queries', 'WARNING') as logs:
+            response = self.client.get('/analytics/top/', {'top': 'blog'})
+
+        records = [r for r in logs.records if 'analytics_app_blogview' in r.sql]
+        self.assertTrue(records)
+        record = records[0]
+        self.assertEqual(record.endpoint, 'top-analytics')
+        self.assertEqual(record.request_id, response['X-Request-ID'])
+        self.assertIn('?', record.fingerprint)
+        self.assertTrue(record.plan)
+
+        summary = summarize_fingerprints([vars(r) for r in logs.records])
+        self.assertEqual(sum(item['count'] for item in summary), len(logs.records))
+        self.assertEqual(summary, sorted(summary, key=lambda item: item['total_ms'], reverse=True))
+
+
+class TracingTests(TestCase):
+
+    def setUp(self):
+        country = Country.objects.create(name="Test Country", code="TC")
+        user = User.objects.create_user(username="author", password="x")
+        blog = Blog.objects.create(title="Traced", content="c", author=user, country=country)
+        BlogView.objects.create(blog=blog, user=user, country=country, duration=60)
+
+    @override_settings(TRACING={'SAMPLE_RATE': 1.0})
+    def test_request_is_exported_as_otlp_spans(self):
+        """Test a sampled request exports view, service, query and render spans under one trace"""
+        with self.assertLogs('analytics_app.traces', 'INFO') as logs:
+            response = self.client.get('/analytics/blog-views/', {'object_type': 'country', 'range': 'year'})
+
+        payload = json.loads(logs.records[-1].getMessage())
+        spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+        by_name = {span['name']: span for span in spans}
+        root = by_name['GET analytics/blog-views/']
+        self.assertEqual(root['kind'], 2)
+        self.assertEqual(str(uuid.UUID(hex=root['traceId'])), response['X-Request-ID'])
+        self.assertTrue(all(span['traceId'] == root['traceId'] for span in spans))
+
+        view = by_name['BlogViewsAnalyticsAPI.get']
+        service = by_name['AnalyticsService.get_blog_views_analytics']
+        self.assertEqual(service['parentSpanId'], view['spanId'])
+        self.assertEqual(by_name['date_range']['parentSpanId'], service['spanId'])
+        self.assertEqual(by_name['paginate']['parentSpanId'], view['spanId'])
+        self.assertIn('render', by_name)
+        self.assertTrue(any(span['kind'] == 3 for span in spans))
+
+    @override_settings(TRACING={'SAMPLE_RATE': 0.0})
+    def test_traceparent_sampled_flag_is_followed(self):
+        """Test an incoming sampled traceparent is traced with its trace and parent ids"""
+        trace_id = uuid.uuid4().hex
+        with self.assertLogs('analytics_app.traces', 'INFO') as logs:
+            self.client.get('/analytics/top/', {'top': 'blog'},
+                            HTTP_TRACEPARENT=f"00-{trace_id}-00f067aa0ba902b7-01")
+        spans = json.loads(logs.records[-1].getMessage())['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual({span['traceId'] for span in spans}, {trace_id})
+        self.assertEqual(spans[0]['parentSpanId'], '00f067aa0ba902b7')
@@ -1,11 +1,19 @@
 
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, RequestFactory, override_settings
+from django.db import OperationalError, connections
+from django.http import JsonResponse
 from django.contrib.auth.models import User
 from analytics_app.models import Country, Blog, BlogView
 from analytics_app.services import AnalyticsService
+from analytics_app.parallel import run_parallel
+from analytics_app.routers import replica_reads, reads_from_replica, get_replica_health
+from analytics_app.middleware import ReadYourWritesMiddleware
+from analytics_app.exceptions import DatabaseQueryException
 from django.utils import timezone
 from datetime import timedelta
 import json
+import time
+import threading
 
 class AnalyticsServiceTests(TestCase):
     
@@ -111,4 +119,136 @@ class AnalyticsServiceTests(TestCase):
         
         # Should have growth percentages
         if len(result) > 1:
-            self.assertIn('z', result[1])  # Growth percentage
\ No newline at end of file
+            self.assertIn('z', result[1])  # Growth percentage
+
+class ParallelQueryTests(SimpleTestCase):
+
+    def test_results_keep_order(self):
+        def slow(value, delay):
+            time.sleep(delay)
+            return value
+
+        results = run_parallel(lambda: slow('a', 0.05), lambda: slow('b', 0), lambda: slow('c', 0.02))
+        self.assertEqual(results, ['a', 'b', 'c'])
+
+    def test_per_call_cap(self):
+        lock = threading.Lock()
+        running = [0, 0]  # current, peak
+
+        def task():
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        run_parallel(*[task] * 6, max_parallel=2)
+        self.assertLessEqual(running[1], 2)
+
+    def test_exception_propagates(self):
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            run_parallel(lambda: 1, fail)
+
+    def test_nested_call_runs_inline(self):
+        outer = threading.get_ident()
+
+        def nested():
+            worker = threading.get_ident()
+            return worker != outer, run_parallel(threading.get_ident, threading.get_ident) == [worker, worker]
+
+        self.assertEqual(run_parallel(nested, lambda: None)[0], (True, True))
+
+    @override_settings(PARALLEL_QUERIES={'ENABLED': False})
+    def test_disabled_runs_inline(self):
+        self.assertEqual(run_parallel(threading.get_ident, threading.get_ident), [threading.get_ident()] * 2)
+
+
+@override_settings(READ_REPLICAS={'REPLICAS': {'replica': 1}, 'READ_YOUR_WRITES_SECONDS': 5})
+class ReadReplicaRouterTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        get_replica_health().reset()
+        self.country = Country.objects.create(name="Country 1", code="C1")
+
+    def test_scoped_reads_go_to_replica(self):
+        self.assertEqual(BlogView.objects.all().db, 'default')
+        with replica_reads() as scope:
+            self.assertEqual(BlogView.objects.all().db, 'replica')
+            self.assertEqual(Country.objects.get(code="C1").name, "Country 1")
+            Country.objects.create(name="Country 2", code="C2")
+        self.assertEqual(scope.used, {'replica'})
+        self.assertTrue(Country.objects.using('default').filter(code="C2").exists())
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        get_replica_health().mark_unhealthy('replica')
+        with replica_reads() as scope:
+            self.assertEqual(BlogView.objects.all().db, 'default')
+        self.assertEqual(scope.used, set())
+
+    def test_failed_replica_read_retried_on_primary(self):
+        databases = []
+
+        @reads_from_replica
+        def read():
+            databases.append(Country.objects.all().db)
+            if len(databases) == 1:
+                try:
+                    raise OperationalError("replica is gone")
+                except OperationalError:
+                    raise DatabaseQueryException("Database query error")
+            return databases[-1]
+
+        self.assertEqual(read(), 'default')
+        self.assertEqual(databases, ['replica', 'default'])
+        self.assertEqual(get_replica_health().status(), {'replica': False})
+
+    @override_settings(PARALLEL_QUERIES={'ENABLED': False})
+    def test_replica_failure_during_pagination_retried_on_primary(self):
+        """Test API #1 answers from the primary when the replica fails on the page count"""
+        user = User.objects.create_user(username="user1")
+        blog = Blog.objects.create(title="Blog 1", content="Content", author=user, country=self.country)
+        BlogView.objects.create(blog=blog, user=user, country=self.country)
+        failures = []
+
+        def fail_count(execute, sql, params, many, context):
+            if 'COUNT(' in sql.upper() and not failures:
+                failures.append(sql)
+                raise OperationalError("replica is gone")
+            return execute(sql, params, many, context)
+
+        with connections['replica'].execute_wrapper(fail_count):
+            response = self.client.get('/analytics/blog-views/', {'object_type': 'country', 'limit': 10})
+
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(get_replica_health().status(), {'replica': False})
+
+    def test_read_your_writes_pin(self):
+        def view(request):
+            with replica_reads():
+                before = Country.objects.all().db
+                if request.method == 'POST':
+                    Country.objects.create(name="Country 3", code="C3")
+                after = Country.objects.all().db
+            return JsonResponse({'before': before, 'after': after})
+
+        middleware = ReadYourWritesMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.post('/'))
+        self.assertEqual(json.loads(response.content), {'before': 'replica', 'after': 'default'})
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 5)
+
+        pinned = factory.get('/')
+        pinned.COOKIES['primary_pin'] = '1'
+        self.assertEqual(json.loads(middleware(pinned).content), {'before': 'default', 'after': 'default'})
+
+        response = middleware(factory.get('/'))
+        self.assertEqual(json.loads(response.content), {'before': 'replica', 'after': 'replica'})
+        self.assertNotIn('primary_pin', response.cookies)
@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from analytics_app.models import Country, Blog, BlogView
+from analytics_app.snapshots import dump_snapshot, restore_snapshot, SnapshotError
+from django.utils import timezone
+from datetime import timedelta
+import numpy as np
+import os
+import tempfile
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        self.country = Country.objects.create(name="Test Country", code="TC")
+        self.user = User.objects.create_user(username="testuser", first_name="Test", last_name="User")
+        self.blog = Blog.objects.create(
+            title="Test Blog",
+            content="Test content",
+            author=self.user,
+            country=self.country
+        )
+        self.viewed_at = timezone.now().replace(microsecond=123456) - timedelta(days=1)
+        BlogView.objects.create(blog=self.blog, user=self.user, country=self.country,
+                                viewed_at=self.viewed_at, duration=60)
+        BlogView.objects.create(blog=self.blog, user=None, country=None,
+                                viewed_at=self.viewed_at, duration=5)
+
+    def test_round_trip(self):
+        """Test a restored snapshot reproduces rows and content hash"""
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = dump_snapshot(tmp)
+            self.assertEqual(manifest['tables']['blogview']['rows'], 2)
+
+            with self.assertRaises(SnapshotError):
+                restore_snapshot(tmp)
+
+            restore_snapshot(tmp, replace=True)
+            self.assertEqual(dump_snapshot(tmp)['content_hash'], manifest['content_hash'])
+
+        view = BlogView.objects.get(duration=60)
+        self.assertEqual(view.viewed_at, self.viewed_at)
+        self.assertEqual(view.user.username, "testuser")
+        self.assertIsNone(BlogView.objects.get(duration=5).country)
+
+    def test_restore_keeps_staff_accounts(self):
+        """Test --replace leaves superusers and their passwords alone"""
+        admin = User.objects.create_superuser(username="admin", password="secret")
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = dump_snapshot(tmp)
+            self.user.first_name = "Changed"
+            self.user.save()
+            restore_snapshot(tmp, replace=True)
+            self.assertEqual(dump_snapshot(tmp)['content_hash'], manifest['content_hash'])
+
+        admin.refresh_from_db()
+        self.assertTrue(admin.check_password("secret"))
+        self.assertEqual(User.objects.get(username="testuser").first_name, "Test")
+
+        # A restore into a database holding only staff accounts needs no --replace
+        other = User.objects.create_user(username="someone")
+        with tempfile.TemporaryDirectory() as tmp:
+            dump_snapshot(tmp)
+            BlogView.objects.all().delete()
+            Blog.objects.all().delete()
+            Country.objects.all().delete()
+            User.objects.filter(is_superuser=False).delete()
+            restore_snapshot(tmp)
+        self.assertTrue(User.objects.filter(username="someone").exists())
+        self.assertTrue(User.objects.get(username="admin").check_password("secret"))
+
+    def test_text_columns_are_variable_length(self):
+        """Test one long value does not widen every row of a text column"""
+        Blog.objects.create(title="Ünïcödé ✓", content="x" * 200000, author=self.user)
+        for i in range(200):
+            Blog.objects.create(title=f"Short {i}", content="y", author=self.user)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = dump_snapshot(tmp)
+            with np.load(os.path.join(tmp, 'blog.npz')) as npz:
+                self.assertEqual(npz['content__data'].nbytes, len("Test content") + 200000 + 200)
+                self.assertEqual(len(npz['content__offsets']), 203)
+            restore_snapshot(tmp, replace=True)
+            self.assertEqual(dump_snapshot(tmp)['content_hash'], manifest['content_hash'])
+
+        self.assertEqual(len(Blog.objects.get(title="Ünïcödé ✓").content), 200000)
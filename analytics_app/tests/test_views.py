@@ -1,10 +1,22 @@
 
-from django.test import TestCase, Client
+from asgiref.sync import sync_to_async
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth.models import User
 from analytics_app.models import Country, Blog, BlogView
+from analytics_app.query_budget import QueryBudgetTestMixin, DEFAULT_QUERY_BUDGETS, get_budget
+from analytics_app.admission import AdmissionController, TableStats, estimate_cost, get_admission_settings
+from analytics_app.exceptions import RateLimitedException, ServiceOverloadedException, QueryTimeoutException
+from analytics_app.deadlines import query_time_limit
+from analytics_app.pagination import AnalyticsPagination
+from analytics_app.services import AnalyticsService
+from django.db import connection
+from unittest import mock
 from django.utils import timezone
 from datetime import timedelta
 import json
+import time
+import threading
+from types import SimpleNamespace
 
 class APIViewTests(TestCase):
     
@@ -116,4 +128,268 @@ class APIViewTests(TestCase):
         response_data = response.json()
         self.assertIn('count', response_data)
         self.assertIn('limit', response_data)
-        self.assertIn('offset', response_data)
\ No newline at end of file
+        self.assertIn('offset', response_data)
+
+    def test_columnar_format(self):
+        """Test format=columnar returns the rows as parallel x/y/z arrays"""
+        for path, params in (
+            ('/analytics/blog-views/', {'object_type': 'user', 'range': 'month'}),
+            ('/analytics/top/', {'top': 'blog'}),
+            ('/analytics/performance/', {'compare': 'day'}),
+        ):
+            rows = self.client.get(path, params).json()
+            response = self.client.get(path, {**params, 'format': 'columnar'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertNotIn(b', ', response.content)
+
+            columns, data = response.json(), rows.pop('data')
+            self.assertEqual(columns.pop('data'), {
+                field: [row[field] for row in data] for field in ('x', 'y', 'z')
+            })
+            self.assertEqual(columns.keys(), rows.keys())
+
+    def test_server_timing(self):
+        """Test DB/app/render timing is returned in Server-Timing and logged"""
+        with self.assertLogs('analytics_app.middleware', level='INFO') as logs:
+            response = self.client.get('/analytics/performance/', {'compare': 'month'})
+
+        self.assertEqual(response.status_code, 200)
+        metrics = [part.split(';')[0].strip() for part in response['Server-Timing'].split(',')]
+        self.assertEqual(metrics, ['db', 'db-slowest', 'app', 'render', 'total'])
+
+        record = next(r for r in logs.records if r.getMessage().startswith('Request timing'))
+        self.assertEqual(record.endpoint, 'performance-analytics')
+        self.assertGreaterEqual(record.db_queries, 2)
+        self.assertIn('SELECT', record.db_slowest_sql)
+
+    def test_request_log_sampling(self):
+        """Test one structured record per request, sampled per route"""
+        with self.assertLogs('analytics_app.middleware', level='INFO') as logs:
+            response = self.client.get('/analytics/top/', {'top': 'user'})
+        record = next(r for r in logs.records if r.getMessage().startswith('API GET'))
+        self.assertEqual(record.request_id, response['X-Request-ID'])
+        self.assertEqual(record.endpoint, 'top-analytics')
+        self.assertEqual(record.status_code, 200)
+
+        sampling = {'ROUTE_SAMPLE_RATES': {'top-analytics': 0.0}, 'SLOW_REQUEST_MS': 60000}
+        with override_settings(REQUEST_LOGGING=sampling):
+            with self.assertLogs('analytics_app.middleware', level='INFO') as logs:
+                Client().get('/analytics/top/', {'top': 'user'})
+        self.assertFalse([r for r in logs.records if r.getMessage().startswith('API GET')])
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.country = Country.objects.create(name="Test Country", code="TC")
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        for i in range(3):
+            blog = Blog.objects.create(
+                title=f"Test Blog {i}",
+                content="Test content",
+                author=self.user,
+                country=self.country
+            )
+            BlogView.objects.create(blog=blog, user=self.user, country=self.country, duration=60)
+
+    def test_endpoints_within_budget(self):
+        """Test each analytics endpoint stays within its query budget"""
+        cases = [
+            ('blog-views-analytics', '/analytics/blog-views/', {'object_type': 'user', 'range': 'month'}),
+            ('top-analytics', '/analytics/top/', {'top': 'blog'}),
+            ('performance-analytics', '/analytics/performance/', {'compare': 'month'}),
+        ]
+        for endpoint, url, params in cases:
+            with self.subTest(endpoint=endpoint):
+                with self.assertWithinQueryBudget(endpoint):
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_repeated_query_shape_is_reported(self):
+        """Test an N+1 access pattern fails the budget assertion"""
+        with self.assertRaises(AssertionError) as ctx:
+            with self.assertWithinQueryBudget('top-analytics', budget={'max_queries': 10}):
+                for view in BlogView.objects.all():
+                    view.blog.title  # one query per view
+
+        self.assertIn('possible N+1', str(ctx.exception))
+
+    def test_budget_overrides_merge_with_defaults(self):
+        """Test QUERY_BUDGETS only overrides the given endpoints and keys"""
+        overrides = {'top-analytics': {'max_db_ms': 250}, 'performance-analytics': None,
+                     'health-check': {'max_queries': 1}}
+        with override_settings(QUERY_BUDGETS=overrides):
+            self.assertEqual(get_budget('top-analytics'), {'max_queries': 1, 'max_db_ms': 250})
+            self.assertEqual(get_budget('blog-views-analytics'), DEFAULT_QUERY_BUDGETS['blog-views-analytics'])
+            self.assertIsNone(get_budget('performance-analytics'))
+            self.assertEqual(get_budget('health-check'), {'max_queries': 1})
+
+
+class AsyncViewTests(TransactionTestCase):
+    """Async views return the same payloads as the DRF views"""
+
+    def setUp(self):
+        country = Country.objects.create(name="Test Country", code="TC")
+        user = User.objects.create_user(username="testuser", password="testpass")
+        for i in range(3):
+            blog = Blog.objects.create(title=f"Test Blog {i}", content="c", author=user, country=country)
+            BlogView.objects.create(blog=blog, user=user, country=country, duration=60)
+
+    async def assert_same_payload(self, sync_path, async_path, params):
+        expected = await sync_to_async(self.client.get)(sync_path, params)
+        response = await self.async_client.get(async_path, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        payload, expected_payload = response.json(), expected.json()
+        for key in ('next', 'previous'):
+            if expected_payload.get(key):
+                expected_payload[key] = expected_payload[key].replace(sync_path, async_path)
+        self.assertEqual(payload, expected_payload)
+
+    async def test_async_views_match_sync_views(self):
+        await self.assert_same_payload('/analytics/blog-views/', '/analytics/async/blog-views/',
+                                       {'object_type': 'country', 'range': 'month', 'limit': 1})
+        await self.assert_same_payload('/analytics/top/', '/analytics/async/top/', {'top': 'blog'})
+        await self.assert_same_payload('/analytics/performance/', '/analytics/async/performance/',
+                                       {'compare': 'month'})
+        await self.assert_same_payload('/analytics/blog-views/', '/analytics/async/blog-views/',
+                                       {'object_type': 'invalid'})
+        await self.assert_same_payload('/analytics/blog-views/', '/analytics/async/blog-views/',
+                                       {'object_type': 'user', 'limit': 1, 'format': 'columnar'})
+        await self.assert_same_payload('/analytics/top/', '/analytics/async/top/',
+                                       {'top': 'country', 'format': 'columnar'})
+
+    @override_settings(PARALLEL_QUERIES={'ENABLED': False})
+    async def test_sequential_mode(self):
+        await self.assert_same_payload('/analytics/performance/', '/analytics/async/performance/',
+                                       {'compare': 'day'})
+
+
+class AdmissionControlTests(TestCase):
+
+    def setUp(self):
+        country = Country.objects.create(name="Test Country", code="TC")
+        user = User.objects.create_user(username="testuser")
+        blog = Blog.objects.create(title="Test Blog", content="Test content", author=user, country=country)
+        BlogView.objects.create(blog=blog, user=user, country=country, duration=60)
+        self.stats = SimpleNamespace(rows=1_000_000, span_days=365.0)
+
+    def test_cost_estimate(self):
+        """Test wider ranges, per-user grouping and contains filters cost more"""
+        month = estimate_cost('blog-views-analytics', {'range': 'month'}, self.stats)
+        year = estimate_cost('blog-views-analytics', {'range': 'year'}, self.stats)
+        by_user = estimate_cost('blog-views-analytics', {'range': 'year', 'object_type': 'user'}, self.stats)
+        contains = estimate_cost('blog-views-analytics', {
+            'range': 'year', 'object_type': 'user',
+            'filters': json.dumps({'conditions': [{'field': 'blog__title', 'operator': 'contains', 'value': 'a'}]}),
+        }, self.stats)
+
+        self.assertAlmostEqual(year, 1000.0)
+        self.assertLess(month, year)
+        self.assertLess(year, by_user)
+        self.assertLess(by_user, contains)
+
+        # the operators that run as the same LIKE scans cost the same
+        for operator in ('icontains', 'startswith', 'endswith'):
+            cost = estimate_cost('blog-views-analytics', {
+                'range': 'year', 'object_type': 'user',
+                'filters': json.dumps({'conditions': [{'field': 'blog__title', 'operator': operator, 'value': 'a'}]}),
+            }, self.stats)
+            self.assertEqual(cost, contains, operator)
+
+    def test_stale_stats_served_during_refresh(self):
+        """Test requests keep the previous row statistics while one request refreshes them"""
+        stats = TableStats()
+        self.assertEqual(stats.get(300).rows, 1)
+        stats._refreshed -= 300
+        refreshing, release = threading.Event(), threading.Event()
+
+        def slow_refresh():
+            refreshing.set()
+            release.wait(5)
+
+        with mock.patch.object(stats, 'refresh', side_effect=slow_refresh) as refresh:
+            worker = threading.Thread(target=stats.get, args=(300,))
+            worker.start()
+            self.assertTrue(refreshing.wait(5))
+            started = time.monotonic()
+            self.assertEqual(stats.get(300).rows, 1)
+            self.assertLess(time.monotonic() - started, 1)
+            release.set()
+            worker.join(5)
+        self.assertEqual(refresh.call_count, 1)
+
+    def test_lanes_and_client_quota(self):
+        """Test a full lane answers 503 and a spent client budget 429, both with Retry-After"""
+        controller = AdmissionController({**get_admission_settings(), 'LANES': {'cheap': 1, 'expensive': 1},
+                                          'CLIENT_COST_PER_MINUTE': 100, 'EXPENSIVE_COST': 50})
+        ticket = controller.admit('a', 10)
+        with self.assertRaises(ServiceOverloadedException):
+            controller.admit('b', 10)
+        ticket.release()
+        controller.admit('b', 10).release()
+
+        controller.admit('a', 60).release()
+        with self.assertRaises(RateLimitedException) as raised:
+            controller.admit('a', 60)
+        self.assertGreaterEqual(raised.exception.retry_after, 12)
+
+    def test_middleware(self):
+        """Test admitted requests report their cost and saturated lanes are shed"""
+        response = self.client.get('/analytics/blog-views/', {'object_type': 'country', 'range': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Query-Cost', response)
+
+        with override_settings(ADMISSION_CONTROL={'LANES': {'cheap': 0, 'expensive': 0}}):
+            response = Client().get('/analytics/top/', {'top': 'user'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['code'], 'overloaded')
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class QueryDeadlineTests(TestCase):
+
+    def setUp(self):
+        country = Country.objects.create(name="Test Country", code="TC")
+        user = User.objects.create_user(username="testuser")
+        blog = Blog.objects.create(title="Test Blog", content="Test content", author=user, country=country)
+        BlogView.objects.create(blog=blog, user=user, country=country, duration=60)
+
+    def test_slow_statement_cancelled(self):
+        """Test a statement running past its limit is interrupted"""
+        slow = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) "
+                "SELECT count(*) FROM c")
+        started = time.monotonic()
+        with query_time_limit(50), self.assertRaises(QueryTimeoutException):
+            with connection.cursor() as cursor:
+                cursor.execute(slow)
+        self.assertLess(time.monotonic() - started, 5)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")  # the handler is gone afterwards
+
+    @override_settings(QUERY_DEADLINES={'ENDPOINTS_MS': {'performance-analytics': 0}, 'SQLITE_PROGRESS_STEPS': 1})
+    def test_timeout_response(self):
+        """Test a cancelled query answers 504 with Retry-After"""
+        response = self.client.get('/analytics/performance/', {'compare': 'month'})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json()['code'], 'query_timeout')
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_degraded_results(self):
+        """Test the page is served without its count and the top 10 falls back to a narrower range"""
+        with mock.patch.object(AnalyticsPagination, 'get_count', side_effect=QueryTimeoutException()):
+            response = self.client.get('/analytics/blog-views/', {'object_type': 'country', 'limit': 1})
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(data['count'])
+        self.assertEqual(len(data['data']), 1)
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(data['degraded']['missing'], ['count'])
+
+        rows = [{'x': 'Test Country', 'y': 1, 'z': 1}]
+        with mock.patch.object(AnalyticsService, 'get_top_analytics', side_effect=[QueryTimeoutException(), rows]):
+            response = self.client.get('/analytics/top/', {'top': 'country'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], rows)
+        self.assertEqual(response.json()['degraded'], {'reason': 'query_timeout', 'range': 'month'})
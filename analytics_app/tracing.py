@@ -0,0 +1,261 @@
+"""
+Minimal request tracing: nested spans (context managers) with parent/child
+ids, exported per request as one OTLP/JSON ``ExportTraceServiceRequest`` line
+to a local file through the 'analytics_app.traces' logger, so no collector
+is needed. The trace id is the request_id (a UUID) in hex.
+
+Spans are only recorded inside a sampled request; elsewhere ``span`` and
+``traced`` cost one context variable lookup.
+"""
+import json
+import time
+import uuid
+import random
+import inspect
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+
+logger = logging.getLogger('analytics_app.traces')
+
+
+DEFAULT_TRACING_SETTINGS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.01,        # head sampling: share of requests traced
+    'PARENT_BASED': True,       # follow the sampled flag of an incoming traceparent header
+    'SERVICE_NAME': 'analytics-api',
+    'STATEMENT_CHARS': 2000,    # db.statement attribute length
+}
+
+# OTLP enums
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar('analytics_current_span', default=None)
+
+
+def get_tracing_settings():
+    return {**DEFAULT_TRACING_SETTINGS, **getattr(settings, 'TRACING', {})}
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message')
+
+    def __init__(self, trace, name, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_UNSET
+        self.status_message = ''
+        trace.spans.append(self)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def child(self, name, kind=SPAN_KIND_INTERNAL, **attributes):
+        return Span(self.trace, name, self.span_id, kind, attributes)
+
+    def to_otlp(self):
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or time.time_ns()),
+            'attributes': [_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            'status': {'code': self.status},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        if self.status_message:
+            data['status']['message'] = self.status_message
+        return data
+
+
+class Trace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+
+    def to_otlp(self, service_name):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_attribute('service.name', service_name)]},
+            'scopeSpans': [{
+                'scope': {'name': 'analytics_app'},
+                'spans': [span.to_otlp() for span in self.spans],
+            }],
+        }]}
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Record a child of the current span for the duration of the block; a
+    no-op (yields None) outside a sampled trace
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind, **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def start_span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Manual form of ``span`` for spans that begin and end in different
+    hooks. Returns (span, token), or (None, None) outside a trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None, None
+    child = parent.child(name, kind, **attributes)
+    return child, _current_span.set(child)
+
+
+def end_span(child, token):
+    if child is not None:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # ended in another context (an ASGI sync_to_async hop); that copy is discarded
+        child.end()
+
+
+def traced(name=None):
+    """
+    Decorator form of ``span``, named after the function by default
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def parse_traceparent(header):
+    """
+    (trace_id, parent_span_id, sampled) from a W3C traceparent header, or None
+    """
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def should_sample(config, parent=None):
+    if parent is not None and config['PARENT_BASED']:
+        return parent[2]
+    rate = config['SAMPLE_RATE']
+    return rate >= 1 or random.random() < rate
+
+
+def start_trace(name, trace_id, parent_span_id=None, **attributes):
+    """
+    Open the root span of a new trace and make it current. Returns
+    (root span, token for ``finish_trace``).
+    """
+    root = Span(Trace(trace_id), name, parent_span_id, SPAN_KIND_SERVER, attributes)
+    return root, _current_span.set(root)
+
+
+def finish_trace(root, token, service_name=None):
+    _current_span.reset(token)
+    root.end()
+    export_trace(root.trace, service_name or get_tracing_settings()['SERVICE_NAME'])
+
+
+def export_trace(trace, service_name):
+    try:
+        logger.info(json.dumps(trace.to_otlp(service_name), separators=(',', ':'), default=str))
+    except Exception as e:
+        logging.getLogger(__name__).error("Failed to export trace %s: %s", trace.trace_id, e)
+
+
+class QuerySpans:
+    """
+    Execute wrapper recording one CLIENT span per SQL statement under the
+    current span
+    """
+
+    def __init__(self, statement_chars=2000):
+        self.statement_chars = statement_chars
+
+    def __call__(self, execute, sql, params, many, context):
+        parent = _current_span.get()
+        if parent is None:
+            return execute(sql, params, many, context)
+        connection = context['connection']
+        operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'QUERY'
+        with span(f"db {operation}", SPAN_KIND_CLIENT, **{
+            'db.system': connection.vendor,
+            'db.name': connection.alias,
+            'db.operation': operation,
+            'db.statement': sql[:self.statement_chars],
+            'db.executemany': many or None,
+        }):
+            return execute(sql, params, many, context)
@@ -1,10 +1,19 @@
 
 from django.urls import path
 from .views import BlogViewsAnalyticsAPI, TopAnalyticsAPI, PerformanceAnalyticsAPI
+from .async_views import BlogViewsAnalyticsAsyncView, TopAnalyticsAsyncView, PerformanceAnalyticsAsyncView
+from .monitoring.views import HealthCheckView, PerformanceDashboardView, metrics_view
 
 urlpatterns = [
     path('analytics/blog-views/', BlogViewsAnalyticsAPI.as_view(), name='blog-views-analytics'),
     path('analytics/top/', TopAnalyticsAPI.as_view(), name='top-analytics'),
     path('analytics/performance/', PerformanceAnalyticsAPI.as_view(), name='performance-analytics'),
+    # native async versions (serve with an ASGI server)
+    path('analytics/async/blog-views/', BlogViewsAnalyticsAsyncView.as_view(), name='blog-views-analytics-async'),
+    path('analytics/async/top/', TopAnalyticsAsyncView.as_view(), name='top-analytics-async'),
+    path('analytics/async/performance/', PerformanceAnalyticsAsyncView.as_view(), name='performance-analytics-async'),
+    path('monitoring/health/', HealthCheckView.as_view(), name='health-check'),
+    path('monitoring/dashboard/', PerformanceDashboardView.as_view(), name='performance-dashboard'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
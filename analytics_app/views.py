@@ -2,6 +2,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
 from django_filters import rest_framework as filters
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -11,12 +12,25 @@ from .models import BlogView
 from .services import AnalyticsService
 from .filters import BlogViewFilter, PerformanceFilter
 from .pagination import AnalyticsPagination
-from .exceptions import InvalidFilterException, TimeRangeException, DataNotFoundException
+from .exceptions import InvalidFilterException, TimeRangeException, DataNotFoundException, QueryTimeoutException
+from .tracing import span, traced
+from .routers import reads_from_replica, replica_failed
+from .deadlines import with_query_deadline, degraded_range
+from .renderers import COLUMNS, ColumnarJSONRenderer, to_columns, dicts_to_columns, wants_columns
 
 logger = logging.getLogger(__name__)
 
 
 # Swagger schemas for API documentation
+format_param = openapi.Parameter(
+    'format',
+    openapi.IN_QUERY,
+    description="'columnar' for the data as parallel arrays: {\"x\": [...], \"y\": [...], \"z\": [...]}",
+    type=openapi.TYPE_STRING,
+    enum=['json', 'columnar'],
+    required=False
+)
+
 blog_views_params = [
     openapi.Parameter(
         'object_type',
@@ -56,6 +70,7 @@ blog_views_params = [
         type=openapi.TYPE_INTEGER,
         required=False
     ),
+    format_param,
 ]
 
 top_analytics_params = [
@@ -81,6 +96,7 @@ top_analytics_params = [
         type=openapi.TYPE_STRING,
         required=False
     ),
+    format_param,
 ]
 
 performance_params = [
@@ -106,16 +122,26 @@ performance_params = [
         type=openapi.TYPE_STRING,
         required=False
     ),
+    format_param,
 ]
 
 
 
+def retry_later_response(exc):
+    return Response(
+        {'error': str(exc.detail), 'code': exc.default_code},
+        status=exc.status_code,
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
 # Update the BlogViewsAnalyticsAPI view in views.py
 class BlogViewsAnalyticsAPI(APIView):
     """API #1: Group blogs and views by selected object_type"""
     
     filter_backends = (BlogViewFilter,)
     pagination_class = AnalyticsPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
     queryset = BlogView.objects.all()  # Add this line for Swagger
     
     @swagger_auto_schema(
@@ -151,10 +177,13 @@ class BlogViewsAnalyticsAPI(APIView):
             500: openapi.Response(description="Internal Server Error"),
         }
     )
+    @traced()
+    @reads_from_replica
+    @with_query_deadline('blog-views-analytics')
     def get(self, request):
         try:
             # Log request
-            logger.info(f"BlogViewsAnalyticsAPI called: {request.query_params}")
+            logger.debug("BlogViewsAnalyticsAPI called: %s", request.query_params)
             
             # Extract and validate parameters
             object_type = request.query_params.get('object_type', 'country')
@@ -180,40 +209,48 @@ class BlogViewsAnalyticsAPI(APIView):
                 filters=filters
             )
             
+            columnar = wants_columns(request)
+            if columnar:
+                data_queryset = data_queryset.values_list(*COLUMNS)
+
             # Apply pagination
             paginator = self.pagination_class()
-            page = paginator.paginate_queryset(data_queryset, request, view=self)
+            with span('paginate'):
+                page = paginator.paginate_queryset(data_queryset, request, view=self)
             
             # Prepare base response data
             base_response = {
                 'object_type': object_type,
                 'range': date_range,
-                'data': list(data_queryset)  # Full data for non-paginated response
             }
             
             # If paginated, return paginated response
             if page is not None:
-                # For paginated response, update data to be just the current page
-                base_response['data'] = page
+                # For paginated response, data is just the current page
+                base_response['data'] = to_columns(page) if columnar else page
                 return paginator.get_paginated_response(base_response)
             
-            # Non-paginated response
+            # Non-paginated response: only now evaluate the full result
+            base_response['data'] = to_columns(data_queryset) if columnar else list(data_queryset)
             return Response(base_response)
             
         except InvalidFilterException as e:
-            logger.warning(f"Invalid filter in BlogViewsAnalyticsAPI: {str(e)}")
+            logger.warning("Invalid filter in BlogViewsAnalyticsAPI: %s", e)
             return Response(
                 {'error': str(e), 'code': 'invalid_filter'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         except TimeRangeException as e:
-            logger.warning(f"Invalid time range in BlogViewsAnalyticsAPI: {str(e)}")
+            logger.warning("Invalid time range in BlogViewsAnalyticsAPI: %s", e)
             return Response(
                 {'error': str(e), 'code': 'invalid_time_range'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except QueryTimeoutException as e:
+            logger.warning("Query timed out in BlogViewsAnalyticsAPI: %s", e)
+            return retry_later_response(e)
         except DataNotFoundException as e:
-            logger.info(f"No data found in BlogViewsAnalyticsAPI: {str(e)}")
+            logger.info("No data found in BlogViewsAnalyticsAPI: %s", e)
             return Response({
                 'object_type': object_type,
                 'range': date_range,
@@ -221,6 +258,8 @@ class BlogViewsAnalyticsAPI(APIView):
                 'message': str(e)
             }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
+            if replica_failed(e):
+                raise  # @reads_from_replica repeats the request on the primary
             logger.error(f"Unexpected error in BlogViewsAnalyticsAPI: {str(e)}", 
                         exc_info=True)
             return Response({
@@ -234,6 +273,7 @@ class TopAnalyticsAPI(APIView):
     """API #2: Returns Top 10 based on total views"""
 
     filter_backends = (BlogViewFilter,)
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
     queryset = BlogView.objects.all()  # Add this line
     
     @swagger_auto_schema(
@@ -263,10 +303,13 @@ class TopAnalyticsAPI(APIView):
             500: openapi.Response(description="Internal Server Error"),
         }
     )
+    @traced()
+    @reads_from_replica
+    @with_query_deadline('top-analytics')
     def get(self, request):
         try:
             # Log request
-            logger.info(f"TopAnalyticsAPI called: {request.query_params}")
+            logger.debug("TopAnalyticsAPI called: %s", request.query_params)
             
             # Extract and validate parameters
             top_type = request.query_params.get('top', 'user')
@@ -280,24 +323,44 @@ class TopAnalyticsAPI(APIView):
                 )
             
             # Get data from service
+            columnar = wants_columns(request)
             data = AnalyticsService.get_top_analytics(
                 top_type=top_type,
                 date_range=date_range,
-                filters=filters
+                filters=filters,
+                columnar=columnar
             )
             
             return Response({
                 'top_type': top_type,
-                'data': list(data)
+                'data': to_columns(data) if columnar else list(data)
             })
             
         except InvalidFilterException as e:
-            logger.warning(f"Invalid filter in TopAnalyticsAPI: {str(e)}")
+            logger.warning("Invalid filter in TopAnalyticsAPI: %s", e)
             return Response(
                 {'error': str(e), 'code': 'invalid_filter'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except QueryTimeoutException as e:
+            # Degraded mode: the top 10 of a narrower, recent range
+            fallback = degraded_range(date_range)
+            logger.warning("Query timed out in TopAnalyticsAPI (fallback range: %s): %s", fallback, e)
+            if fallback is None:
+                return retry_later_response(e)
+            try:
+                data = AnalyticsService.get_top_analytics(
+                    top_type=top_type, date_range=fallback, filters=filters, columnar=columnar)
+            except QueryTimeoutException:
+                return retry_later_response(e)
+            return Response({
+                'top_type': top_type,
+                'data': to_columns(data) if columnar else list(data),
+                'degraded': {'reason': 'query_timeout', 'range': fallback},
+            })
         except Exception as e:
+            if replica_failed(e):
+                raise  # @reads_from_replica repeats the request on the primary
             logger.error(f"Unexpected error in TopAnalyticsAPI: {str(e)}", 
                         exc_info=True)
             return Response({
@@ -311,6 +374,7 @@ class PerformanceAnalyticsAPI(APIView):
     """API #3: Time-series performance for a user or all users"""
     
     filter_backends = (PerformanceFilter,)
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
     queryset = BlogView.objects.all()  # Add this line
     
     @swagger_auto_schema(
@@ -341,10 +405,13 @@ class PerformanceAnalyticsAPI(APIView):
             500: openapi.Response(description="Internal Server Error"),
         }
     )
+    @traced()
+    @reads_from_replica
+    @with_query_deadline('performance-analytics')
     def get(self, request):
         try:
             # Log request
-            logger.info(f"PerformanceAnalyticsAPI called: {request.query_params}")
+            logger.debug("PerformanceAnalyticsAPI called: %s", request.query_params)
             
             # Extract and validate parameters
             compare_type = request.query_params.get('compare', 'month')
@@ -374,16 +441,21 @@ class PerformanceAnalyticsAPI(APIView):
             return Response({
                 'compare': compare_type,
                 'user_id': user_id,
-                'data': data
+                'data': dicts_to_columns(data) if wants_columns(request) else data
             })
             
         except InvalidFilterException as e:
-            logger.warning(f"Invalid filter in PerformanceAnalyticsAPI: {str(e)}")
+            logger.warning("Invalid filter in PerformanceAnalyticsAPI: %s", e)
             return Response(
                 {'error': str(e), 'code': 'invalid_filter'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except QueryTimeoutException as e:
+            logger.warning("Query timed out in PerformanceAnalyticsAPI: %s", e)
+            return retry_later_response(e)
         except Exception as e:
+            if replica_failed(e):
+                raise  # @reads_from_replica repeats the request on the primary
             logger.error(f"Unexpected error in PerformanceAnalyticsAPI: {str(e)}", 
                         exc_info=True)
             return Response({
@@ -48,7 +48,8 @@ SWAGGER_SETTINGS = {
     # 'DEFAULT_INFO': 'ideeza.urls.swagger_info',
 }
 
-# Logging configuration
+# Logging configuration. Loggers write to a QueueHandler; its QueueListener
+# (started in AnalyticsAppConfig.ready) does formatting and file I/O off the request thread.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -61,6 +62,10 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
         'json': {
             '()': 'pythonjsonlogger.jsonlogger.JsonFormatter',
             'format': '%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s',
@@ -86,41 +91,210 @@ LOGGING = {
             'formatter': 'json',
             'level': 'ERROR',
         },
+        'queue': {
+            'class': 'logging.handlers.QueueHandler',
+            'handlers': ['console', 'file', 'error_file'],
+            'respect_handler_level': True,
+        },
+        'slow_query_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': 'logs/slow_queries.jsonl',
+            'maxBytes': 1024 * 1024 * 10,
+            'backupCount': 5,
+            'formatter': 'json',
+        },
+        'slow_query_queue': {
+            'class': 'logging.handlers.QueueHandler',
+            'handlers': ['slow_query_file'],
+        },
+        # one OTLP/JSON ExportTraceServiceRequest per line
+        'trace_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': 'logs/traces.jsonl',
+            'maxBytes': 1024 * 1024 * 50,
+            'backupCount': 5,
+            'formatter': 'message',
+        },
+        'trace_queue': {
+            'class': 'logging.handlers.QueueHandler',
+            'handlers': ['trace_file'],
+        },
     },
     'loggers': {
+        'analytics_app.traces': {
+            'handlers': ['trace_queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'analytics_app.slow_queries': {
+            'handlers': ['slow_query_queue'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
         'analytics_app': {
-            'handlers': ['console', 'file', 'error_file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
     },
 }
 
+# Request log sampling: server errors and slow requests are always logged
+REQUEST_LOGGING = {
+    'SAMPLE_RATE': 1.0,
+    'ROUTE_SAMPLE_RATES': {},
+    'SLOW_REQUEST_MS': 1000,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 100
 }
 
+# Ingest-time deduplication of repeated blog views (reloads, client retries)
+VIEW_DEDUP = {
+    'ENABLED': False,
+    'WINDOW_SECONDS': 30 * 60,
+    'BUCKETS': 6,
+    'CAPACITY_PER_BUCKET': 100000,
+    'ERROR_RATE': 0.001,
+    'STATE_FILE': BASE_DIR / 'var' / 'view_dedup.bloom',
+}
+
 
 
 MIDDLEWARE = [
+    'analytics_app.monitoring.middleware.MetricsMiddleware',
+    'analytics_app.middleware.TracingMiddleware',
+    'analytics_app.middleware.ServerTimingMiddleware',
+    'analytics_app.monitoring.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'analytics_app.monitoring.middleware.ProfilingMiddleware',
+    'analytics_app.middleware.AdmissionControlMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
      'analytics_app.middleware.RequestLoggingMiddleware',
+     'analytics_app.monitoring.middleware.APIMonitoringMiddleware',
+     'analytics_app.middleware.ReadYourWritesMiddleware',
+     'analytics_app.middleware.QueryBudgetMiddleware',
 ]
 
+# Cost-based admission control for the analytics APIs (per process): cost is
+# roughly thousands of BlogView rows scanned, weighted by grouping and filters
+ADMISSION_CONTROL = {
+    'ENABLED': True,
+    'EXPENSIVE_COST': 500,
+    'LANES': {'cheap': 16, 'expensive': 2},
+    'CLIENT_COST_PER_MINUTE': 5000,
+    'CLIENT_MAX_EXPENSIVE': 1,
+}
+
+# Per-statement time limits (statement_timeout on PostgreSQL, a progress
+# handler on SQLite); a cancelled query answers 504 unless a degraded result
+# (page without count, top 10 of the last month) can be served instead
+QUERY_DEADLINES = {
+    'ENABLED': True,
+    'DEFAULT_MS': 10000,
+    'ENDPOINTS_MS': {
+        'blog-views-analytics': 5000,
+        'top-analytics': 5000,
+        'performance-analytics': 8000,
+    },
+    'DEGRADED': True,
+    'DEGRADED_RANGE': 'month',
+}
+
+# Per-endpoint SQL budgets (keyed by URL name), checked in tests and, in DEBUG, per request.
+# Overrides of query_budget.DEFAULT_QUERY_BUDGETS, e.g. {'top-analytics': {'max_db_ms': 250}}
+QUERY_BUDGETS = {}
+QUERY_BUDGET_ENFORCEMENT = 'warn'  # 'warn', 'raise' or 'off'
+QUERY_BUDGET_N_PLUS_ONE_THRESHOLD = 3
+
+# APIRequestLog capture: sampled, written in background bulk_create batches
+API_MONITORING = {
+    'ENABLED': True,
+    'SAMPLING': 'tail',
+    'SAMPLE_RATE': 1.0,
+    'SLOW_REQUEST_MS': 1000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+}
+
+# In-process latency histograms served at /metrics. Set MULTIPROCESS_DIR to a
+# shared directory (wiped on restart) to aggregate across worker processes.
+METRICS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': None,
+    'SYNC_INTERVAL': 5.0,
+}
+
+# SystemMetrics sampling. Run `manage.py sample_system_metrics` as its own
+# process (it reads request rates from METRICS['MULTIPROCESS_DIR'] and
+# refuses to start without it), or set THREAD for a single-process server.
+SYSTEM_METRICS = {
+    'THREAD': False,
+    'INTERVAL': 10.0,
+    'DOWNSAMPLE_EVERY': 300,
+}
+
+# Statements slower than THRESHOLD_MS are logged with their EXPLAIN plan to
+# LOG_FILE (rotating, see LOGGING); summarize with `manage.py slow_query_report`
+SLOW_QUERIES = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 200,
+    'ENDPOINT_THRESHOLDS_MS': {},
+    'EXPLAIN': True,
+    'LOG_FILE': 'logs/slow_queries.jsonl',
+}
+
+# Head-sampled request traces (view/service/filter/SQL/render spans) written
+# as OTLP JSON lines to logs/traces.jsonl (see LOGGING)
+TRACING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.01,
+    'PARENT_BASED': True,
+    'SERVICE_NAME': 'analytics-api',
+}
+
+# Per-request DB/app/render timing (Server-Timing header + structured log); sample in production
+SERVER_TIMING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'HEADER': True,
+    'LOG': True,
+}
+
+# Staff-only ?profile=1 (cProfile + collapsed stacks stored under DIR) and an
+# optional low-rate stack sampler writing per-endpoint flamegraph input
+PROFILING = {
+    'ENABLED': True,
+    'DIR': BASE_DIR / 'var' / 'profiles',
+    'TOP_FUNCTIONS': 30,
+    'CONTINUOUS': False,
+    'CONTINUOUS_INTERVAL': 0.05,
+    'FLUSH_INTERVAL': 60.0,
+}
+
+# Independent sub-queries of one request (page + count, blog + view counts)
+# run on a bounded thread pool, one connection per worker thread
+PARALLEL_QUERIES = {
+    'ENABLED': True,
+    'MAX_WORKERS': 8,
+    'MAX_PER_REQUEST': 4,
+}
+
 ROOT_URLCONF = 'ideeza.urls'
 
 TEMPLATES = [
@@ -148,7 +322,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN so a writer waits on busy_timeout
+            # instead of failing when upgrading from a read lock
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Local stand-in for a read replica: a copy of db.sqlite3 refreshed by
+    # `manage.py sync_sqlite_replica`. Tests read it through the primary.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'var' / 'replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['analytics_app.routers.ReadReplicaRouter']
+
+# Analytics, dashboard and export reads go to these aliases (alias -> weight)
+# when healthy; e.g. {'replica': 1} with sync_sqlite_replica running
+READ_REPLICAS = {
+    'REPLICAS': {},
+    'HEALTH_CHECK_INTERVAL': 5.0,
+    'READ_YOUR_WRITES_SECONDS': 5,
+}
+
+# Pragmas run on every new SQLite connection (analytics_app.sqlite_pragmas);
+# entries override DEFAULT_SQLITE_PRAGMAS, None skips one
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 ** 2,
+    'temp_store': 'memory',
 }
 
 